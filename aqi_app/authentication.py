@@ -4,10 +4,71 @@ from datetime import datetime
 from jose import jwt, JWTError, ExpiredSignatureError
 from django.conf import settings
 from django.db import connection
+from .ttl_cache import TTLCache
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
+# 已验证的用户，按user_id缓存，修改或删除用户的路径需调用invalidate_user
+_user_cache = TTLCache(
+    maxsize=getattr(settings, 'AQI_AUTH_USER_CACHE_SIZE', 10000),
+    ttl=getattr(settings, 'AQI_AUTH_USER_CACHE_TTL', 300),
+)
+
+# 已验证的token载荷，缓存到token的exp为止
+_token_cache = TTLCache(maxsize=getattr(settings, 'AQI_AUTH_TOKEN_CACHE_SIZE', 10000))
+
+def invalidate_user(user_id):
+    """用户数据变化时清除缓存的用户"""
+    _user_cache.delete(user_id)
+
+def cache_user(user):
+    """缓存已从数据库读取的用户（例如登录时），后续认证无需再查询"""
+    _user_cache.set(user.id, user)
+
+def _decode_token(token):
+    """验证并解码JWT；开启AQI_AUTH_TOKEN_CACHE时在exp之前复用已验证的载荷"""
+    use_cache = getattr(settings, 'AQI_AUTH_TOKEN_CACHE', True)
+    if use_cache:
+        payload = _token_cache.get(token)
+        if payload is not None:
+            return payload
+
+    payload = jwt.decode(token, settings.SECRET_KEY, algorithms=['HS256'])
+    if use_cache and 'exp' in payload:
+        ttl = payload['exp'] - time.time()
+        if ttl > 0:
+            _token_cache.set(token, payload, ttl)
+    return payload
+
+def _get_user(user_id):
+    """按user_id获取用户，优先使用缓存"""
+    user = _user_cache.get(user_id)
+    if user is not None:
+        return user
+
+    # 使用原生SQL查询
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT id, username, user_type, email FROM users WHERE id = %s", 
+            [user_id]
+        )
+        user_data = cursor.fetchone()
+        
+    if not user_data:
+        raise exceptions.AuthenticationFailed('User not found')
+    
+    # 创建一个类似于User模型的对象
+    user = SimpleUser(
+        id=user_data[0],
+        username=user_data[1],
+        user_type=user_data[2],
+        email=user_data[3]
+    )
+    _user_cache.set(user_id, user)
+    return user
+
 class TokenAuthentication(authentication.BaseAuthentication):
     def authenticate(self, request):
         auth_header = request.META.get('HTTP_AUTHORIZATION')
@@ -16,29 +77,9 @@ class TokenAuthentication(authentication.BaseAuthentication):
 
         try:
             token = auth_header.split(' ')[1]
-            payload = jwt.decode(token, settings.SECRET_KEY, algorithms=['HS256'])
-            user_id = payload['user_id']
-            
-            # 使用原生SQL查询
-            with connection.cursor() as cursor:
-                cursor.execute(
-                    "SELECT id, username, user_type, email FROM users WHERE id = %s", 
-                    [user_id]
-                )
-                user_data = cursor.fetchone()
-                
-                if not user_data:
-                    raise exceptions.AuthenticationFailed('User not found')
-                
-                # 创建一个类似于User模型的对象
-                user = SimpleUser(
-                    id=user_data[0],
-                    username=user_data[1],
-                    user_type=user_data[2],
-                    email=user_data[3]
-                )
-                
-                return (user, None)
+            payload = _decode_token(token)
+            user = _get_user(payload['user_id'])
+            return (user, None)
         except (JWTError, ExpiredSignatureError):
             logger.warning("无效的token")
             raise exceptions.AuthenticationFailed('Invalid token')
@@ -0,0 +1,133 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from .queries import SUPPORTED_CITIES_LATEST_SQL, SUPPORTED_CITIES_SQL
+import threading
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# 数据库中没有数据时返回的示例城市
+SAMPLE_CITIES = [
+    {'site': 'BEIJING', 'name': '北京'},
+    {'site': 'SHANGHAI', 'name': '上海'},
+    {'site': 'GUANGZHOU', 'name': '广州'},
+    {'site': 'SHENZHEN', 'name': '深圳'},
+    {'site': 'HANGZHOU', 'name': '杭州'},
+    {'site': 'NANJING', 'name': '南京'},
+    {'site': 'WUHAN', 'name': '武汉'},
+    {'site': 'CHENGDU', 'name': '成都'}
+]
+
+# 失效版本号，保存在Django缓存中，使配置了共享缓存的其他进程也能感知失效
+VERSION_CACHE_KEY = 'aqi:cities:version'
+
+# 读取失效版本时缓存不可用
+_CACHE_UNAVAILABLE = object()
+
+
+class CityRegistry:
+    """进程内缓存的支持城市列表
+
+    城市列表在TTL内直接从内存返回；predict_aqi写入新站点时调用invalidate()使其失效。
+    """
+
+    def __init__(self, ttl=300, error_ttl=30):
+        """
+        Args:
+            ttl: 城市列表的缓存时间（秒）
+            error_ttl: 查询失败、返回示例数据时的缓存时间（秒）
+        """
+        self.ttl = ttl
+        self.error_ttl = error_ttl
+        self._lock = threading.Lock()
+        self._cities = None
+        self._sites = frozenset()
+        self._expires_at = 0.0
+        self._version = None
+
+    def _load(self):
+        """查询城市列表，返回(城市列表, 是否为示例数据)"""
+        try:
+            with connection.cursor() as cursor:
+                # 优先从aqi_latest读取（每个站点一行），尚未重建时回退到aqi_result
+                cursor.execute(SUPPORTED_CITIES_LATEST_SQL)
+                cities = cursor.fetchall()
+                if not cities:
+                    cursor.execute(SUPPORTED_CITIES_SQL)
+                    cities = cursor.fetchall()
+                if cities:
+                    return [{'site': city[0], 'name': city[1]} for city in cities], False
+        except Exception as e:
+            logger.error(f"获取城市列表出错: {e}")
+
+        # 发生错误或没有数据时返回示例数据
+        return [dict(city) for city in SAMPLE_CITIES], True
+
+    def _shared_version(self):
+        """读取共享的失效版本；缓存不可用时返回_CACHE_UNAVAILABLE"""
+        try:
+            return cache.get(VERSION_CACHE_KEY)
+        except Exception as e:
+            logger.warning(f"读取城市列表失效版本出错，从数据库重新加载: {e}")
+            return _CACHE_UNAVAILABLE
+
+    def _is_fresh(self, version):
+        """缓存不可用时无法确认其他进程是否已使列表失效，视为已过期"""
+        return (
+            self._cities is not None
+            and time.monotonic() < self._expires_at
+            and version is not _CACHE_UNAVAILABLE
+            and version == self._version
+        )
+
+    def get(self):
+        """获取支持的城市列表"""
+        with self._lock:
+            version = self._shared_version()
+            if not self._is_fresh(version):
+                cities, is_sample = self._load()
+                self._cities = cities
+                self._sites = frozenset() if is_sample else frozenset(city['site'] for city in cities)
+                self._expires_at = time.monotonic() + (self.error_ttl if is_sample else self.ttl)
+                self._version = version
+            return [dict(city) for city in self._cities]
+
+    def known_sites(self):
+        """已在数据库中的站点集合（不含示例数据）"""
+        self.get()
+        return self._sites
+
+    def invalidate_if_new(self, sites, known_sites):
+        """sites中有不在known_sites中的站点时使城市列表失效，返回这些新站点
+
+        known_sites需在写入新站点之前取得；写入后再调用known_sites()时，过期的列表会从已包含新站点的表重新加载。
+        """
+        new_sites = set(sites) - set(known_sites)
+        if new_sites:
+            self.invalidate()
+        return new_sites
+
+    def invalidate(self):
+        """使城市列表失效，下次get时重新查询"""
+        with self._lock:
+            self._cities = None
+        try:
+            cache.set(VERSION_CACHE_KEY, time.time(), None)
+        except Exception as e:
+            logger.warning(f"发布城市列表失效出错: {e}")
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_city_registry():
+    """获取进程级共享的城市列表缓存"""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = CityRegistry(ttl=getattr(settings, 'AQI_CITY_REGISTRY_TTL', 300))
+    return _registry
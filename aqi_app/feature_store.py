@@ -0,0 +1,262 @@
+import pandas as pd
+import numpy as np
+import logging
+import json
+
+logger = logging.getLogger(__name__)
+
+# 滚动特征：观测值 -> 聚合方式；窗口按日历天计算（含当天），缺测的日期不占用窗口
+ROLLING_SOURCES = {'TEMP': 'mean', 'WDSP': 'mean', 'PRCP': 'sum'}
+ROLLING_WINDOWS = (3, 7)
+
+# 状态中保留的天数：最新日期之前这些天内的观测足够计算下一天的最大窗口和PREV_AQI
+HISTORY_DAYS = max(ROLLING_WINDOWS) - 1
+
+# 前一天（日历日）的AQI，前一天缺测时为空
+PREV_AQI = 'PREV_AQI'
+
+HISTORY_FEATURE_COLUMNS = [
+    f"{col}_{agg.upper()}_{window}" for col, agg in ROLLING_SOURCES.items() for window in ROLLING_WINDOWS
+] + [PREV_AQI]
+
+# 状态历史中按日期保存的列
+HISTORY_COLUMNS = list(ROLLING_SOURCES) + ['AQI']
+
+# 站点或日期缺失时按行单独计算，不与其他行共享历史
+_KEY = '_STATION_KEY'
+
+# 日期缺失的行在组合表中使用的占位日期（这些行的站点键唯一，不会与其他行落入同一窗口）
+_NO_DATE = pd.Timestamp('1970-01-01')
+
+_ONE_DAY = pd.Timedelta(days=1)
+
+
+def _dates(values):
+    """日期列转换为当天零点的时间戳，无法解析的为NaT"""
+    return pd.to_datetime(values, errors='coerce').dt.normalize()
+
+
+def _station_keys(df, dates=None):
+    """站点键；站点或日期缺失的行使用各自独立的键"""
+    keys = df['STATION'].astype(object)
+    missing = keys.isna()
+    if dates is not None:
+        missing |= dates.isna()
+    if missing.any():
+        keys = keys.where(~missing, pd.Series([f"__row_{i}" for i in df.index], index=df.index, dtype=object))
+    return keys
+
+
+def _state_sql(stations, for_update):
+    return f"""
+        SELECT STATION, LAST_DATE, LAST_AQI, HISTORY FROM station_feature_state
+        WHERE STATION IN ({', '.join(['%s'] * len(stations))})
+        ORDER BY STATION
+        {'FOR UPDATE' if for_update else ''}
+    """
+
+
+def _station_list(stations):
+    return sorted({station for station in stations if station is not None and station == station})
+
+
+def load_state(cursor, stations, for_update=False):
+    """读取站点的特征状态
+
+    Returns:
+        dict: {STATION: {'last_date', 'last_aqi', 'history': {'DATE': [...], 列: [...]}}}
+    """
+    stations = _station_list(stations)
+    if not stations:
+        return {}
+    cursor.execute(_state_sql(stations, for_update), stations)
+    return {
+        station: {'last_date': last_date, 'last_aqi': last_aqi, 'history': json.loads(history)}
+        for station, last_date, last_aqi, history in cursor.fetchall()
+    }
+
+
+def lock_state(cursor, stations):
+    """在写入结果的事务中锁定并读取站点的特征状态
+
+    先为没有状态的站点插入空行，使并发处理同一站点的进程在同一行上排队，而不是对不存在的行加间隙锁后互相死锁；
+    站点按顺序加锁。
+    """
+    stations = _station_list(stations)
+    if not stations:
+        return {}
+    cursor.executemany(
+        "INSERT IGNORE INTO station_feature_state (STATION, HISTORY) VALUES (%s, '{}')",
+        [(station,) for station in stations],
+    )
+    return load_state(cursor, stations, for_update=True)
+
+
+def _history_frame(state):
+    """将状态中的历史观测展开为长表，列为 _KEY, DATE 和 HISTORY_COLUMNS"""
+    frames = []
+    for station, item in state.items():
+        history = item['history']
+        if history.get('DATE'):
+            frame = pd.DataFrame({col: history.get(col, [None] * len(history['DATE'])) for col in HISTORY_COLUMNS})
+            frame['DATE'] = pd.to_datetime(history['DATE'])
+        elif item.get('last_date') is not None and item.get('last_aqi') is not None:
+            # 没有逐日历史的旧状态只能提供最新一天的AQI
+            frame = pd.DataFrame({'DATE': [pd.Timestamp(item['last_date'])], 'AQI': [item['last_aqi']]})
+        else:
+            continue
+        frame[_KEY] = station
+        frames.append(frame)
+    columns = [_KEY, 'DATE'] + HISTORY_COLUMNS
+    if not frames:
+        return pd.DataFrame({col: pd.Series(dtype='datetime64[ns]' if col == 'DATE' else object) for col in columns})
+    frame = pd.concat(frames, ignore_index=True).reindex(columns=columns)
+    frame[HISTORY_COLUMNS] = frame[HISTORY_COLUMNS].astype(float)
+    return frame
+
+
+def _combine(df, state):
+    """本批数据与状态中的历史观测合并，按站点、日期排序
+
+    本批的行保留原索引，历史行使用负索引；历史中与本批同一站点同一天的观测以本批为准。
+    对于早于状态最新日期的行（补录、并行导入、按id分片处理），历史中更早的观测仍落在其窗口内，
+    更晚的观测不会被当作它之前的数据；状态只保留最新日期之前HISTORY_DAYS天，更早的观测不在窗口内。
+    """
+    dates = _dates(df['DATE'])
+    keys = _station_keys(df, dates)
+    chunk = pd.DataFrame({_KEY: keys, 'DATE': dates.fillna(_NO_DATE)}, index=df.index)
+    for col in HISTORY_COLUMNS:
+        chunk[col] = df[col].astype(float) if col in df.columns else np.nan
+
+    history = _history_frame({station: item for station, item in state.items() if station in set(keys)})
+    if not history.empty:
+        seen = pd.MultiIndex.from_arrays([chunk[_KEY], chunk['DATE']])
+        history = history[~pd.MultiIndex.from_arrays([history[_KEY], history['DATE']]).isin(seen)]
+    history.index = -np.arange(1, len(history) + 1)
+
+    combined = pd.concat([history, chunk]) if len(history) else chunk
+    if 'id' in df.columns:
+        combined['_ID'] = pd.Series(df['id'], index=df.index).reindex(combined.index).fillna(-1)
+        return combined.sort_values([_KEY, 'DATE', '_ID'], kind='stable').drop(columns='_ID')
+    return combined.sort_values([_KEY, 'DATE'], kind='stable')
+
+
+def _aqi_lookup(combined):
+    """(站点键, 日期) -> AQI"""
+    known = combined[combined['AQI'].notna()]
+    return pd.Series(known['AQI'].to_numpy(), index=pd.MultiIndex.from_arrays([known[_KEY], known['DATE']]))
+
+
+def _previous_day(lookup, keys, dates):
+    """按 (站点键, 日期-1天) 查找AQI，找不到时为NaN"""
+    if lookup.empty:
+        return np.full(len(keys), np.nan)
+    lookup = lookup[~lookup.index.duplicated(keep='last')]
+    index = pd.MultiIndex.from_arrays([np.asarray(keys, dtype=object), pd.DatetimeIndex(dates) - _ONE_DAY])
+    return lookup.reindex(index).to_numpy(dtype=float)
+
+
+def add_history_features(df, state):
+    """为一批GSOD数据计算滚动特征（向量化的按站点时间窗口滚动，只使用本批数据和状态中的历史）
+
+    PREV_AQI取前一天的AQI：df含AQI列（训练数据）时取自df，否则只能取自状态历史；
+    前一天在本批中的行依赖本批的预测结果，由predict()填入。
+
+    Returns:
+        DataFrame: df加上HISTORY_FEATURE_COLUMNS，行顺序不变
+    """
+    combined = _combine(df, state)
+    grouped = combined.groupby(_KEY, sort=False)
+    in_chunk = combined.index >= 0
+    features = df.copy()
+    for col, agg in ROLLING_SOURCES.items():
+        for window in ROLLING_WINDOWS:
+            rolling = grouped.rolling(f'{window}D', on='DATE', min_periods=1)[col]
+            # combined已按站点排序，各组连续，结果与combined按位置对应
+            rolled = pd.Series(getattr(rolling, agg)().to_numpy(), index=combined.index)
+            features[f"{col}_{agg.upper()}_{window}"] = rolled[in_chunk].reindex(df.index)
+
+    chunk = combined.loc[df.index]
+    features[PREV_AQI] = _previous_day(_aqi_lookup(combined), chunk[_KEY], chunk['DATE'])
+    return features
+
+
+def predict(predictor, features):
+    """按模型需要的特征预测
+
+    模型使用PREV_AQI时，同一站点本批中的后一天依赖前一天的预测值：按站点内的日期顺序分轮预测，
+    每轮包含各站点的第n行，轮数等于本批中单个站点的最大行数。
+
+    Returns:
+        Series: 与features按索引对应的AQI预测值
+    """
+    model_features = predictor.features()
+    if PREV_AQI not in model_features:
+        return pd.Series(np.asarray(predictor.predict(features[model_features])), index=features.index)
+
+    dates = _dates(features['DATE']).fillna(_NO_DATE)
+    keys = _station_keys(features, _dates(features['DATE']))
+    ordered = pd.DataFrame({_KEY: keys, 'DATE': dates}).sort_values([_KEY, 'DATE'], kind='stable')
+    rank = ordered.groupby(_KEY, sort=False).cumcount().reindex(features.index)
+
+    predictions = pd.Series(np.nan, index=features.index)
+    prev_aqi = features[PREV_AQI].astype(float).copy()
+    predicted = pd.Series(dtype=float)
+    for r in range(int(rank.max()) + 1):
+        index = rank.index[rank.to_numpy() == r]
+        if r:
+            # 前一天在本批中时使用其预测值
+            previous = _previous_day(predicted, keys.loc[index], dates.loc[index])
+            found = ~np.isnan(previous)
+            prev_aqi.loc[index[found]] = previous[found]
+        X = features.loc[index, model_features].copy()
+        X[PREV_AQI] = prev_aqi.loc[index]
+        values = np.asarray(predictor.predict(X), dtype=float)
+        predictions.loc[index] = values
+        predicted = pd.concat([predicted, pd.Series(
+            values, index=pd.MultiIndex.from_arrays([keys.loc[index].to_numpy(), dates.loc[index].to_numpy()])
+        )])
+    return predictions
+
+
+def next_state(results, state):
+    """将本批已写入的结果（含AQI）合并到站点状态，返回可传给save_state的行
+
+    state需在写入结果的事务中由lock_state读取。新状态的最新日期取状态与本批中较晚者，
+    只保留该日期之前HISTORY_DAYS天内的观测；早于状态最新日期的行只补入仍在保留范围内的历史。
+    """
+    results = results[results['STATION'].notna() & _dates(results['DATE']).notna()]
+    if results.empty:
+        return []
+    combined = _combine(results, state)
+    last_date = combined.groupby(_KEY, sort=False)['DATE'].transform('max')
+    kept = combined[combined['DATE'] > last_date - pd.Timedelta(days=HISTORY_DAYS)]
+
+    rows = []
+    for station, group in kept.groupby(_KEY, sort=True):
+        history = {'DATE': [date.date().isoformat() for date in group['DATE']]}
+        for col in HISTORY_COLUMNS:
+            history[col] = [None if value != value else float(value) for value in group[col].tolist()]
+        last = group.iloc[-1]
+        last_aqi = None if last['AQI'] != last['AQI'] else float(last['AQI'])
+        rows.append((station, last['DATE'].date(), last_aqi, json.dumps(history)))
+    return rows
+
+
+def save_state(cursor, rows):
+    """写入站点的新状态，需在lock_state所在的同一事务中调用"""
+    if not rows:
+        return
+    cursor.executemany("""
+        INSERT INTO station_feature_state (STATION, LAST_DATE, LAST_AQI, HISTORY)
+        VALUES (%s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE
+            LAST_DATE = VALUES(LAST_DATE),
+            LAST_AQI = VALUES(LAST_AQI),
+            HISTORY = VALUES(HISTORY)
+    """, rows)
+
+
+def training_features(df):
+    """为训练数据（含真实AQI列、覆盖完整历史）计算同样的特征，PREV_AQI取前一天的真实AQI"""
+    return add_history_features(df, {})
@@ -0,0 +1,237 @@
+from django.conf import settings
+from django.db import connection
+from concurrent.futures import ThreadPoolExecutor, wait as wait_futures
+from io import BytesIO
+from PIL import Image
+import requests
+import threading
+import hashlib
+import logging
+import time
+import os
+
+logger = logging.getLogger(__name__)
+
+# AQI等级对应的提示词
+AQI_PROMPTS = {
+    1: "A beautiful cityscape with clear blue sky, people enjoying outdoor activities, green parks and trees, modern buildings, bright sunlight, high quality, detailed, reflecting urban life and environmental harmony",
+    2: "A city view with slightly hazy sky, people going about their daily activities, some wearing light masks, urban landscape with moderate air quality, buildings visible but with slight haze, high quality, detailed",
+    3: "An urban scene with orange-tinted sky, sensitive groups wearing masks, reduced outdoor activities, city landmarks visible but with noticeable haze, people being cautious, high quality, detailed",
+    4: "A city under red-tinted sky, most people wearing masks, limited outdoor activities, prominent city buildings with heavy haze, emergency alerts visible, high quality, detailed",
+    5: "A cityscape with purple-tinted sky, empty streets, emergency vehicles visible, severe air pollution, city landmarks barely visible through thick haze, high quality, detailed",
+    6: "A city in emergency conditions with maroon sky, deserted streets, emergency services active, extremely poor visibility, city almost invisible through dense pollution, high quality, detailed"
+}
+
+# AQI等级对应的健康建议
+AQI_ADVICE = {
+    1: "Air quality is excellent. Perfect day for outdoor activities. Enjoy the fresh air and sunshine. Stay active and healthy.",
+    2: "Air quality is acceptable. Most people can enjoy outdoor activities. Sensitive individuals should consider limiting prolonged outdoor exertion.",
+    3: "Sensitive groups should reduce outdoor activities. Consider wearing masks. General public should monitor their health when outdoors.",
+    4: "Everyone should reduce outdoor activities. Wear masks when going outside. Sensitive groups should stay indoors as much as possible.",
+    5: "Health alert! Everyone should avoid outdoor activities. Stay indoors with windows closed. Use air purifiers if available.",
+    6: "Emergency conditions! Stay indoors with windows closed. Use air purifiers. Only go outside if absolutely necessary with proper protection."
+}
+
+# 默认城市及城市特征
+DEFAULT_CITY_NAME = "Beijing"
+DEFAULT_CITY_FEATURES = "modern skyscrapers, traditional hutongs, Forbidden City, Great Wall"
+
+# Stable Diffusion模型版本（实际运行使用自己的API key TODO）
+REPLICATE_MODEL = "stability-ai/stable-diffusion:your-api-key"
+
+def hint_image_key(aqi_level, city_name=DEFAULT_CITY_NAME, city_features=DEFAULT_CITY_FEATURES):
+    """根据提示词输入计算图片key（SHA-256十六进制）
+
+    提示词只取决于AQI等级、城市名称和城市特征，相同输入对应同一张图片。
+    """
+    raw = f"{int(aqi_level)}\x1f{city_name}\x1f{city_features}"
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+def build_prompt(aqi_level, city_name=DEFAULT_CITY_NAME, city_features=DEFAULT_CITY_FEATURES):
+    """构建提示词，包含城市特征、AQI信息和健康建议"""
+    return f"A {city_name} cityscape with {city_features}, {AQI_PROMPTS[aqi_level]}, {AQI_ADVICE[aqi_level]}, include AQI level indicator and health tips in the image, showing the unique characteristics of {city_name}"
+
+def _replicate_client(timeout=None):
+    """创建Replicate客户端，timeout作用于每次HTTP调用"""
+    import replicate
+
+    # 设置Replicate API key TODO
+    return replicate.Client(api_token=os.getenv("REPLICATE_API_TOKEN", "your api key"), timeout=timeout)
+
+def _download(url, timeout=None):
+    """下载生成的图片"""
+    response = requests.get(url, timeout=timeout)
+    response.raise_for_status()
+    return response.content
+
+def render_hint_image(aqi_level, city_name=DEFAULT_CITY_NAME, city_features=DEFAULT_CITY_FEATURES,
+                      client=None, fetch=_download, timeout=None):
+    """使用Replicate的Stable Diffusion API生成健康提示图片
+
+    Args:
+        client: 提供run(model, input=...)的客户端，默认使用Replicate
+        fetch: 下载图片的函数 fetch(url, timeout=...)
+        timeout: 每次远程调用的超时时间（秒）
+
+    Returns:
+        bytes: 图片内容
+    """
+    if client is None:
+        client = _replicate_client(timeout)
+
+    # 调用Stable Diffusion模型
+    output = client.run(
+        REPLICATE_MODEL,
+        input={
+            "prompt": build_prompt(aqi_level, city_name, city_features),
+            "width": 1024,
+            "height": 1024,
+            "num_outputs": 1,
+            "num_inference_steps": 75,
+            "guidance_scale": 8.5
+        }
+    )
+    return fetch(output[0], timeout=timeout)
+
+def default_hint_image():
+    """生成失败时使用的默认图片（白色JPEG）"""
+    image = Image.new('RGB', (1024, 1024), color='white')
+    buffered = BytesIO()
+    image.save(buffered, format="JPEG")
+    return buffered.getvalue()
+
+def hint_image_exists(key):
+    """hint_image表中是否已有该图片"""
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM hint_image WHERE HASH = %s", [key])
+        return cursor.fetchone() is not None
+
+def store_hint_image(key, aqi_level, city_name, city_features, image):
+    """写入hint_image表，已存在时保持原图片不变"""
+    with connection.cursor() as cursor:
+        cursor.execute("""
+            INSERT IGNORE INTO hint_image (HASH, AQILEVEL, CITY_NAME, CITY_FEATURES, IMAGE)
+            VALUES (%s, %s, %s, %s, %s)
+        """, [key, aqi_level, city_name, city_features, image])
+
+
+class HintImagePipeline:
+    """与预测解耦的健康提示图片生成流水线
+
+    预测结果只引用图片key并立即提交，图片在有界线程池中并发生成，完成后写入hint_image表。
+    同一个key同时最多只有一个生成任务，已存储的key不会重复生成；
+    每次远程调用带超时，失败后按指数退避重试，最终失败时不写入，下次提交时重新生成。
+    """
+
+    def __init__(self, client=None, fetch=_download, store=None, exists=None,
+                 max_workers=4, timeout=120, retries=2, backoff=2.0):
+        """
+        Args:
+            client: 提供run(model, input=...)的客户端，默认使用Replicate；测试时可替换为本地桩
+            fetch: 下载图片的函数 fetch(url, timeout=...)
+            store: 保存图片的函数 store(key, aqi_level, city_name, city_features, image)，默认写入hint_image表
+            exists: 判断图片是否已存储的函数 exists(key)，默认查询hint_image表
+            max_workers: 最大并发生成数
+            timeout: 每次远程调用的超时时间（秒）
+            retries: 失败后的重试次数
+            backoff: 首次重试前的等待时间（秒），之后每次翻倍
+        """
+        self.client = client
+        self.fetch = fetch
+        self.store = store or store_hint_image
+        self.exists = exists or hint_image_exists
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        # 使用默认的数据库读写时，工作线程在每个任务结束后关闭自己的数据库连接
+        self._uses_db = store is None or exists is None
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='hint-image')
+        self._lock = threading.Lock()
+        self._stored_keys = set()
+        self._pending = {}
+        self._stats = {'submitted': 0, 'already_stored': 0, 'generated': 0, 'retries': 0, 'failed': 0}
+
+    def submit(self, aqi_level, city_name=DEFAULT_CITY_NAME, city_features=DEFAULT_CITY_FEATURES):
+        """提交图片生成任务，立即返回图片key"""
+        key = hint_image_key(aqi_level, city_name, city_features)
+        with self._lock:
+            if key in self._stored_keys or key in self._pending:
+                return key
+            self._stats['submitted'] += 1
+            future = self._executor.submit(self._generate, key, aqi_level, city_name, city_features)
+            self._pending[key] = future
+        return key
+
+    def _generate(self, key, aqi_level, city_name, city_features):
+        try:
+            if self.exists(key):
+                with self._lock:
+                    self._stored_keys.add(key)
+                    self._stats['already_stored'] += 1
+                return True
+
+            for attempt in range(self.retries + 1):
+                try:
+                    image = render_hint_image(aqi_level, city_name, city_features,
+                                              client=self.client, fetch=self.fetch, timeout=self.timeout)
+                    break
+                except Exception as e:
+                    if attempt == self.retries:
+                        logger.error(f"Error generating hint image (AQILEVEL={aqi_level}, CITY={city_name}): {str(e)}")
+                        with self._lock:
+                            self._stats['failed'] += 1
+                        return False
+                    logger.warning(f"生成健康提示图片失败，第 {attempt + 1} 次重试: {str(e)}")
+                    with self._lock:
+                        self._stats['retries'] += 1
+                    time.sleep(self.backoff * (2 ** attempt))
+
+            self.store(key, aqi_level, city_name, city_features, image)
+            with self._lock:
+                self._stored_keys.add(key)
+                self._stats['generated'] += 1
+            logger.info(f"已生成健康提示图片: AQILEVEL={aqi_level}, CITY={city_name}, HASH={key}")
+            return True
+        except Exception as e:
+            logger.error(f"保存健康提示图片出错 (HASH={key}): {str(e)}")
+            with self._lock:
+                self._stats['failed'] += 1
+            return False
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+            if self._uses_db:
+                connection.close()
+
+    def wait(self, timeout=None):
+        """等待当前所有生成任务完成，返回是否全部完成"""
+        with self._lock:
+            futures = list(self._pending.values())
+        _, not_done = wait_futures(futures, timeout=timeout)
+        return not not_done
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['pending'] = len(self._pending)
+        return stats
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+
+_pipeline = None
+_pipeline_lock = threading.Lock()
+
+def get_hint_image_pipeline():
+    """获取进程级共享的健康提示图片生成流水线"""
+    global _pipeline
+    if _pipeline is None:
+        with _pipeline_lock:
+            if _pipeline is None:
+                _pipeline = HintImagePipeline(
+                    max_workers=getattr(settings, 'AQI_HINT_IMAGE_WORKERS', 4),
+                    timeout=getattr(settings, 'AQI_HINT_IMAGE_TIMEOUT', 120),
+                    retries=getattr(settings, 'AQI_HINT_IMAGE_RETRIES', 2),
+                )
+    return _pipeline
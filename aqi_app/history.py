@@ -0,0 +1,123 @@
+from aqi_service.db import DB_CONFIG
+from .queries import HISTORY_COLUMNS, HISTORY_PAGE_SQL, HISTORY_EXPORT_SQL
+import datetime
+import base64
+import json
+import csv
+import io
+import logging
+import pymysql
+
+logger = logging.getLogger(__name__)
+
+# 未指定日期范围时的边界
+MIN_DATE = datetime.date(1000, 1, 1)
+MAX_DATE = datetime.date(9999, 12, 31)
+
+# 导出时每次从服务端游标读取的行数
+EXPORT_FETCH_SIZE = 1000
+
+EXPORT_CONTENT_TYPES = {
+    'jsonl': 'application/x-ndjson',
+    'csv': 'text/csv; charset=utf-8',
+}
+
+
+def encode_cursor(date, row_id):
+    """将一页最后一行的 (DATE, id) 编码为不透明的游标"""
+    raw = f"{date.isoformat()}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """解析游标，返回 (DATE, id)；格式错误时抛出ValueError"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        date, row_id = raw.split('|')
+        return datetime.date.fromisoformat(date), int(row_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"无效的游标: {cursor}") from e
+
+
+def history_row(row):
+    """一行查询结果转换为接口返回的字段"""
+    item = dict(zip(HISTORY_COLUMNS, row))
+    return {
+        'site': item['SITE'],
+        'station': item['STATION'],
+        'name': item['NAME'],
+        'date': item['DATE'].isoformat() if item['DATE'] else None,
+        'aqi': item['AQI'],
+        'aqi_level': item['AQILEVEL'],
+    }
+
+
+def fetch_page(cursor, site, start, end, after=None, limit=500):
+    """读取一页历史数据
+
+    Args:
+        after: 上一页返回的 (DATE, id)，None表示从start开始
+
+    Returns:
+        (rows, next_after): next_after为下一页的 (DATE, id)，没有更多数据时为None
+    """
+    after_date, after_id = after or (start, 0)
+    # 多取一行判断是否还有下一页
+    cursor.execute(HISTORY_PAGE_SQL, [site, start, end, after_date, after_date, after_id, limit + 1])
+    rows = cursor.fetchall()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_after = None
+    if has_more:
+        last = dict(zip(HISTORY_COLUMNS, rows[-1]))
+        next_after = (last['DATE'], last['id'])
+    return [history_row(row) for row in rows], next_after
+
+
+def _format_jsonl(rows):
+    for row in rows:
+        yield json.dumps(row, ensure_ascii=False) + '\n'
+
+
+def _format_csv(rows):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=['site', 'station', 'name', 'date', 'aqi', 'aqi_level'])
+    writer.writeheader()
+    for row in rows:
+        writer.writerow(row)
+        if buffer.tell() >= 64 * 1024:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+FORMATTERS = {'jsonl': _format_jsonl, 'csv': _format_csv}
+
+
+def _iter_rows(conn, cursor, fetch_size):
+    try:
+        while True:
+            rows = cursor.fetchmany(fetch_size)
+            if not rows:
+                break
+            for row in rows:
+                yield history_row(row)
+    finally:
+        conn.close()
+
+
+def export_history(site, start, end, fmt, fetch_size=EXPORT_FETCH_SIZE):
+    """按格式逐块生成站点的全部历史数据，供StreamingHttpResponse使用
+
+    通过独立连接上的服务端游标逐批读取，内存占用与范围大小无关。服务端游标在读完之前独占所在连接，
+    因此不使用Django的请求连接；查询在返回前执行，连接失败时由调用方处理，生成器结束或被关闭时关闭连接。
+    """
+    conn = pymysql.connect(cursorclass=pymysql.cursors.SSCursor, **DB_CONFIG)
+    try:
+        cursor = conn.cursor()
+        cursor.execute(HISTORY_EXPORT_SQL, [site, start, end])
+    except Exception:
+        conn.close()
+        raise
+    return FORMATTERS[fmt](_iter_rows(conn, cursor, fetch_size))
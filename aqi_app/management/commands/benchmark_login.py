@@ -0,0 +1,58 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from aqi_app.cities import get_city_registry
+from aqi_app import authentication, response_cache
+import statistics
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    help = 'Benchmark the login endpoint: per-login query count and latency'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--username', required=True, help='登录用户名')
+        parser.add_argument('--password', required=True, help='登录密码')
+        parser.add_argument('--iterations', type=int, default=50, help='登录次数（默认50）')
+        parser.add_argument('--cold', action='store_true',
+                            help='每次登录前清空城市列表、AQI响应和用户缓存，测量冷启动路径')
+
+    def _clear_caches(self):
+        registry = get_city_registry()
+        response_cache.invalidate_sites(registry.known_sites())
+        registry.invalidate()
+        authentication._user_cache.clear()
+
+    def handle(self, *args, **options):
+        client = Client()
+        payload = {'username': options['username'], 'password': options['password']}
+        latencies = []
+        query_counts = []
+
+        for _ in range(options['iterations']):
+            if options['cold']:
+                self._clear_caches()
+            with CaptureQueriesContext(connection) as queries:
+                start = time.perf_counter()
+                response = client.post('/api/users/login/', payload, content_type='application/json')
+                latencies.append((time.perf_counter() - start) * 1000)
+            if response.status_code != 200:
+                raise CommandError(f"登录失败: {response.status_code} {response.content[:200]!r}")
+            query_counts.append(len(queries.captured_queries))
+
+        latencies_sorted = sorted(latencies)
+        p95 = latencies_sorted[min(len(latencies_sorted) - 1, int(len(latencies_sorted) * 0.95))]
+        self.stdout.write(f"登录次数: {len(latencies)} ({'冷缓存' if options['cold'] else '热缓存'})")
+        self.stdout.write(f"首次登录: {query_counts[0]} 次查询, {latencies[0]:.1f} ms")
+        self.stdout.write(
+            f"每次登录查询数: 平均 {statistics.mean(query_counts):.2f}, "
+            f"最少 {min(query_counts)}, 最多 {max(query_counts)}"
+        )
+        self.stdout.write(
+            f"延迟: 平均 {statistics.mean(latencies):.1f} ms, "
+            f"p50 {statistics.median(latencies):.1f} ms, p95 {p95:.1f} ms"
+        )
+        self.stdout.write(f"AQI响应缓存: {response_cache.stats()}")
@@ -0,0 +1,171 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from autogluon.tabular import TabularPredictor
+from aqi_app.tasks import get_aqi_level
+from aqi_app import feature_store
+from aqi_app.queries import GSOD_COLUMNS
+import pandas as pd
+import numpy as np
+import time
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 用于比较的最新GSOD数据
+HOLDOUT_SQL = f"SELECT {', '.join(GSOD_COLUMNS)} FROM gsod_data ORDER BY id DESC LIMIT %s"
+
+
+def directory_size(path):
+    """目录下所有文件的总大小（字节）"""
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                continue
+    return total
+
+
+def benchmark(predictor, X, repeat=3):
+    """返回 (预测结果, 每秒预测条数)，取repeat次中最快的一次"""
+    predictor.predict(X.head(min(len(X), 100)))  # 预热
+    best = None
+    predictions = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        predictions = predictor.predict(X)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return predictions, len(X) / max(best, 1e-9)
+
+
+def level_agreement(a, b):
+    """两组AQI预测值对应的AQI等级一致的比例"""
+    levels_a = [get_aqi_level(value) for value in np.asarray(a).tolist()]
+    levels_b = [get_aqi_level(value) for value in np.asarray(b).tolist()]
+    return float(np.mean([x == y for x, y in zip(levels_a, levels_b)])) if levels_a else float('nan')
+
+
+def regression_metrics(y_true, y_pred):
+    """MAE、RMSE和AQI等级准确率"""
+    y_true = np.asarray(y_true, dtype=float)
+    y_pred = np.asarray(y_pred, dtype=float)
+    errors = y_pred - y_true
+    return {
+        'mae': float(np.mean(np.abs(errors))),
+        'rmse': float(np.sqrt(np.mean(errors ** 2))),
+        'level_accuracy': level_agreement(y_true, y_pred),
+    }
+
+
+class Command(BaseCommand):
+    help = 'Export an inference-optimized copy of the AQI predictor and compare it with the full ensemble'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--source', default=None,
+                            help='训练好的模型目录（默认settings.AQI_PREDICTOR_PATH）')
+        parser.add_argument('--output', required=True, help='导出的部署模型目录')
+        parser.add_argument('--mode', choices=['refit-full', 'best-single'], default='refit-full',
+                            help='refit-full: 用全部训练数据重新训练最佳模型，将bagging的多折模型合并为单个模型；'
+                                 'best-single: 只保留验证分数最高的单个非集成模型')
+        parser.add_argument('--holdout-rows', type=int, default=5000,
+                            help='用于比较的最新gsod_data条数（默认5000）')
+        parser.add_argument('--labels', default=None,
+                            help='带AQI真实值的CSV（列与gsod_data相同并包含AQI列），提供时报告两者的真实误差')
+        parser.add_argument('--repeat', type=int, default=3, help='测量预测速度的重复次数')
+        parser.add_argument('--force', action='store_true', help='输出目录已存在时覆盖')
+
+    def _best_single_model(self, predictor):
+        """验证分数最高的第一层非集成模型"""
+        leaderboard = predictor.leaderboard(display=False)
+        candidates = leaderboard[
+            ~leaderboard['model'].str.contains('WeightedEnsemble')
+            & (leaderboard['stack_level'] == 1)
+            & leaderboard['can_infer']
+        ].sort_values('score_val', ascending=False)
+        if candidates.empty:
+            raise CommandError("模型中没有可用的单个非集成模型")
+        return candidates.iloc[0]['model']
+
+    def _export(self, predictor, output, mode, force):
+        if mode == 'best-single':
+            model = self._best_single_model(predictor)
+            self.stdout.write(f"导出单个最佳模型: {model}")
+            return predictor.clone_for_deployment(output, model=model, return_clone=True, dirs_exist_ok=force)
+
+        self.stdout.write(f"对最佳模型 {predictor.model_best} 执行refit_full...")
+        deployed = predictor.clone(output, return_clone=True, dirs_exist_ok=force)
+        refit_map = deployed.refit_full(model='best', set_best_to_refit_full=True)
+        logger.info(f"refit_full完成: {refit_map}")
+        deployed.delete_models(models_to_keep='best', dry_run=False)
+        deployed.save_space()
+        return deployed
+
+    def _load_holdout(self, rows):
+        with connection.cursor() as cursor:
+            cursor.execute(HOLDOUT_SQL, [rows])
+            return pd.DataFrame(cursor.fetchall(), columns=GSOD_COLUMNS)
+
+    def handle(self, *args, **options):
+        source = options['source'] or getattr(settings, 'AQI_PREDICTOR_PATH', 'autogluon_aqi_predictor')
+        output = options['output']
+        if os.path.abspath(source) == os.path.abspath(output):
+            raise CommandError("输出目录不能与原模型目录相同")
+        if os.path.exists(output) and not options['force']:
+            raise CommandError(f"输出目录 {output} 已存在，使用 --force 覆盖")
+
+        full = TabularPredictor.load(source)
+        start = time.perf_counter()
+        deployed = self._export(full, output, options['mode'], options['force'])
+        self.stdout.write(f"导出完成，耗时 {time.perf_counter() - start:.1f}s: {output}")
+
+        # 两个模型都常驻内存后再比较预测速度
+        full.persist()
+        deployed.persist()
+
+        rows = [
+            ('模型', source, output),
+            ('最佳模型', full.model_best, deployed.model_best),
+            ('模型数', len(full.model_names()), len(deployed.model_names())),
+            ('磁盘大小(MB)', f"{directory_size(source) / 2 ** 20:.1f}", f"{directory_size(output) / 2 ** 20:.1f}"),
+        ]
+
+        holdout = self._load_holdout(options['holdout_rows'])
+        if holdout.empty:
+            self.stdout.write(self.style.WARNING("gsod_data中没有数据，跳过预测速度和一致性比较"))
+        else:
+            # 只用这批数据内的历史计算滚动特征，与两个模型的输入一致即可
+            X = feature_store.add_history_features(holdout, {}).reindex(columns=full.features())
+            full_pred, full_speed = benchmark(full, X, options['repeat'])
+            deployed_pred, deployed_speed = benchmark(deployed, X, options['repeat'])
+            diff = np.abs(np.asarray(deployed_pred, dtype=float) - np.asarray(full_pred, dtype=float))
+            rows += [
+                (f'预测速度(条/秒, {len(X)}条)', f"{full_speed:.0f}", f"{deployed_speed:.0f}"),
+                ('加速比', '1.0x', f"{deployed_speed / max(full_speed, 1e-9):.1f}x"),
+                ('与完整集成的MAE', '-', f"{diff.mean():.3f}"),
+                ('与完整集成的最大偏差', '-', f"{diff.max():.3f}"),
+                ('与完整集成的AQI等级一致率', '-', f"{level_agreement(full_pred, deployed_pred):.2%}"),
+            ]
+
+        if options['labels']:
+            labelled = pd.read_csv(options['labels'])
+            if 'AQI' not in labelled.columns:
+                raise CommandError(f"{options['labels']} 中没有AQI列")
+            X = feature_store.training_features(labelled).reindex(columns=full.features())
+            full_metrics = regression_metrics(labelled['AQI'], full.predict(X))
+            deployed_metrics = regression_metrics(labelled['AQI'], deployed.predict(X))
+            rows += [
+                (f'真实MAE({len(labelled)}条)', f"{full_metrics['mae']:.3f}", f"{deployed_metrics['mae']:.3f}"),
+                ('真实RMSE', f"{full_metrics['rmse']:.3f}", f"{deployed_metrics['rmse']:.3f}"),
+                ('AQI等级准确率', f"{full_metrics['level_accuracy']:.2%}", f"{deployed_metrics['level_accuracy']:.2%}"),
+            ]
+
+        self.stdout.write("")
+        self.stdout.write(f"{'':<28}{'完整集成':<36}{'部署模型'}")
+        for name, full_value, deployed_value in rows:
+            self.stdout.write(f"{name:<28}{str(full_value):<36}{deployed_value}")
+        self.stdout.write("")
+        self.stdout.write(f"使用部署模型: 设置环境变量 AQI_PREDICTOR_PATH={output}，预测进程会自动加载")
@@ -0,0 +1,218 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from collections import defaultdict
+import pyarrow as pa
+import pyarrow.parquet as pq
+import shutil
+import json
+import time
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+_OBSERVATIONS = [
+    ('SITE', pa.string()),
+    ('STATION', pa.string()),
+    ('DATE', pa.date32()),
+    ('NAME', pa.string()),
+    ('TEMP', pa.float64()),
+    ('DEWP', pa.float64()),
+    ('STP', pa.float64()),
+    ('VISIB', pa.float64()),
+    ('WDSP', pa.float64()),
+    ('MXSPD', pa.float64()),
+    ('MAX', pa.float64()),
+    ('MIN', pa.float64()),
+    ('PRCP', pa.float64()),
+    ('MONTH', pa.int32()),
+]
+
+# 导出的表和列：不含aqi_result的HINTIMAGE图片，以及gsod_data的HANDLED和领取租约等流程状态列
+EXPORT_SCHEMAS = {
+    'aqi_result': pa.schema([('id', pa.int64())] + _OBSERVATIONS + [
+        ('AQI', pa.float64()),
+        ('AQILEVEL', pa.int32()),
+        ('HINTIMAGE_HASH', pa.string()),
+    ]),
+    'gsod_data': pa.schema([('id', pa.int64())] + _OBSERVATIONS),
+}
+
+FILE_EXTENSIONS = {'parquet': 'parquet', 'arrow': 'arrow'}
+
+# 导出进度，记录每个表已导出的最大id和id块大小
+STATE_FILE = '_export_state.json'
+
+# 每次增量导出时重新导出的id范围：事务提交的顺序与id分配的顺序不一定相同，
+# 上次导出时尚未提交、id较小的行在之后才可见
+DEFAULT_OVERLAP_IDS = 20000
+
+# DATE为空的行所在分区（pyarrow按hive分区读取时识别为null）
+NULL_PARTITION = '__HIVE_DEFAULT_PARTITION__'
+
+
+def batch_sql(table, schema):
+    """读取一个id块 (lo, hi] 的数据"""
+    return f"""
+        SELECT {', '.join(schema.names)} FROM {table}
+        WHERE id > %s AND id <= %s
+        ORDER BY id
+    """
+
+
+def block_start(last_id, overlap, block_size):
+    """增量导出的起点：从上次导出的最大id回退overlap个id，对齐到所在id块的起点"""
+    start = max(last_id - overlap, 0)
+    return start - start % block_size
+
+
+def to_arrow(rows, schema):
+    """查询结果转换为指定schema的Arrow表"""
+    columns = list(zip(*rows)) if rows else [[] for _ in schema.names]
+    return pa.Table.from_arrays(
+        [pa.array(values, type=field.type) for values, field in zip(columns, schema)],
+        schema=schema,
+    )
+
+
+def partition_dir(date):
+    if date is None:
+        return os.path.join(f"year={NULL_PARTITION}", f"month={NULL_PARTITION}")
+    return os.path.join(f"year={date.year}", f"month={date.month:02d}")
+
+
+def write_file(table, path, fmt):
+    """先写入临时文件再重命名，中断时不会留下不完整的文件"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + '.tmp'
+    if fmt == 'parquet':
+        pq.write_table(table, tmp, compression='zstd')
+    else:
+        # 不压缩的Arrow IPC文件可以直接内存映射读取，无需解码
+        with pa.OSFile(tmp, 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp, path)
+
+
+def load_state(output):
+    path = os.path.join(output, STATE_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_state(output, state):
+    path = os.path.join(output, STATE_FILE)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+    os.replace(path + '.tmp', path)
+
+
+class Command(BaseCommand):
+    help = ('Incrementally export aqi_result and gsod_data to date-partitioned Parquet or Arrow files. '
+            'Rows updated in place after export (e.g. re-imported gsod_data) are only picked up with --full.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', required=True, help='导出目录，每个表一个子目录，按 year=/month= 分区')
+        parser.add_argument('--tables', nargs='+', choices=list(EXPORT_SCHEMAS), default=list(EXPORT_SCHEMAS),
+                            help='要导出的表（默认全部）')
+        parser.add_argument('--format', dest='file_format', choices=list(FILE_EXTENSIONS), default='parquet',
+                            help='parquet: zstd压缩的Parquet；arrow: 不压缩的Arrow IPC文件，可直接内存映射读取')
+        parser.add_argument('--batch-size', type=int, default=50000,
+                            help='每个id块的大小，每次从数据库读取一块（默认50000）；更改时需使用 --full')
+        parser.add_argument('--pause', type=float, default=0.0, help='每批之间暂停的秒数，降低对数据库的压力')
+        parser.add_argument('--overlap-ids', type=int, default=DEFAULT_OVERLAP_IDS,
+                            help=f'每次重新导出上次最大id之前的id数，补上之后才提交的较小id的行（默认{DEFAULT_OVERLAP_IDS}）')
+        parser.add_argument('--full', action='store_true',
+                            help='删除已导出的文件和进度，从头导出；已导出的行被原地更新后（如gsod_data重新导入）需使用')
+
+    def _export_table(self, table, output, fmt, block_size, overlap, pause, state):
+        """按固定的id块导出，每块写入后记录进度，中断后从此处继续
+
+        每块的文件名由块的id范围决定，从上次导出的最大id之前overlap个id所在的块开始重新导出时覆盖同名文件，
+        不会产生重复的行。已导出后被原地更新的行不在重新导出的范围内，需要 --full 重新导出。
+        """
+        last_id = state[table]['last_id'] if table in state else 0
+        schema = EXPORT_SCHEMAS[table]
+        sql = batch_sql(table, schema)
+        with connection.cursor() as cursor:
+            # 以开始时的最大id为上界，导出期间新写入的数据留给下一次增量导出
+            cursor.execute(f"SELECT MAX(id) FROM {table}")
+            max_id = cursor.fetchone()[0] or 0
+
+            exported = files = 0
+            lo = block_start(last_id, overlap, block_size)
+            while lo < max_id:
+                hi = lo + block_size
+                cursor.execute(sql, [lo, min(hi, max_id)])
+                rows = cursor.fetchall()
+                if not rows:
+                    # 跳过没有数据的块
+                    cursor.execute(f"SELECT MIN(id) FROM {table} WHERE id > %s AND id <= %s", [hi, max_id])
+                    next_id = cursor.fetchone()[0]
+                    if next_id is None:
+                        break
+                    lo = block_start(next_id - 1, 0, block_size)
+                    continue
+
+                batch = to_arrow(rows, schema)
+                partitions = defaultdict(list)
+                for i, date in enumerate(batch.column('DATE').to_pylist()):
+                    partitions[partition_dir(date)].append(i)
+                # 文件名为块的id范围，重新导出同一块时覆盖而不会重复
+                name = f"part-{lo + 1:010d}-{hi:010d}.{FILE_EXTENSIONS[fmt]}"
+                for directory, indices in partitions.items():
+                    write_file(batch.take(indices), os.path.join(output, table, directory, name), fmt)
+                    files += 1
+
+                exported += len(rows)
+                last_id = max(last_id, rows[-1][0])
+                state[table] = {'format': fmt, 'block_size': block_size, 'last_id': last_id}
+                save_state(output, state)
+                logger.info(f"{table}: 已导出到id {rows[-1][0]}（共 {exported} 行，{files} 个文件）")
+                lo = hi
+                if pause:
+                    time.sleep(pause)
+
+        state.setdefault(table, {'format': fmt, 'block_size': block_size, 'last_id': last_id})
+        save_state(output, state)
+        self.stdout.write(f"{table}: 导出 {exported} 行，写入 {files} 个文件，已导出到id {last_id}")
+
+    def handle(self, *args, **options):
+        output = options['output']
+        fmt = options['file_format']
+        if options['batch_size'] <= 0:
+            raise CommandError("--batch-size必须大于0")
+        if options['overlap_ids'] < 0:
+            raise CommandError("--overlap-ids不能小于0")
+        os.makedirs(output, exist_ok=True)
+
+        state = load_state(output)
+        for table in options['tables']:
+            if options['full']:
+                shutil.rmtree(os.path.join(output, table), ignore_errors=True)
+                state.pop(table, None)
+            table_state = state.get(table)
+            if table_state and table_state['format'] != fmt:
+                raise CommandError(
+                    f"{table} 已按 {table_state['format']} 格式导出，使用 --format {table_state['format']} "
+                    f"继续增量导出，或使用 --full 重新导出"
+                )
+            if table_state and table_state.get('block_size') != options['batch_size']:
+                # 文件按id块命名，块大小不同时重新导出的文件无法覆盖已有的文件
+                raise CommandError(
+                    f"{table} 的导出进度与 --batch-size {options['batch_size']} 的id块不一致"
+                    f"（已导出的块大小: {table_state.get('block_size')}），使用 --full 重新导出"
+                )
+
+            start = time.monotonic()
+            self._export_table(table, output, fmt, options['batch_size'], options['overlap_ids'],
+                               options['pause'], state)
+            logger.info(f"{table} 导出耗时 {time.monotonic() - start:.1f}s")
+
+        reader = 'parquet' if fmt == 'parquet' else 'ipc'
+        self.stdout.write(
+            f"读取示例: pyarrow.dataset.dataset('{os.path.join(output, options['tables'][0])}', "
+            f"format='{reader}', partitioning='hive')"
+        )
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from aqi_app.tasks import rebuild_latest_aqi
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    help = 'Rebuild the latest-AQI-per-site table from aqi_result'
+
+    def handle(self, *args, **options):
+        start = time.monotonic()
+        sites = rebuild_latest_aqi()
+        elapsed = time.monotonic() - start
+        logger.info(f"aqi_latest重建完成: {sites} 个站点, 耗时 {elapsed:.1f}s")
+        self.stdout.write(f"aqi_latest重建完成: {sites} 个站点, 耗时 {elapsed:.1f}s")
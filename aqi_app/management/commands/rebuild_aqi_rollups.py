@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from aqi_app.tasks import rebuild_aqi_rollups
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    help = 'Rebuild the daily and monthly AQI rollup tables from aqi_result'
+
+    def handle(self, *args, **options):
+        start = time.monotonic()
+        daily, monthly = rebuild_aqi_rollups()
+        elapsed = time.monotonic() - start
+        logger.info(f"AQI汇总表重建完成: 每日 {daily} 行, 每月 {monthly} 行, 耗时 {elapsed:.1f}s")
+        self.stdout.write(f"AQI汇总表重建完成: 每日 {daily} 行, 每月 {monthly} 行, 耗时 {elapsed:.1f}s")
@@ -1,35 +1,60 @@
 from django.core.management.base import BaseCommand
-from aqi_app.tasks import predict_aqi
-import schedule
-import time
+from aqi_app.tasks import predict_aqi, DEFAULT_CHUNK_SIZE
+from aqi_app.predictor import get_predictor_holder
+from aqi_app.parallel_prediction import predict_aqi_parallel, shutdown_worker_pool
+from aqi_app.scheduler import get_prediction_scheduler
 import logging
 
 logger = logging.getLogger(__name__)
 
 class Command(BaseCommand):
-    help = 'Run AQI prediction task periodically'
+    help = 'Run AQI prediction whenever new GSOD data is imported or unhandled data is found'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--drain', action='store_true',
+                            help='每次运行持续处理，直到未处理数据全部完成')
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                            help=f'每批处理的数据条数（默认{DEFAULT_CHUNK_SIZE}）')
+        parser.add_argument('--time-budget', type=float, default=None,
+                            help='drain模式下每次运行的时间预算（秒）')
+        parser.add_argument('--workers', type=int, default=1,
+                            help='并行预测的进程数；大于1时每次运行按id区间分片并处理全部未处理数据（忽略--drain和--time-budget）')
 
     def handle(self, *args, **options):
         logger.info("Starting AQI prediction scheduler")
-        
-        # 立即执行一次预测任务
-        self.stdout.write("执行立即预测...")
-        predict_aqi()
-        self.stdout.write("立即预测完成")
-        
-        # 每天凌晨1点运行预测任务
-        schedule.every().day.at("01:00").do(predict_aqi)
-        
-        # 开发测试用：每10分钟执行一次
-        schedule.every(10).minutes.do(predict_aqi)
-        
-        self.stdout.write("已设置定时任务: 每天凌晨1点和每10分钟执行一次")
-        
-        while True:
+
+        # 预先加载模型，后续每次预测复用同一个常驻实例；并行模式下由常驻的各工作进程首次使用时加载
+        if options['workers'] <= 1:
             try:
-                schedule.run_pending()
-                time.sleep(60)  # 每分钟检查一次
+                get_predictor_holder().get()
             except Exception as e:
-                logger.error(f"Error in scheduler: {str(e)}")
-                self.stderr.write(f"定时任务出错: {str(e)}")
-                time.sleep(300)  # 发生错误时等待5分钟再继续 
\ No newline at end of file
+                logger.error(f"预加载模型失败: {str(e)}")
+
+        def run_prediction():
+            if options['workers'] > 1:
+                summary = predict_aqi_parallel(workers=options['workers'], chunk_size=options['chunk_size'])
+                for pid, worker in sorted(summary['workers'].items()):
+                    self.stdout.write(
+                        f"进程 {pid}: {worker['shards']} 个区间, {worker['processed']} 条, "
+                        f"{worker['rows_per_second']:.0f} 条/秒"
+                    )
+                return summary
+            return predict_aqi(
+                drain=options['drain'],
+                chunk_size=options['chunk_size'],
+                time_budget=options['time_budget'],
+            )
+
+        # 导入脚本发出信号或探测到未处理数据时立即运行；上一轮未结束时不会重复运行，空闲和出错时指数退避
+        scheduler = get_prediction_scheduler(run_prediction)
+        self.stdout.write(
+            f"已启动预测调度: 空闲探测间隔 {scheduler.min_idle}-{scheduler.max_idle}s, "
+            f"出错退避 {scheduler.error_backoff}-{scheduler.max_error_backoff}s"
+        )
+        try:
+            scheduler.serve_forever()
+        except KeyboardInterrupt:
+            scheduler.stop()
+            self.stdout.write(f"预测调度已停止: {scheduler.stats()}")
+        finally:
+            shutdown_worker_pool()
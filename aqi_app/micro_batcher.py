@@ -0,0 +1,130 @@
+from django.conf import settings
+from concurrent.futures import Future
+import pandas as pd
+import numpy as np
+import threading
+import logging
+import queue
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class MicroBatcher:
+    """将短时间内到达的在线预测请求合并为一次predict调用
+
+    后台线程取到第一个请求后最多再等待max_wait秒收集后续请求（总行数不超过max_batch），
+    拼接为一个DataFrame整体预测，再按行数拆分结果返回给各请求。
+    """
+
+    def __init__(self, predict, max_batch=256, max_wait=0.005):
+        """
+        Args:
+            predict: 接收DataFrame、返回与之按位置对应的预测值的函数
+            max_batch: 每次合并的最大行数
+            max_wait: 收到第一个请求后等待后续请求的最长时间（秒）
+        """
+        self.predict = predict
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stats = {'requests': 0, 'rows': 0, 'batches': 0, 'errors': 0, 'predict_seconds': 0.0}
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='aqi-micro-batcher', daemon=True)
+                self._thread.start()
+
+    def submit(self, frame):
+        """提交一个DataFrame，返回Future，结果为与frame按位置对应的预测值数组"""
+        future = Future()
+        self._ensure_started()
+        self._queue.put((frame, future))
+        return future
+
+    def predict_frame(self, frame, timeout=None):
+        """提交并等待结果"""
+        return self.submit(frame).result(timeout=timeout)
+
+    def _collect(self):
+        """阻塞直到有请求，然后在max_wait内尽量多收集请求"""
+        batch = [self._queue.get()]
+        rows = len(batch[0][0])
+        deadline = time.monotonic() + self.max_wait
+        while rows < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(item)
+            rows += len(item[0])
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            batch = [(frame, future) for frame, future in batch if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            frames = [frame for frame, _ in batch]
+            try:
+                start = time.perf_counter()
+                combined = pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+                predictions = np.asarray(self.predict(combined))
+                elapsed = time.perf_counter() - start
+            except Exception as e:
+                logger.error(f"在线预测失败: {str(e)}")
+                with self._lock:
+                    self._stats['errors'] += 1
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            offset = 0
+            for frame, future in batch:
+                future.set_result(predictions[offset:offset + len(frame)])
+                offset += len(frame)
+            with self._lock:
+                self._stats['requests'] += len(batch)
+                self._stats['rows'] += len(combined)
+                self._stats['batches'] += 1
+                self._stats['predict_seconds'] += elapsed
+
+    def stats(self):
+        """请求数、合并批次数和平均每批请求数"""
+        with self._lock:
+            stats = dict(self._stats)
+        stats['requests_per_batch'] = stats['requests'] / stats['batches'] if stats['batches'] else 0.0
+        stats['queued'] = self._queue.qsize()
+        return stats
+
+
+def _predict_with_resident_model(frame):
+    from .predictor import get_predictor_holder
+    predictor = get_predictor_holder().get()
+    # 在线请求没有站点历史，模型需要的历史特征按缺失处理
+    return predictor.predict(frame.reindex(columns=predictor.features()))
+
+
+_batcher = None
+_batcher_lock = threading.Lock()
+
+
+def get_micro_batcher():
+    """获取进程级共享的在线预测合并器（使用进程内常驻的模型）"""
+    global _batcher
+    if _batcher is None:
+        with _batcher_lock:
+            if _batcher is None:
+                _batcher = MicroBatcher(
+                    _predict_with_resident_model,
+                    max_batch=getattr(settings, 'AQI_ONLINE_MAX_BATCH', 256),
+                    max_wait=getattr(settings, 'AQI_ONLINE_BATCH_WAIT_MS', 5) / 1000,
+                )
+    return _batcher
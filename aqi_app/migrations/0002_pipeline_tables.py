@@ -0,0 +1,146 @@
+from django.db import migrations, models
+
+# 由本迁移管理的表
+PIPELINE_MODELS = ['GsodData', 'AqiResult', 'HintImage', 'AqiLatest']
+
+# 导入脚本和预测任务写入时依赖的数据库默认值（Django不会为字段生成数据库层默认值）
+DATABASE_DEFAULTS = [
+    "UPDATE gsod_data SET HANDLED = 0 WHERE HANDLED IS NULL",
+    "ALTER TABLE gsod_data MODIFY HANDLED BOOLEAN NOT NULL DEFAULT FALSE",
+    "ALTER TABLE hint_image MODIFY CREATED_AT TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP",
+    "ALTER TABLE aqi_latest MODIFY UPDATED_AT TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP",
+]
+
+
+def create_or_upgrade_tables(apps, schema_editor):
+    """创建缺失的表；对scripts/database.sql建立的已有表补齐缺失的列和索引
+
+    按内容寻址存储提示图片之前建立的数据库没有hint_image表和aqi_result.HINTIMAGE_HASH列，在此创建和添加。
+    """
+    connection = schema_editor.connection
+    with connection.cursor() as cursor:
+        existing_tables = set(connection.introspection.table_names(cursor))
+
+    for model_name in PIPELINE_MODELS:
+        model = apps.get_model('aqi_app', model_name)
+        table = model._meta.db_table
+        if table not in existing_tables:
+            schema_editor.create_model(model)
+            continue
+
+        with connection.cursor() as cursor:
+            columns = {col.name for col in connection.introspection.get_table_description(cursor, table)}
+            constraints = connection.introspection.get_constraints(cursor, table)
+        for field in model._meta.local_fields:
+            if field.column not in columns:
+                schema_editor.add_field(model, field)
+        for index in model._meta.indexes:
+            if index.name not in constraints:
+                schema_editor.add_index(model, index)
+
+    for sql in DATABASE_DEFAULTS:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('aqi_app', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='user',
+            options={'managed': False},
+        ),
+        # 先更新迁移状态，RunPython才能通过apps取得新的模型定义
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='HintImage',
+                    fields=[
+                        ('hash', models.CharField(db_column='HASH', max_length=64, primary_key=True, serialize=False)),
+                        ('aqi_level', models.IntegerField(db_column='AQILEVEL')),
+                        ('city_name', models.CharField(db_column='CITY_NAME', max_length=128)),
+                        ('city_features', models.CharField(db_column='CITY_FEATURES', max_length=512)),
+                        ('image', models.BinaryField(db_column='IMAGE')),
+                        ('created_at', models.DateTimeField(auto_now_add=True, db_column='CREATED_AT')),
+                    ],
+                    options={
+                        'db_table': 'hint_image',
+                    },
+                ),
+                migrations.CreateModel(
+                    name='GsodData',
+                    fields=[
+                        ('id', models.AutoField(primary_key=True, serialize=False)),
+                        ('site', models.CharField(db_column='SITE', max_length=32, null=True)),
+                        ('station', models.CharField(db_column='STATION', max_length=32, null=True)),
+                        ('date', models.DateField(db_column='DATE', null=True)),
+                        ('name', models.CharField(db_column='NAME', max_length=128, null=True)),
+                        ('temp', models.FloatField(db_column='TEMP', null=True)),
+                        ('dewp', models.FloatField(db_column='DEWP', null=True)),
+                        ('stp', models.FloatField(db_column='STP', null=True)),
+                        ('visib', models.FloatField(db_column='VISIB', null=True)),
+                        ('wdsp', models.FloatField(db_column='WDSP', null=True)),
+                        ('mxspd', models.FloatField(db_column='MXSPD', null=True)),
+                        ('max', models.FloatField(db_column='MAX', null=True)),
+                        ('min', models.FloatField(db_column='MIN', null=True)),
+                        ('prcp', models.FloatField(db_column='PRCP', null=True)),
+                        ('month', models.IntegerField(db_column='MONTH', null=True)),
+                        ('handled', models.BooleanField(db_column='HANDLED', default=False)),
+                    ],
+                    options={
+                        'db_table': 'gsod_data',
+                        'indexes': [models.Index(fields=['handled', 'id'], name='gsod_handled_id_idx')],
+                    },
+                ),
+                migrations.CreateModel(
+                    name='AqiResult',
+                    fields=[
+                        ('id', models.AutoField(primary_key=True, serialize=False)),
+                        ('site', models.CharField(db_column='SITE', max_length=32, null=True)),
+                        ('station', models.CharField(db_column='STATION', max_length=32, null=True)),
+                        ('date', models.DateField(db_column='DATE', null=True)),
+                        ('name', models.CharField(db_column='NAME', max_length=128, null=True)),
+                        ('temp', models.FloatField(db_column='TEMP', null=True)),
+                        ('dewp', models.FloatField(db_column='DEWP', null=True)),
+                        ('stp', models.FloatField(db_column='STP', null=True)),
+                        ('visib', models.FloatField(db_column='VISIB', null=True)),
+                        ('wdsp', models.FloatField(db_column='WDSP', null=True)),
+                        ('mxspd', models.FloatField(db_column='MXSPD', null=True)),
+                        ('max', models.FloatField(db_column='MAX', null=True)),
+                        ('min', models.FloatField(db_column='MIN', null=True)),
+                        ('prcp', models.FloatField(db_column='PRCP', null=True)),
+                        ('month', models.IntegerField(db_column='MONTH', null=True)),
+                        ('aqi', models.FloatField(db_column='AQI', null=True)),
+                        ('aqi_level', models.IntegerField(db_column='AQILEVEL', null=True)),
+                        ('hint_image', models.BinaryField(db_column='HINTIMAGE', null=True)),
+                        ('hint_image_hash', models.CharField(db_column='HINTIMAGE_HASH', max_length=64, null=True)),
+                    ],
+                    options={
+                        'db_table': 'aqi_result',
+                        'indexes': [models.Index(fields=['site', 'date', 'id'], name='aqi_result_site_date_idx'), models.Index(fields=['date'], name='aqi_result_date_idx'), models.Index(fields=['site', 'name'], name='aqi_result_site_name_idx')],
+                    },
+                ),
+                migrations.CreateModel(
+                    name='AqiLatest',
+                    fields=[
+                        ('site', models.CharField(db_column='SITE', max_length=32, primary_key=True, serialize=False)),
+                        ('name', models.CharField(db_column='NAME', max_length=128, null=True)),
+                        ('date', models.DateField(db_column='DATE', null=True)),
+                        ('aqi', models.FloatField(db_column='AQI', null=True)),
+                        ('aqi_level', models.IntegerField(db_column='AQILEVEL', null=True)),
+                        ('hint_image_hash', models.CharField(db_column='HINTIMAGE_HASH', max_length=64, null=True)),
+                        ('result_id', models.IntegerField(db_column='RESULT_ID', null=True)),
+                        ('updated_at', models.DateTimeField(auto_now=True, db_column='UPDATED_AT')),
+                    ],
+                    options={
+                        'db_table': 'aqi_latest',
+                        'indexes': [models.Index(fields=['date'], name='aqi_latest_date_idx')],
+                    },
+                ),
+            ],
+        ),
+        migrations.RunPython(create_or_upgrade_tables, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,71 @@
+from django.db import migrations, models
+
+
+def dedupe_and_upgrade(apps, schema_editor):
+    """清理重复的(STATION, DATE)数据后建立唯一约束，并创建导入清单表（已存在时跳过）"""
+    connection = schema_editor.connection
+    GsodData = apps.get_model('aqi_app', 'GsodData')
+    Manifest = apps.get_model('aqi_app', 'GsodImportManifest')
+
+    with connection.cursor() as cursor:
+        existing_tables = set(connection.introspection.table_names(cursor))
+        constraints = connection.introspection.get_constraints(cursor, GsodData._meta.db_table)
+
+    if 'gsod_station_date_uniq' not in constraints:
+        # 重复导入产生的数据只保留id最小的一条；同组中任意一条已预测时保留的一条标记为已处理，避免重复预测
+        schema_editor.execute("""
+            UPDATE gsod_data g
+            JOIN (
+                SELECT MIN(id) AS id FROM gsod_data
+                GROUP BY STATION, DATE
+                HAVING COUNT(*) > 1 AND MAX(HANDLED) = 1
+            ) survivor ON g.id = survivor.id
+            SET g.HANDLED = 1
+        """)
+        schema_editor.execute("""
+            DELETE g1 FROM gsod_data g1
+            JOIN gsod_data g2
+              ON g1.STATION = g2.STATION AND g1.DATE = g2.DATE AND g1.id > g2.id
+        """)
+        schema_editor.add_constraint(GsodData, GsodData._meta.constraints[0])
+
+    if Manifest._meta.db_table not in existing_tables:
+        schema_editor.create_model(Manifest)
+    schema_editor.execute(
+        "ALTER TABLE gsod_import_manifest MODIFY IMPORTED_AT TIMESTAMP NOT NULL "
+        "DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP"
+    )
+
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('aqi_app', '0002_pipeline_tables'),
+    ]
+
+    operations = [
+        # 先更新迁移状态，RunPython才能通过apps取得新的模型定义
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='GsodImportManifest',
+                    fields=[
+                        ('path', models.CharField(db_column='PATH', max_length=255, primary_key=True, serialize=False)),
+                        ('size', models.BigIntegerField(db_column='SIZE')),
+                        ('checksum', models.CharField(db_column='CHECKSUM', max_length=64)),
+                        ('imported_rows', models.IntegerField(db_column='IMPORTED_ROWS')),
+                        ('imported_at', models.DateTimeField(auto_now=True, db_column='IMPORTED_AT')),
+                    ],
+                    options={
+                        'db_table': 'gsod_import_manifest',
+                    },
+                ),
+                migrations.AddConstraint(
+                    model_name='gsoddata',
+                    constraint=models.UniqueConstraint(fields=('station', 'date'), name='gsod_station_date_uniq'),
+                ),
+            ],
+        ),
+        migrations.RunPython(dedupe_and_upgrade, migrations.RunPython.noop),
+    ]
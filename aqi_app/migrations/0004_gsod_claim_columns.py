@@ -0,0 +1,41 @@
+from django.db import migrations, models
+
+CLAIM_COLUMNS = ['claimed_by', 'claimed_until']
+
+
+def add_claim_columns(apps, schema_editor):
+    """为gsod_data添加领取租约列（scripts/database.sql建立的表已包含时跳过）"""
+    connection = schema_editor.connection
+    GsodData = apps.get_model('aqi_app', 'GsodData')
+    with connection.cursor() as cursor:
+        columns = {col.name for col in connection.introspection.get_table_description(cursor, GsodData._meta.db_table)}
+    for name in CLAIM_COLUMNS:
+        field = GsodData._meta.get_field(name)
+        if field.column not in columns:
+            schema_editor.add_field(GsodData, field)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('aqi_app', '0003_gsod_import_manifest'),
+    ]
+
+    operations = [
+        # 先更新迁移状态，RunPython才能通过apps取得新的模型定义
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddField(
+                    model_name='gsoddata',
+                    name='claimed_by',
+                    field=models.CharField(db_column='CLAIMED_BY', max_length=64, null=True),
+                ),
+                migrations.AddField(
+                    model_name='gsoddata',
+                    name='claimed_until',
+                    field=models.DateTimeField(db_column='CLAIMED_UNTIL', null=True),
+                ),
+            ],
+        ),
+        migrations.RunPython(add_claim_columns, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,43 @@
+from django.db import migrations, models
+
+
+def create_feature_state_table(apps, schema_editor):
+    """创建站点特征状态表（scripts/database.sql已建立时跳过）"""
+    connection = schema_editor.connection
+    StationFeatureState = apps.get_model('aqi_app', 'StationFeatureState')
+    with connection.cursor() as cursor:
+        existing_tables = set(connection.introspection.table_names(cursor))
+    if StationFeatureState._meta.db_table not in existing_tables:
+        schema_editor.create_model(StationFeatureState)
+    schema_editor.execute(
+        "ALTER TABLE station_feature_state MODIFY UPDATED_AT TIMESTAMP NOT NULL "
+        "DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP"
+    )
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('aqi_app', '0004_gsod_claim_columns'),
+    ]
+
+    operations = [
+        # 先更新迁移状态，RunPython才能通过apps取得新的模型定义
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='StationFeatureState',
+                    fields=[
+                        ('station', models.CharField(db_column='STATION', max_length=32, primary_key=True, serialize=False)),
+                        ('last_date', models.DateField(db_column='LAST_DATE', null=True)),
+                        ('last_aqi', models.FloatField(db_column='LAST_AQI', null=True)),
+                        ('history', models.TextField(db_column='HISTORY')),
+                        ('updated_at', models.DateTimeField(auto_now=True, db_column='UPDATED_AT')),
+                    ],
+                    options={
+                        'db_table': 'station_feature_state',
+                    },
+                ),
+            ],
+        ),
+        migrations.RunPython(create_feature_state_table, migrations.RunPython.noop),
+    ]
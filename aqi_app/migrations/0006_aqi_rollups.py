@@ -0,0 +1,107 @@
+from django.db import migrations, models
+
+# 从aqi_result回填汇总表；迁移自带SQL，不随应用代码中汇总逻辑的修改而改变
+BACKFILL_SQL = [
+    "DELETE FROM aqi_daily_rollup",
+    "DELETE FROM aqi_monthly_rollup",
+    """
+    INSERT INTO aqi_daily_rollup
+        (SITE, DATE, SAMPLES, AQI_SUM, AQI_MAX, AQI_MIN, LEVEL_1, LEVEL_2, LEVEL_3, LEVEL_4, LEVEL_5, LEVEL_6)
+    SELECT SITE, DATE, COUNT(AQI), COALESCE(SUM(AQI), 0), MAX(AQI), MIN(AQI),
+           SUM(AQILEVEL = 1), SUM(AQILEVEL = 2), SUM(AQILEVEL = 3),
+           SUM(AQILEVEL = 4), SUM(AQILEVEL = 5), SUM(AQILEVEL = 6)
+    FROM aqi_result
+    WHERE SITE IS NOT NULL AND DATE IS NOT NULL AND AQI IS NOT NULL
+    GROUP BY SITE, DATE
+    """,
+    """
+    INSERT INTO aqi_monthly_rollup
+        (SITE, YEAR, MONTH, SAMPLES, AQI_SUM, AQI_MAX, AQI_MIN, LEVEL_1, LEVEL_2, LEVEL_3, LEVEL_4, LEVEL_5, LEVEL_6)
+    SELECT SITE, YEAR(DATE), MONTH(DATE), SUM(SAMPLES), SUM(AQI_SUM), MAX(AQI_MAX), MIN(AQI_MIN),
+           SUM(LEVEL_1), SUM(LEVEL_2), SUM(LEVEL_3), SUM(LEVEL_4), SUM(LEVEL_5), SUM(LEVEL_6)
+    FROM aqi_daily_rollup
+    GROUP BY SITE, YEAR(DATE), MONTH(DATE)
+    """,
+]
+
+
+def create_rollup_tables(apps, schema_editor):
+    """创建每日/每月AQI汇总表（scripts/database.sql已建立时跳过），并从aqi_result回填"""
+    connection = schema_editor.connection
+    with connection.cursor() as cursor:
+        existing_tables = set(connection.introspection.table_names(cursor))
+    created = False
+    for name in ('AqiDailyRollup', 'AqiMonthlyRollup'):
+        model = apps.get_model('aqi_app', name)
+        if model._meta.db_table not in existing_tables:
+            schema_editor.create_model(model)
+            created = True
+    if created:
+        for sql in BACKFILL_SQL:
+            schema_editor.execute(sql)
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('aqi_app', '0005_station_feature_state'),
+    ]
+
+    operations = [
+        # 先更新迁移状态，RunPython才能通过apps取得新的模型定义
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='AqiDailyRollup',
+                    fields=[
+                        ('id', models.AutoField(primary_key=True, serialize=False)),
+                        ('site', models.CharField(db_column='SITE', max_length=32)),
+                        ('date', models.DateField(db_column='DATE')),
+                        ('samples', models.IntegerField(db_column='SAMPLES')),
+                        ('aqi_sum', models.FloatField(db_column='AQI_SUM')),
+                        ('aqi_max', models.FloatField(db_column='AQI_MAX', null=True)),
+                        ('aqi_min', models.FloatField(db_column='AQI_MIN', null=True)),
+                        ('level_1', models.IntegerField(db_column='LEVEL_1', default=0)),
+                        ('level_2', models.IntegerField(db_column='LEVEL_2', default=0)),
+                        ('level_3', models.IntegerField(db_column='LEVEL_3', default=0)),
+                        ('level_4', models.IntegerField(db_column='LEVEL_4', default=0)),
+                        ('level_5', models.IntegerField(db_column='LEVEL_5', default=0)),
+                        ('level_6', models.IntegerField(db_column='LEVEL_6', default=0)),
+                    ],
+                    options={
+                        'db_table': 'aqi_daily_rollup',
+                    },
+                ),
+                migrations.CreateModel(
+                    name='AqiMonthlyRollup',
+                    fields=[
+                        ('id', models.AutoField(primary_key=True, serialize=False)),
+                        ('site', models.CharField(db_column='SITE', max_length=32)),
+                        ('year', models.IntegerField(db_column='YEAR')),
+                        ('month', models.IntegerField(db_column='MONTH')),
+                        ('samples', models.IntegerField(db_column='SAMPLES')),
+                        ('aqi_sum', models.FloatField(db_column='AQI_SUM')),
+                        ('aqi_max', models.FloatField(db_column='AQI_MAX', null=True)),
+                        ('aqi_min', models.FloatField(db_column='AQI_MIN', null=True)),
+                        ('level_1', models.IntegerField(db_column='LEVEL_1', default=0)),
+                        ('level_2', models.IntegerField(db_column='LEVEL_2', default=0)),
+                        ('level_3', models.IntegerField(db_column='LEVEL_3', default=0)),
+                        ('level_4', models.IntegerField(db_column='LEVEL_4', default=0)),
+                        ('level_5', models.IntegerField(db_column='LEVEL_5', default=0)),
+                        ('level_6', models.IntegerField(db_column='LEVEL_6', default=0)),
+                    ],
+                    options={
+                        'db_table': 'aqi_monthly_rollup',
+                    },
+                ),
+                migrations.AddConstraint(
+                    model_name='aqidailyrollup',
+                    constraint=models.UniqueConstraint(fields=('site', 'date'), name='aqi_daily_rollup_site_date_uniq'),
+                ),
+                migrations.AddConstraint(
+                    model_name='aqimonthlyrollup',
+                    constraint=models.UniqueConstraint(fields=('site', 'year', 'month'), name='aqi_monthly_rollup_site_month_uniq'),
+                ),
+            ],
+        ),
+        migrations.RunPython(create_rollup_tables, migrations.RunPython.noop),
+    ]
@@ -36,4 +36,176 @@ class User(AbstractBaseUser):
     
     class Meta:
         db_table = 'users'
-        managed = False  # 不允许Django管理表结构 
\ No newline at end of file
+        managed = False  # 不允许Django管理表结构 
+
+class GsodData(models.Model):
+    """GSOD气象观测数据，predict_aqi的输入"""
+    id = models.AutoField(primary_key=True)
+    site = models.CharField(max_length=32, null=True, db_column='SITE')
+    station = models.CharField(max_length=32, null=True, db_column='STATION')
+    date = models.DateField(null=True, db_column='DATE')
+    name = models.CharField(max_length=128, null=True, db_column='NAME')
+    temp = models.FloatField(null=True, db_column='TEMP')
+    dewp = models.FloatField(null=True, db_column='DEWP')
+    stp = models.FloatField(null=True, db_column='STP')
+    visib = models.FloatField(null=True, db_column='VISIB')
+    wdsp = models.FloatField(null=True, db_column='WDSP')
+    mxspd = models.FloatField(null=True, db_column='MXSPD')
+    max = models.FloatField(null=True, db_column='MAX')
+    min = models.FloatField(null=True, db_column='MIN')
+    prcp = models.FloatField(null=True, db_column='PRCP')
+    month = models.IntegerField(null=True, db_column='MONTH')
+    handled = models.BooleanField(default=False, db_column='HANDLED')
+    # 预测进程领取数据的租约：领取者标识和租约到期时间，到期后其他进程可以重新领取
+    claimed_by = models.CharField(max_length=64, null=True, db_column='CLAIMED_BY')
+    claimed_until = models.DateTimeField(null=True, db_column='CLAIMED_UNTIL')
+
+    class Meta:
+        db_table = 'gsod_data'
+        indexes = [
+            # 未处理数据按id做keyset分页: WHERE HANDLED = 0 AND id > %s ORDER BY id
+            models.Index(fields=['handled', 'id'], name='gsod_handled_id_idx'),
+        ]
+        constraints = [
+            # 导入时按(STATION, DATE)做upsert，重复导入不会产生重复数据
+            models.UniqueConstraint(fields=['station', 'date'], name='gsod_station_date_uniq'),
+        ]
+
+
+class GsodImportManifest(models.Model):
+    """已导入的GSOD文件清单，文件大小和校验和未变化时跳过导入"""
+    path = models.CharField(max_length=255, primary_key=True, db_column='PATH')
+    size = models.BigIntegerField(db_column='SIZE')
+    checksum = models.CharField(max_length=64, db_column='CHECKSUM')
+    imported_rows = models.IntegerField(db_column='IMPORTED_ROWS')
+    imported_at = models.DateTimeField(auto_now=True, db_column='IMPORTED_AT')
+
+    class Meta:
+        db_table = 'gsod_import_manifest'
+
+
+class AqiResult(models.Model):
+    """AQI预测结果"""
+    id = models.AutoField(primary_key=True)
+    site = models.CharField(max_length=32, null=True, db_column='SITE')
+    station = models.CharField(max_length=32, null=True, db_column='STATION')
+    date = models.DateField(null=True, db_column='DATE')
+    name = models.CharField(max_length=128, null=True, db_column='NAME')
+    temp = models.FloatField(null=True, db_column='TEMP')
+    dewp = models.FloatField(null=True, db_column='DEWP')
+    stp = models.FloatField(null=True, db_column='STP')
+    visib = models.FloatField(null=True, db_column='VISIB')
+    wdsp = models.FloatField(null=True, db_column='WDSP')
+    mxspd = models.FloatField(null=True, db_column='MXSPD')
+    max = models.FloatField(null=True, db_column='MAX')
+    min = models.FloatField(null=True, db_column='MIN')
+    prcp = models.FloatField(null=True, db_column='PRCP')
+    month = models.IntegerField(null=True, db_column='MONTH')
+    aqi = models.FloatField(null=True, db_column='AQI')
+    aqi_level = models.IntegerField(null=True, db_column='AQILEVEL')
+    hint_image = models.BinaryField(null=True, db_column='HINTIMAGE')  # 旧数据内联的base64图片
+    hint_image_hash = models.CharField(max_length=64, null=True, db_column='HINTIMAGE_HASH')
+
+    class Meta:
+        db_table = 'aqi_result'
+        indexes = [
+            # 站点最新结果: WHERE SITE = %s ORDER BY DATE DESC；以及按站点重建aqi_latest
+            models.Index(fields=['site', 'date', 'id'], name='aqi_result_site_date_idx'),
+            # 全部站点最新结果: ORDER BY DATE DESC LIMIT 1
+            models.Index(fields=['date'], name='aqi_result_date_idx'),
+            # 城市列表: SELECT DISTINCT SITE, NAME ORDER BY SITE
+            models.Index(fields=['site', 'name'], name='aqi_result_site_name_idx'),
+        ]
+
+
+class HintImage(models.Model):
+    """健康提示图片，以提示词输入的SHA-256为主键"""
+    hash = models.CharField(max_length=64, primary_key=True, db_column='HASH')
+    aqi_level = models.IntegerField(db_column='AQILEVEL')
+    city_name = models.CharField(max_length=128, db_column='CITY_NAME')
+    city_features = models.CharField(max_length=512, db_column='CITY_FEATURES')
+    image = models.BinaryField(db_column='IMAGE')
+    created_at = models.DateTimeField(auto_now_add=True, db_column='CREATED_AT')
+
+    class Meta:
+        db_table = 'hint_image'
+
+
+class AqiLatest(models.Model):
+    """每个站点最新一条AQI结果"""
+    site = models.CharField(max_length=32, primary_key=True, db_column='SITE')
+    name = models.CharField(max_length=128, null=True, db_column='NAME')
+    date = models.DateField(null=True, db_column='DATE')
+    aqi = models.FloatField(null=True, db_column='AQI')
+    aqi_level = models.IntegerField(null=True, db_column='AQILEVEL')
+    hint_image_hash = models.CharField(max_length=64, null=True, db_column='HINTIMAGE_HASH')
+    result_id = models.IntegerField(null=True, db_column='RESULT_ID')
+    updated_at = models.DateTimeField(auto_now=True, db_column='UPDATED_AT')
+
+    class Meta:
+        db_table = 'aqi_latest'
+        indexes = [
+            # 全部站点最新结果: ORDER BY DATE DESC LIMIT 1
+            models.Index(fields=['date'], name='aqi_latest_date_idx'),
+        ]
+
+
+class StationFeatureState(models.Model):
+    """每个站点的滚动特征状态，predict_aqi据此增量计算滞后和滚动特征，无需回读历史数据"""
+    station = models.CharField(max_length=32, primary_key=True, db_column='STATION')
+    last_date = models.DateField(null=True, db_column='LAST_DATE')
+    last_aqi = models.FloatField(null=True, db_column='LAST_AQI')
+    history = models.TextField(db_column='HISTORY')  # JSON，最新日期之前几天的逐日观测和AQI（按日期升序）
+    updated_at = models.DateTimeField(auto_now=True, db_column='UPDATED_AT')
+
+    class Meta:
+        db_table = 'station_feature_state'
+
+
+class AqiDailyRollup(models.Model):
+    """站点每日AQI汇总，predict_aqi随写入增量维护，可用 python manage.py rebuild_aqi_rollups 重建"""
+    id = models.AutoField(primary_key=True)
+    site = models.CharField(max_length=32, db_column='SITE')
+    date = models.DateField(db_column='DATE')
+    samples = models.IntegerField(db_column='SAMPLES')
+    aqi_sum = models.FloatField(db_column='AQI_SUM')
+    aqi_max = models.FloatField(null=True, db_column='AQI_MAX')
+    aqi_min = models.FloatField(null=True, db_column='AQI_MIN')
+    # 各AQI等级的条数
+    level_1 = models.IntegerField(default=0, db_column='LEVEL_1')
+    level_2 = models.IntegerField(default=0, db_column='LEVEL_2')
+    level_3 = models.IntegerField(default=0, db_column='LEVEL_3')
+    level_4 = models.IntegerField(default=0, db_column='LEVEL_4')
+    level_5 = models.IntegerField(default=0, db_column='LEVEL_5')
+    level_6 = models.IntegerField(default=0, db_column='LEVEL_6')
+
+    class Meta:
+        db_table = 'aqi_daily_rollup'
+        constraints = [
+            # 增量维护时按(SITE, DATE)做upsert；rollup接口按站点和日期范围读取
+            models.UniqueConstraint(fields=['site', 'date'], name='aqi_daily_rollup_site_date_uniq'),
+        ]
+
+
+class AqiMonthlyRollup(models.Model):
+    """站点每月AQI汇总，维护方式同AqiDailyRollup"""
+    id = models.AutoField(primary_key=True)
+    site = models.CharField(max_length=32, db_column='SITE')
+    year = models.IntegerField(db_column='YEAR')
+    month = models.IntegerField(db_column='MONTH')
+    samples = models.IntegerField(db_column='SAMPLES')
+    aqi_sum = models.FloatField(db_column='AQI_SUM')
+    aqi_max = models.FloatField(null=True, db_column='AQI_MAX')
+    aqi_min = models.FloatField(null=True, db_column='AQI_MIN')
+    level_1 = models.IntegerField(default=0, db_column='LEVEL_1')
+    level_2 = models.IntegerField(default=0, db_column='LEVEL_2')
+    level_3 = models.IntegerField(default=0, db_column='LEVEL_3')
+    level_4 = models.IntegerField(default=0, db_column='LEVEL_4')
+    level_5 = models.IntegerField(default=0, db_column='LEVEL_5')
+    level_6 = models.IntegerField(default=0, db_column='LEVEL_6')
+
+    class Meta:
+        db_table = 'aqi_monthly_rollup'
+        constraints = [
+            models.UniqueConstraint(fields=['site', 'year', 'month'], name='aqi_monthly_rollup_site_month_uniq'),
+        ]
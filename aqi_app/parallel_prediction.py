@@ -0,0 +1,160 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from django.db import connection
+import multiprocessing
+import threading
+import logging
+import time
+import os
+
+from .queries import BACKLOG_RANGE_SQL
+from .predictor import get_predictor_holder
+from .hint_images import get_hint_image_pipeline
+from .tasks import predict_aqi, DEFAULT_CHUNK_SIZE
+
+logger = logging.getLogger(__name__)
+
+# 每个进程分到的区间数，区间更多时进程间的负载更均衡
+SHARDS_PER_WORKER = 4
+
+
+def _init_worker():
+    """工作进程初始化：以spawn方式启动的进程需要重新初始化Django，并预先加载一次模型"""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'aqi_service.settings')
+    import django
+    django.setup()
+
+    try:
+        get_predictor_holder().get()
+    except Exception as e:
+        logger.error(f"工作进程 {os.getpid()} 预加载模型失败: {str(e)}")
+
+
+_pool = None
+_pool_workers = None
+_pool_lock = threading.Lock()
+
+
+def get_worker_pool(workers):
+    """获取进程级共享的工作进程池
+
+    工作进程在首次提交任务时启动并加载一次模型，之后各轮预测复用同一批进程和常驻模型；
+    进程数改变时关闭旧的进程池后重新创建。
+    """
+    global _pool, _pool_workers
+    if _pool is None or _pool_workers != workers:
+        with _pool_lock:
+            if _pool is None or _pool_workers != workers:
+                if _pool is not None:
+                    _pool.shutdown(wait=True)
+                # 子进程中不能沿用父进程的数据库连接，使用spawn方式启动
+                context = multiprocessing.get_context('spawn')
+                _pool = ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker)
+                _pool_workers = workers
+    return _pool
+
+
+def shutdown_worker_pool():
+    """关闭工作进程池（等待进行中的区间完成），下次使用时重新创建"""
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=True, cancel_futures=True)
+        _pool = _pool_workers = None
+
+
+def _discard_broken_pool(pool):
+    """工作进程异常退出后进程池不可再用，丢弃后下一轮重新创建"""
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is pool:
+            _pool = _pool_workers = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _predict_shard(after_id, max_id, chunk_size):
+    """在工作进程中处理id区间 (after_id, max_id] 内的全部未处理数据
+
+    返回前等待本进程提交的提示图片生成完成，避免进程退出时丢失未完成的任务。
+    """
+    summary = predict_aqi(drain=True, chunk_size=chunk_size, after_id=after_id, max_id=max_id)
+    get_hint_image_pipeline().wait()
+    connection.close()
+    summary.update({'pid': os.getpid(), 'range': (after_id + 1, max_id)})
+    return summary
+
+
+def _backlog_range():
+    """未处理数据的 (最小id, 最大id, 条数)，没有未处理数据时返回None"""
+    with connection.cursor() as cursor:
+        cursor.execute(BACKLOG_RANGE_SQL)
+        min_id, max_id, count = cursor.fetchone()
+    if not count:
+        return None
+    return int(min_id), int(max_id), int(count)
+
+
+def split_id_range(min_id, max_id, shards):
+    """将 [min_id, max_id] 均分为最多shards个区间，返回 [(after_id, max_id), ...]"""
+    shards = max(1, min(shards, max_id - min_id + 1))
+    step = (max_id - min_id + 1) / shards
+    bounds = [min_id - 1] + [min_id - 1 + round(step * i) for i in range(1, shards)] + [max_id]
+    return [(lo, hi) for lo, hi in zip(bounds, bounds[1:]) if hi > lo]
+
+
+def predict_aqi_parallel(workers=2, chunk_size=DEFAULT_CHUNK_SIZE):
+    """多进程并行预测
+
+    将未处理数据的id范围划分为多个区间，由workers个进程并行处理；工作进程在各轮之间常驻，
+    每个进程只加载一次模型，各自预测并写入自己区间的结果。
+
+    Returns:
+        dict: 处理条数、耗时，以及每个进程的区间数、处理条数和吞吐量
+    """
+    start_time = time.monotonic()
+    summary = {'processed': 0, 'chunks': 0, 'seconds': 0.0, 'workers': {}}
+
+    backlog = _backlog_range()
+    if backlog is None:
+        logger.warning("没有未处理的GSOD数据可用于预测")
+        return summary
+    min_id, max_id, count = backlog
+    shards = split_id_range(min_id, max_id, workers * SHARDS_PER_WORKER)
+    logger.info(f"并行预测: {count} 条未处理数据 (id {min_id} - {max_id})，{len(shards)} 个区间，{workers} 个进程")
+
+    executor = get_worker_pool(workers)
+    try:
+        futures = [executor.submit(_predict_shard, lo, hi, chunk_size) for lo, hi in shards]
+    except BrokenProcessPool as e:
+        logger.error(f"工作进程池不可用，下一轮重新创建: {str(e)}")
+        _discard_broken_pool(executor)
+        futures = []
+    for future in as_completed(futures):
+        try:
+            result = future.result()
+        except BrokenProcessPool as e:
+            logger.error(f"工作进程异常退出，下一轮重新创建进程池: {str(e)}")
+            _discard_broken_pool(executor)
+            continue
+        except Exception as e:
+            logger.error(f"并行预测区间失败: {str(e)}")
+            continue
+        worker = summary['workers'].setdefault(result['pid'], {'shards': 0, 'processed': 0, 'seconds': 0.0})
+        worker['shards'] += 1
+        worker['processed'] += result['processed']
+        worker['seconds'] += result['seconds']
+        summary['processed'] += result['processed']
+        summary['chunks'] += result['chunks']
+
+    summary['seconds'] = time.monotonic() - start_time
+    for pid, worker in sorted(summary['workers'].items()):
+        worker['rows_per_second'] = worker['processed'] / max(worker['seconds'], 1e-6)
+        logger.info(
+            f"进程 {pid}: {worker['shards']} 个区间, {worker['processed']} 条, "
+            f"{worker['seconds']:.1f}s, {worker['rows_per_second']:.0f} 条/秒"
+        )
+    logger.info(
+        f"并行预测完成，共处理 {summary['processed']} 条数据，耗时 {summary['seconds']:.1f}s，"
+        f"{summary['processed'] / max(summary['seconds'], 1e-6):.0f} 条/秒"
+    )
+    return summary
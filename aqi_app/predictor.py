@@ -0,0 +1,130 @@
+from django.conf import settings
+from autogluon.tabular import TabularPredictor
+import threading
+import logging
+import time
+import os
+
+logger = logging.getLogger(__name__)
+
+
+class PredictorHolder:
+    """进程内常驻的TabularPredictor
+
+    首次使用时从磁盘加载模型，之后在整个进程内复用同一个实例；
+    只有模型目录在磁盘上发生变化时才重新加载。
+    """
+
+    def __init__(self, path, persist=True, check_interval=30):
+        """
+        Args:
+            path: 模型目录
+            persist: 加载后是否将模型常驻内存（TabularPredictor.persist）
+            check_interval: 检查模型目录是否变化的最小间隔（秒）
+        """
+        self.path = path
+        self.persist = persist
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._predictor = None
+        self._signature = None
+        self._last_check = 0.0
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+            'loads': 0,
+            'last_load_seconds': None,
+            'total_load_seconds': 0.0,
+            'loaded_at': None,
+        }
+
+    def _directory_signature(self):
+        """以模型目录下文件数量、总大小和最新修改时间作为签名"""
+        file_count = 0
+        total_size = 0
+        latest_mtime = 0.0
+        for root, _, files in os.walk(self.path):
+            for name in files:
+                try:
+                    st = os.stat(os.path.join(root, name))
+                except OSError:
+                    continue
+                file_count += 1
+                total_size += st.st_size
+                latest_mtime = max(latest_mtime, st.st_mtime)
+        return (file_count, total_size, latest_mtime)
+
+    def _is_stale(self):
+        """模型目录是否在加载后发生过变化（按check_interval节流）"""
+        now = time.monotonic()
+        if now - self._last_check < self.check_interval:
+            return False
+        self._last_check = now
+        return self._directory_signature() != self._signature
+
+    def _load(self):
+        start = time.perf_counter()
+        signature = self._directory_signature()
+        predictor = TabularPredictor.load(self.path)
+        if self.persist:
+            predictor.persist()
+        elapsed = time.perf_counter() - start
+
+        self._predictor = predictor
+        self._signature = signature
+        self._last_check = time.monotonic()
+        self._stats['loads'] += 1
+        self._stats['last_load_seconds'] = elapsed
+        self._stats['total_load_seconds'] += elapsed
+        self._stats['loaded_at'] = time.time()
+        logger.info(f"模型加载完成: path={self.path}, 耗时 {elapsed:.2f}s, persist={self.persist}")
+
+    def get(self):
+        """获取预测器，必要时加载或重新加载"""
+        with self._lock:
+            if self._predictor is not None and not self._is_stale():
+                self._stats['hits'] += 1
+                return self._predictor
+
+            self._stats['misses'] += 1
+            if self._predictor is not None:
+                logger.info(f"检测到模型目录变化，重新加载: {self.path}")
+            self._load()
+            return self._predictor
+
+    def clear(self):
+        """丢弃已加载的模型，下次get时重新加载"""
+        with self._lock:
+            self._predictor = None
+            self._signature = None
+
+    def stats(self):
+        """返回加载耗时和命中/未命中统计"""
+        with self._lock:
+            stats = dict(self._stats)
+        stats['path'] = self.path
+        stats['loaded'] = self._predictor is not None
+        return stats
+
+
+_holder = None
+_holder_lock = threading.Lock()
+
+
+def get_predictor_holder():
+    """获取进程级共享的PredictorHolder"""
+    global _holder
+    if _holder is None:
+        with _holder_lock:
+            if _holder is None:
+                _holder = PredictorHolder(
+                    getattr(settings, 'AQI_PREDICTOR_PATH', 'autogluon_aqi_predictor'),
+                    persist=getattr(settings, 'AQI_PREDICTOR_PERSIST', True),
+                    check_interval=getattr(settings, 'AQI_PREDICTOR_CHECK_INTERVAL', 30),
+                )
+    return _holder
+
+
+def get_predictor():
+    """获取进程内常驻的预测器"""
+    return get_predictor_holder().get()
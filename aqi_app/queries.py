@@ -0,0 +1,123 @@
+# 热点查询
+# 这些查询在每个预测批次或每个AQI请求中执行，依赖 migrations/0002_pipeline_tables.py 中建立的索引。
+# tests/test_query_plans.py 对每条查询执行EXPLAIN，出现全表扫描时测试失败；修改查询时请同步检查索引。
+
+# gsod_data中参与预测的列
+GSOD_COLUMNS = ['id', 'SITE', 'STATION', 'DATE', 'NAME', 'TEMP', 'DEWP', 'STP', 'VISIB',
+                'WDSP', 'MXSPD', 'MAX', 'MIN', 'PRCP', 'MONTH']
+
+# 领取一批未处理数据：按id做keyset分页（索引 gsod_handled_id_idx），
+# 跳过租约未到期的数据和其他进程正在领取中的行（SKIP LOCKED）
+BACKLOG_CLAIM_SQL = f"""
+    SELECT {', '.join(GSOD_COLUMNS)} FROM gsod_data
+    WHERE HANDLED = 0 AND id > %s AND id <= %s
+      AND (CLAIMED_UNTIL IS NULL OR CLAIMED_UNTIL < NOW())
+    ORDER BY id
+    LIMIT %s
+    FOR UPDATE SKIP LOCKED
+"""
+
+# 为领取的数据写入租约（主键）
+CLAIM_ROWS_SQL = """
+    UPDATE gsod_data
+    SET CLAIMED_BY = %s, CLAIMED_UNTIL = NOW() + INTERVAL %s SECOND
+    WHERE id IN ({ids})
+"""
+
+# 写入结果前确认数据仍由本进程持有（租约到期后可能已被其他进程重新领取）
+OWNED_ROWS_SQL = """
+    SELECT id FROM gsod_data
+    WHERE id IN ({ids}) AND HANDLED = 0 AND CLAIMED_BY = %s
+    FOR UPDATE
+"""
+
+# 放弃本进程持有的租约，数据可被立即重新领取
+RELEASE_CLAIM_SQL = """
+    UPDATE gsod_data
+    SET CLAIMED_BY = NULL, CLAIMED_UNTIL = NULL
+    WHERE id IN ({ids}) AND CLAIMED_BY = %s
+"""
+
+# 是否存在可领取的未处理数据，调度器据此决定是否运行一轮预测（索引 gsod_handled_id_idx）
+BACKLOG_PROBE_SQL = """
+    SELECT 1 FROM gsod_data
+    WHERE HANDLED = 0 AND (CLAIMED_UNTIL IS NULL OR CLAIMED_UNTIL < NOW())
+    LIMIT 1
+"""
+
+# 未处理数据的id范围和条数，用于划分并行预测的区间
+BACKLOG_RANGE_SQL = """
+    SELECT MIN(id), MAX(id), COUNT(*) FROM gsod_data
+    WHERE HANDLED = 0
+"""
+
+# AQI响应需要的列；带图片时额外读取图片key
+AQI_COLUMNS = "SITE, NAME, DATE, AQI, AQILEVEL"
+
+# 站点最新结果（aqi_latest主键）
+LATEST_AQI_BY_SITE_SQL = "SELECT {columns} FROM aqi_latest WHERE SITE = %s"
+
+# 全部站点中最新的结果（索引 aqi_latest_date_idx）
+LATEST_AQI_SQL = "SELECT {columns} FROM aqi_latest ORDER BY DATE DESC LIMIT 1"
+
+# aqi_latest尚未重建时回退查询aqi_result（索引 aqi_result_site_date_idx / aqi_result_date_idx）
+RESULT_AQI_BY_SITE_SQL = """
+    SELECT {columns} FROM aqi_result
+    WHERE SITE = %s
+    ORDER BY DATE DESC
+    LIMIT 1
+"""
+RESULT_AQI_SQL = """
+    SELECT {columns} FROM aqi_result
+    ORDER BY DATE DESC
+    LIMIT 1
+"""
+
+# 站点历史AQI：按 (DATE, id) 做keyset分页（索引 aqi_result_site_date_idx），
+# 参数为 站点, 起始日期, 结束日期, 游标日期, 游标日期, 游标id, 条数
+HISTORY_COLUMNS = ['id', 'SITE', 'STATION', 'NAME', 'DATE', 'AQI', 'AQILEVEL']
+HISTORY_PAGE_SQL = f"""
+    SELECT {', '.join(HISTORY_COLUMNS)} FROM aqi_result
+    WHERE SITE = %s AND DATE >= %s AND DATE <= %s
+      AND (DATE > %s OR (DATE = %s AND id > %s))
+    ORDER BY DATE, id
+    LIMIT %s
+"""
+
+# 批量导出站点历史AQI（同一索引，由服务端游标逐行读取），参数为 站点, 起始日期, 结束日期
+HISTORY_EXPORT_SQL = f"""
+    SELECT {', '.join(HISTORY_COLUMNS)} FROM aqi_result
+    WHERE SITE = %s AND DATE >= %s AND DATE <= %s
+    ORDER BY DATE, id
+"""
+
+# 每日/每月AQI汇总（唯一键 aqi_daily_rollup_site_date_uniq / aqi_monthly_rollup_site_month_uniq 范围扫描）
+ROLLUP_COLUMNS = "SAMPLES, AQI_SUM, AQI_MAX, AQI_MIN, LEVEL_1, LEVEL_2, LEVEL_3, LEVEL_4, LEVEL_5, LEVEL_6"
+DAILY_ROLLUP_SQL = f"""
+    SELECT SITE, DATE, {ROLLUP_COLUMNS} FROM aqi_daily_rollup
+    WHERE SITE = %s AND DATE >= %s AND DATE <= %s
+    ORDER BY DATE
+    LIMIT %s
+"""
+# 参数为 站点, 起始年, 起始年, 起始月, 结束年, 结束年, 结束月, 条数
+MONTHLY_ROLLUP_SQL = f"""
+    SELECT SITE, YEAR, MONTH, {ROLLUP_COLUMNS} FROM aqi_monthly_rollup
+    WHERE SITE = %s
+      AND (YEAR > %s OR (YEAR = %s AND MONTH >= %s))
+      AND (YEAR < %s OR (YEAR = %s AND MONTH <= %s))
+    ORDER BY YEAR, MONTH
+    LIMIT %s
+"""
+
+# 支持的城市列表（aqi_latest主键，每个站点一行）
+SUPPORTED_CITIES_LATEST_SQL = "SELECT SITE, NAME FROM aqi_latest ORDER BY SITE"
+
+# aqi_latest尚未重建时从aqi_result获取城市列表（索引 aqi_result_site_name_idx）
+SUPPORTED_CITIES_SQL = """
+    SELECT DISTINCT SITE, NAME
+    FROM aqi_result
+    ORDER BY SITE
+"""
+
+# 健康提示图片（hint_image主键）
+HINT_IMAGE_SQL = "SELECT IMAGE, UNIX_TIMESTAMP(CREATED_AT) FROM hint_image WHERE HASH = %s"
@@ -0,0 +1,112 @@
+from django.conf import settings
+from django.core.cache import caches
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 企业用户与个人用户的响应内容不同，分别缓存
+USER_TIERS = ('enterprise', 'individual')
+
+# 未指定站点时（全部站点中最新的结果）使用的key
+LATEST_SITE = '__latest__'
+
+# 只在本进程内有效的缓存后端：独立运行的预测任务无法清除web进程中的缓存
+LOCAL_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+_stats = {'hits': 0, 'misses': 0, 'bypassed': 0}
+_stats_lock = threading.Lock()
+_enabled = None
+
+def _alias():
+    return getattr(settings, 'AQI_RESPONSE_CACHE_ALIAS', 'default')
+
+def _cache():
+    return caches[_alias()]
+
+def is_enabled():
+    """是否启用响应缓存
+
+    AQI_RESPONSE_CACHE_ENABLED为None（默认）时，只在缓存后端可被多个进程共享时启用，
+    否则predict_aqi写入新结果后无法使web进程中的缓存失效，响应会在整个TTL内保持过期。
+    """
+    global _enabled
+    if _enabled is None:
+        enabled = getattr(settings, 'AQI_RESPONSE_CACHE_ENABLED', None)
+        if enabled is None:
+            backend = settings.CACHES[_alias()]['BACKEND']
+            enabled = backend not in LOCAL_BACKENDS
+            if not enabled:
+                logger.warning(f"缓存后端 {backend} 不能在进程间共享，AQI响应缓存已停用")
+        _enabled = bool(enabled)
+    return _enabled
+
+def user_tier(user):
+    """用户类型对应的缓存分组"""
+    return 'enterprise' if getattr(user, 'user_type', None) == 'enterprise' else 'individual'
+
+def _cache_key(site, tier):
+    return f"aqi:response:{site or LATEST_SITE}:{tier}"
+
+def _record(hit):
+    with _stats_lock:
+        _stats['hits' if hit else 'misses'] += 1
+        total = _stats['hits'] + _stats['misses']
+        if total % 1000 == 0:
+            logger.info(f"AQI响应缓存统计: {_stats_snapshot()}")
+
+def _stats_snapshot():
+    total = _stats['hits'] + _stats['misses']
+    return {
+        'hits': _stats['hits'],
+        'misses': _stats['misses'],
+        'bypassed': _stats['bypassed'],
+        'hit_rate': _stats['hits'] / total if total else 0.0,
+    }
+
+def get_or_build(site, user, build, cacheable=True):
+    """按(站点, 用户类型)读取缓存的AQI响应，未命中时调用build()生成并写入缓存
+
+    缓存未启用、不可用或cacheable为False时直接返回build()的结果；带error的响应不缓存。
+    """
+    if not cacheable or not is_enabled():
+        with _stats_lock:
+            _stats['bypassed'] += 1
+        return build()
+    key = _cache_key(site, user_tier(user))
+    try:
+        data = _cache().get(key)
+    except Exception as e:
+        logger.warning(f"读取AQI响应缓存出错: {e}")
+        return build()
+
+    if data is not None:
+        _record(True)
+        return data
+
+    _record(False)
+    data = build()
+    if 'error' not in data:
+        try:
+            _cache().set(key, data, getattr(settings, 'AQI_RESPONSE_CACHE_TTL', 600))
+        except Exception as e:
+            logger.warning(f"写入AQI响应缓存出错: {e}")
+    return data
+
+def invalidate_sites(sites):
+    """删除指定站点（以及全部站点最新结果）的缓存响应"""
+    if not is_enabled():
+        return
+    keys = [_cache_key(site, tier) for site in list(sites) + [LATEST_SITE] for tier in USER_TIERS]
+    try:
+        _cache().delete_many(keys)
+    except Exception as e:
+        logger.warning(f"清除AQI响应缓存出错: {e}")
+
+def stats():
+    """返回本进程的缓存命中统计"""
+    with _stats_lock:
+        return _stats_snapshot()
@@ -0,0 +1,116 @@
+import pandas as pd
+import logging
+
+logger = logging.getLogger(__name__)
+
+AQI_LEVELS = range(1, 7)
+LEVEL_COLUMNS = [f'LEVEL_{level}' for level in AQI_LEVELS]
+ROLLUP_COLUMNS = ['SAMPLES', 'AQI_SUM', 'AQI_MAX', 'AQI_MIN'] + LEVEL_COLUMNS
+
+# 汇总表的键
+DAILY_KEYS = ['SITE', 'DATE']
+MONTHLY_KEYS = ['SITE', 'YEAR', 'MONTH']
+
+
+def _upsert_sql(table, keys):
+    """增量合并：条数、总和、等级分布累加，最大/最小值取较大/较小者"""
+    columns = keys + ROLLUP_COLUMNS
+    merge = [
+        "SAMPLES = SAMPLES + VALUES(SAMPLES)",
+        "AQI_SUM = AQI_SUM + VALUES(AQI_SUM)",
+        "AQI_MAX = GREATEST(COALESCE(AQI_MAX, VALUES(AQI_MAX)), COALESCE(VALUES(AQI_MAX), AQI_MAX))",
+        "AQI_MIN = LEAST(COALESCE(AQI_MIN, VALUES(AQI_MIN)), COALESCE(VALUES(AQI_MIN), AQI_MIN))",
+    ] + [f"{col} = {col} + VALUES({col})" for col in LEVEL_COLUMNS]
+    return f"""
+        INSERT INTO {table} ({', '.join(columns)})
+        VALUES ({', '.join(['%s'] * len(columns))})
+        ON DUPLICATE KEY UPDATE
+            {', '.join(merge)}
+    """
+
+
+DAILY_UPSERT_SQL = _upsert_sql('aqi_daily_rollup', DAILY_KEYS)
+MONTHLY_UPSERT_SQL = _upsert_sql('aqi_monthly_rollup', MONTHLY_KEYS)
+
+
+def aggregate(results, keys):
+    """按keys汇总一批结果（需包含AQI和AQILEVEL列），返回按keys排序的DataFrame"""
+    levels = results['AQILEVEL']
+    frame = results[keys].assign(
+        AQI=results['AQI'].astype(float),
+        **{col: (levels == level).astype(int) for col, level in zip(LEVEL_COLUMNS, AQI_LEVELS)},
+    )
+    grouped = frame.groupby(keys, sort=True)
+    rollup = grouped['AQI'].agg(SAMPLES='count', AQI_SUM='sum', AQI_MAX='max', AQI_MIN='min')
+    rollup[LEVEL_COLUMNS] = grouped[LEVEL_COLUMNS].sum()
+    return rollup.reset_index()
+
+
+def _to_db_rows(frame, columns):
+    rows = []
+    for row in frame[columns].itertuples(index=False):
+        rows.append(tuple(None if isinstance(value, float) and value != value else
+                          value.item() if hasattr(value, 'item') else value for value in row))
+    return rows
+
+
+def update_rollups(cursor, results):
+    """将本批写入aqi_result的结果累加到每日和每月汇总表，需在写入结果的同一事务中调用
+
+    每个结果只由持有租约的进程写入一次，因此累加不会重复计算。行按键排序后写入，
+    多个进程并发更新同一批站点时以相同的顺序加锁。
+    """
+    results = results[results['SITE'].notna() & results['DATE'].notna() & results['AQI'].notna()]
+    if results.empty:
+        return
+    dates = pd.to_datetime(results['DATE'])
+    daily = aggregate(results.assign(DATE=dates.dt.date), DAILY_KEYS)
+    monthly = aggregate(results.assign(YEAR=dates.dt.year, MONTH=dates.dt.month), MONTHLY_KEYS)
+    cursor.executemany(DAILY_UPSERT_SQL, _to_db_rows(daily, DAILY_KEYS + ROLLUP_COLUMNS))
+    cursor.executemany(MONTHLY_UPSERT_SQL, _to_db_rows(monthly, MONTHLY_KEYS + ROLLUP_COLUMNS))
+
+
+_LEVEL_COUNTS = ', '.join(f"SUM(AQILEVEL = {level})" for level in AQI_LEVELS)
+_LEVEL_SUMS = ', '.join(f"SUM({col})" for col in LEVEL_COLUMNS)
+
+
+def rebuild_rollups(cursor):
+    """从aqi_result重建两个汇总表，返回 (每日行数, 每月行数)
+
+    需在同一事务中执行；建议在预测任务暂停时运行，避免与并发写入的批次互相等待。
+    """
+    cursor.execute("DELETE FROM aqi_daily_rollup")
+    cursor.execute("DELETE FROM aqi_monthly_rollup")
+    cursor.execute(f"""
+        INSERT INTO aqi_daily_rollup (SITE, DATE, {', '.join(ROLLUP_COLUMNS)})
+        SELECT SITE, DATE, COUNT(AQI), COALESCE(SUM(AQI), 0), MAX(AQI), MIN(AQI), {_LEVEL_COUNTS}
+        FROM aqi_result
+        WHERE SITE IS NOT NULL AND DATE IS NOT NULL AND AQI IS NOT NULL
+        GROUP BY SITE, DATE
+    """)
+    daily = cursor.rowcount
+    # 每月汇总由每日汇总合并，无需再次扫描aqi_result
+    cursor.execute(f"""
+        INSERT INTO aqi_monthly_rollup (SITE, YEAR, MONTH, {', '.join(ROLLUP_COLUMNS)})
+        SELECT SITE, YEAR(DATE), MONTH(DATE), SUM(SAMPLES), SUM(AQI_SUM), MAX(AQI_MAX), MIN(AQI_MIN), {_LEVEL_SUMS}
+        FROM aqi_daily_rollup
+        GROUP BY SITE, YEAR(DATE), MONTH(DATE)
+    """)
+    return daily, cursor.rowcount
+
+
+def rollup_row(row, period_keys):
+    """汇总表的一行转换为接口返回的字段"""
+    item = dict(zip(period_keys + ROLLUP_COLUMNS, row))
+    samples = item['SAMPLES']
+    response = {key.lower(): item[key] for key in period_keys}
+    if 'date' in response and response['date'] is not None:
+        response['date'] = response['date'].isoformat()
+    response.update({
+        'samples': samples,
+        'aqi_avg': item['AQI_SUM'] / samples if samples else None,
+        'aqi_max': item['AQI_MAX'],
+        'aqi_min': item['AQI_MIN'],
+        'levels': {str(level): item[col] for level, col in zip(AQI_LEVELS, LEVEL_COLUMNS)},
+    })
+    return response
@@ -0,0 +1,153 @@
+from django.conf import settings
+from django.db import close_old_connections, connection
+from aqi_service.import_signal import import_signal_mtime
+from .queries import BACKLOG_PROBE_SQL
+import threading
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def has_backlog():
+    """是否存在可领取的未处理数据（索引 gsod_handled_id_idx，找到一行即返回）"""
+    with connection.cursor() as cursor:
+        cursor.execute(BACKLOG_PROBE_SQL)
+        return cursor.fetchone() is not None
+
+
+class PredictionScheduler:
+    """事件驱动的预测调度
+
+    导入脚本更新信号文件或探测到未处理数据时立即运行一轮预测；上一轮尚未结束时不会重复运行。
+    没有数据时探测间隔从min_idle起加倍到max_idle，运行出错时等待时间从error_backoff起加倍到max_error_backoff。
+    """
+
+    def __init__(self, run, probe=has_backlog, signal_mtime=import_signal_mtime,
+                 min_idle=5, max_idle=300, error_backoff=30, max_error_backoff=600, tick=1.0):
+        """
+        Args:
+            run: 运行一轮预测，返回包含processed（处理条数）的dict
+            probe: 返回是否有待处理数据
+            signal_mtime: 返回导入信号文件的修改时间
+            min_idle / max_idle: 空闲时探测间隔的下限和上限（秒）
+            error_backoff / max_error_backoff: 出错后等待时间的下限和上限（秒）
+            tick: 检查信号文件的间隔（秒）
+        """
+        self.run = run
+        self.probe = probe
+        self.signal_mtime = signal_mtime
+        self.min_idle = min_idle
+        self.max_idle = max_idle
+        self.error_backoff = error_backoff
+        self.max_error_backoff = max_error_backoff
+        self.tick = tick
+        self._running = threading.Lock()
+        self._stop = threading.Event()
+        self._idle = min_idle
+        self._errors = 0
+        self._next_probe = 0.0
+        self._last_signal = signal_mtime()
+        self._stats = {'cycles': 0, 'skipped': 0, 'errors': 0, 'signals': 0, 'probes': 0}
+
+    def run_once(self):
+        """运行一轮预测；上一轮仍在运行时跳过并返回None"""
+        if not self._running.acquire(blocking=False):
+            self._stats['skipped'] += 1
+            logger.info("上一轮预测尚未结束，跳过本轮")
+            return None
+        try:
+            close_old_connections()
+            self._stats['cycles'] += 1
+            return self.run()
+        finally:
+            self._running.release()
+
+    def _signaled(self):
+        mtime = self.signal_mtime()
+        if mtime is not None and mtime != self._last_signal:
+            self._last_signal = mtime
+            self._stats['signals'] += 1
+            return True
+        return False
+
+    def _probe(self):
+        self._stats['probes'] += 1
+        close_old_connections()
+        return self.probe()
+
+    def _back_off(self, now):
+        """出错后按指数退避推迟下一轮"""
+        self._errors += 1
+        self._stats['errors'] += 1
+        delay = min(self.error_backoff * 2 ** (self._errors - 1), self.max_error_backoff)
+        self._next_probe = now + delay
+        logger.info(f"{delay:g}s 后重试")
+
+    def step(self):
+        """检查触发条件，需要时运行一轮预测；返回本轮结果，未运行时返回None"""
+        now = time.monotonic()
+        if now < self._next_probe and self._errors:
+            # 出错退避期间忽略信号
+            return None
+
+        triggered = self._signaled()
+        if triggered:
+            logger.info("收到导入信号，开始预测")
+        elif now >= self._next_probe:
+            try:
+                triggered = self._probe()
+            except Exception as e:
+                logger.error(f"探测未处理数据出错: {str(e)}")
+                self._back_off(now)
+                return None
+            self._errors = 0
+            if not triggered:
+                self._next_probe = now + self._idle
+                self._idle = min(self._idle * 2, self.max_idle)
+                return None
+        else:
+            return None
+
+        try:
+            summary = self.run_once()
+        except Exception as e:
+            logger.error(f"Error in scheduler: {str(e)}")
+            self._back_off(time.monotonic())
+            return None
+        if summary is None:
+            return None
+
+        self._errors = 0
+        if summary.get('processed'):
+            # 还有数据时立即再次探测
+            self._idle = self.min_idle
+            self._next_probe = 0.0
+        else:
+            # 本轮没有处理任何数据（例如全部被其他进程领取或整批失败），按空闲退避
+            self._next_probe = time.monotonic() + self._idle
+            self._idle = min(self._idle * 2, self.max_idle)
+        return summary
+
+    def serve_forever(self):
+        """持续调度，直到stop()被调用"""
+        while not self._stop.is_set():
+            self.step()
+            self._stop.wait(self.tick)
+
+    def stop(self):
+        self._stop.set()
+
+    def stats(self):
+        return dict(self._stats)
+
+
+def get_prediction_scheduler(run):
+    """按settings中的配置创建调度器"""
+    return PredictionScheduler(
+        run,
+        min_idle=getattr(settings, 'AQI_SCHEDULER_MIN_IDLE', 5),
+        max_idle=getattr(settings, 'AQI_SCHEDULER_MAX_IDLE', 300),
+        error_backoff=getattr(settings, 'AQI_SCHEDULER_ERROR_BACKOFF', 30),
+        max_error_backoff=getattr(settings, 'AQI_SCHEDULER_MAX_ERROR_BACKOFF', 600),
+    )
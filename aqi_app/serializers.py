@@ -5,6 +5,7 @@ from datetime import datetime, timedelta
 from django.conf import settings
 import logging
 from django.db import connection
+from .authentication import SimpleUser, cache_user
 
 logger = logging.getLogger(__name__)
 User = get_user_model()
@@ -39,11 +40,11 @@ class UserLoginSerializer(serializers.Serializer):
         try:
             logger.info(f"尝试验证用户: {data['username']}")
             
-            # 完全使用原生SQL查询
+            # 完全使用原生SQL查询，一次取出验证和后续响应需要的全部字段
             with connection.cursor() as cursor:
                 # 检查用户是否存在
                 cursor.execute(
-                    "SELECT id, username, user_type, password FROM users WHERE username = %s", 
+                    "SELECT id, username, user_type, email, password FROM users WHERE username = %s", 
                     [data['username']]
                 )
                 user_data = cursor.fetchone()
@@ -52,11 +53,14 @@ class UserLoginSerializer(serializers.Serializer):
                     logger.warning(f"用户不存在: {data['username']}")
                     raise serializers.ValidationError('用户不存在')
                 
-                user_id, username, user_type, stored_password = user_data
+                user_id, username, user_type, email, stored_password = user_data
                 
                 # 直接比较密码（这是简化的处理，生产环境应该用哈希比较）
                 if data['password'] == stored_password:
                     logger.info(f"用户 {data['username']} 通过密码验证成功")
+                    # 登录后的请求可直接从认证缓存获取用户，无需再查询
+                    self.user = SimpleUser(id=user_id, username=username, user_type=user_type, email=email)
+                    cache_user(self.user)
                     return {
                         'user': {
                             'id': user_id,
@@ -78,4 +82,29 @@ class UserLoginSerializer(serializers.Serializer):
             'exp': datetime.utcnow() + timedelta(days=1),
             'iat': datetime.utcnow()
         }
-        return jwt.encode(payload, settings.SECRET_KEY, algorithm='HS256') 
\ No newline at end of file
+        return jwt.encode(payload, settings.SECRET_KEY, algorithm='HS256') 
+
+class ObservationSerializer(serializers.Serializer):
+    """在线预测的单条气象观测，字段与gsod_data的列一致；缺测的数值可以为null"""
+    SITE = serializers.CharField(max_length=32, required=False, allow_null=True, default=None)
+    STATION = serializers.CharField(max_length=32, required=False, allow_null=True, default=None)
+    DATE = serializers.DateField(required=False, allow_null=True, default=None)
+    NAME = serializers.CharField(max_length=128, required=False, allow_null=True, default=None)
+    TEMP = serializers.FloatField(allow_null=True)
+    DEWP = serializers.FloatField(allow_null=True)
+    STP = serializers.FloatField(allow_null=True)
+    VISIB = serializers.FloatField(allow_null=True)
+    WDSP = serializers.FloatField(allow_null=True)
+    MXSPD = serializers.FloatField(allow_null=True)
+    MAX = serializers.FloatField(allow_null=True)
+    MIN = serializers.FloatField(allow_null=True)
+    PRCP = serializers.FloatField(allow_null=True)
+    MONTH = serializers.IntegerField(min_value=1, max_value=12, required=False, allow_null=True, default=None)
+
+    def validate(self, data):
+        # 未提供日期时按当天预测，月份由日期得出
+        if data['DATE'] is None:
+            data['DATE'] = datetime.now().date()
+        if data['MONTH'] is None:
+            data['MONTH'] = data['DATE'].month
+        return data
@@ -1,37 +1,25 @@
-from django.db import connection
+from django.conf import settings
+from django.db import connection, transaction
 import pandas as pd
-from autogluon.tabular import TabularPredictor
 from datetime import datetime
 import base64
-from io import BytesIO
-from PIL import Image
-import requests
 import logging
-import replicate
+import time
+import socket
 import os
+from .predictor import get_predictor_holder
+from .queries import GSOD_COLUMNS, BACKLOG_CLAIM_SQL, CLAIM_ROWS_SQL, OWNED_ROWS_SQL, RELEASE_CLAIM_SQL
+from .cities import get_city_registry
+from . import response_cache
+from . import feature_store
+from . import rollups
+from .hint_images import (
+    AQI_PROMPTS, AQI_ADVICE, DEFAULT_CITY_NAME, DEFAULT_CITY_FEATURES,
+    default_hint_image, get_hint_image_pipeline, render_hint_image,
+)
 
 logger = logging.getLogger(__name__)
 
-# AQI等级对应的提示词
-AQI_PROMPTS = {
-    1: "A beautiful cityscape with clear blue sky, people enjoying outdoor activities, green parks and trees, modern buildings, bright sunlight, high quality, detailed, reflecting urban life and environmental harmony",
-    2: "A city view with slightly hazy sky, people going about their daily activities, some wearing light masks, urban landscape with moderate air quality, buildings visible but with slight haze, high quality, detailed",
-    3: "An urban scene with orange-tinted sky, sensitive groups wearing masks, reduced outdoor activities, city landmarks visible but with noticeable haze, people being cautious, high quality, detailed",
-    4: "A city under red-tinted sky, most people wearing masks, limited outdoor activities, prominent city buildings with heavy haze, emergency alerts visible, high quality, detailed",
-    5: "A cityscape with purple-tinted sky, empty streets, emergency vehicles visible, severe air pollution, city landmarks barely visible through thick haze, high quality, detailed",
-    6: "A city in emergency conditions with maroon sky, deserted streets, emergency services active, extremely poor visibility, city almost invisible through dense pollution, high quality, detailed"
-}
-
-# AQI等级对应的健康建议
-AQI_ADVICE = {
-    1: "Air quality is excellent. Perfect day for outdoor activities. Enjoy the fresh air and sunshine. Stay active and healthy.",
-    2: "Air quality is acceptable. Most people can enjoy outdoor activities. Sensitive individuals should consider limiting prolonged outdoor exertion.",
-    3: "Sensitive groups should reduce outdoor activities. Consider wearing masks. General public should monitor their health when outdoors.",
-    4: "Everyone should reduce outdoor activities. Wear masks when going outside. Sensitive groups should stay indoors as much as possible.",
-    5: "Health alert! Everyone should avoid outdoor activities. Stay indoors with windows closed. Use air purifiers if available.",
-    6: "Emergency conditions! Stay indoors with windows closed. Use air purifiers. Only go outside if absolutely necessary with proper protection."
-}
-
 def get_aqi_level(aqi_value):
     """根据EPA标准确定AQI等级
     
@@ -60,100 +48,259 @@ def get_aqi_level(aqi_value):
     else:
         return 6  # 严重污染
 
-def predict_aqi():
-    """从GSOD数据预测AQI"""
+# 模型特征为gsod_data中除id以外的全部列（不含HANDLED和领取租约列）
+FEATURE_COLUMNS = [col for col in GSOD_COLUMNS if col != 'id']
+
+# 每批处理的默认数据条数
+DEFAULT_CHUNK_SIZE = 1000
+
+# gsod_data.id为INT，未限定上界时使用的最大值
+MAX_GSOD_ID = 2 ** 31 - 1
+
+def worker_id():
+    """本进程的领取者标识（主机名:进程号）"""
+    return f"{socket.gethostname()}:{os.getpid()}"[-64:]
+
+def _placeholders(values):
+    return ', '.join(['%s'] * len(values))
+
+def _claim_unhandled_chunk(cursor, after_id, chunk_size, max_id=None):
+    """按id做keyset分页，领取id大于after_id的一批未处理数据
+    
+    在一个短事务中用 SELECT ... FOR UPDATE SKIP LOCKED 选出未被领取（或租约已到期）的数据并写入租约，
+    多个预测进程（包括不同主机上的进程）同时运行时不会领取到同一批数据。
+    
+    Args:
+        cursor: 数据库游标
+        after_id: 上一批最后一条数据的id
+        chunk_size: 本批最多获取的条数
+        max_id: id上界（包含），为None时不限制
+        
+    Returns:
+        DataFrame: 按id升序排列的已领取数据，没有数据时为空
+    """
+    lease = getattr(settings, 'AQI_CLAIM_LEASE_SECONDS', 600)
+    with transaction.atomic():
+        cursor.execute(BACKLOG_CLAIM_SQL, [after_id, MAX_GSOD_ID if max_id is None else max_id, chunk_size])
+        df = pd.DataFrame(cursor.fetchall(), columns=GSOD_COLUMNS)
+        if not df.empty:
+            ids = [int(i) for i in df['id'].tolist()]
+            cursor.execute(CLAIM_ROWS_SQL.format(ids=_placeholders(ids)), [worker_id(), lease] + ids)
+    return df
+
+def _release_claim(cursor, df):
+    """放弃一批数据的租约（预测或写入失败时），使其可被立即重新领取"""
+    ids = [int(i) for i in df['id'].tolist()]
+    try:
+        cursor.execute(RELEASE_CLAIM_SQL.format(ids=_placeholders(ids)), ids + [worker_id()])
+    except Exception as e:
+        logger.error(f"释放租约失败: {str(e)}")
+
+def _to_db_rows(frame):
+    """将DataFrame转换为可直接传给executemany的行列表（Python原生类型，NaN转为None）"""
+    columns = [
+        [None if isinstance(value, float) and value != value else value for value in frame[col].tolist()]
+        for col in frame.columns
+    ]
+    return list(zip(*columns))
+
+def _persist_chunk(cursor, df, predictions, update_features=False):
+    """批量写入一批预测结果
+    
+    在同一个事务内确认数据仍由本进程持有，用executemany批量插入aqi_result，并用一条UPDATE将整批标记为已处理。
+    租约到期后被其他进程重新领取的数据不会写入。
+    
+    Args:
+        cursor: 数据库游标
+        df: 本批GSOD数据
+        predictions: 与df按位置对应的AQI预测值
+        update_features: 是否将本批结果合并到站点特征状态（在同一事务中锁定状态后合并）
+        
+    Returns:
+        int: 写入的条数
+    """
+    results = df[FEATURE_COLUMNS].copy()
+    results['AQI'] = predictions.to_numpy()
+    results['AQILEVEL'] = [get_aqi_level(aqi) for aqi in results['AQI'].tolist()]
+    
+    start = time.perf_counter()
+    ids = [int(i) for i in df['id'].tolist()]
+    
+    # 在写入前取得已知站点：写入后城市列表若恰好过期，重新加载时aqi_latest已包含新站点，将无法发现新站点
+    registry = get_city_registry()
+    known_sites = registry.known_sites()
+    with transaction.atomic():
+        # 锁定仍由本进程持有的数据，其余的已被其他进程重新领取
+        cursor.execute(OWNED_ROWS_SQL.format(ids=_placeholders(ids)), ids + [worker_id()])
+        owned = {int(row[0]) for row in cursor.fetchall()}
+        if len(owned) < len(ids):
+            logger.warning(f"本批有 {len(ids) - len(owned)} 条数据的租约已被其他进程领取，跳过写入")
+            keep = df['id'].isin(owned).to_numpy()
+            results = results[keep].copy()
+            ids = [i for i in ids if i in owned]
+        if not ids:
+            return 0
+        
+        # 结果行只保存图片key并立即提交；图片按(等级, 城市)去重后交给后台流水线并发生成，
+        # 完成后写入hint_image表
+        pipeline = get_hint_image_pipeline()
+        image_keys = {level: pipeline.submit(level) for level in set(results['AQILEVEL'].tolist())}
+        results['HINTIMAGE_HASH'] = results['AQILEVEL'].map(image_keys)
+        
+        cursor.executemany("""
+            INSERT INTO aqi_result 
+            (SITE, STATION, DATE, NAME, TEMP, DEWP, STP, VISIB, WDSP, 
+             MXSPD, MAX, MIN, PRCP, MONTH, AQI, AQILEVEL, HINTIMAGE_HASH)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+        """, _to_db_rows(results))
+        
+        # 整批标记为已处理并释放租约
+        cursor.execute(f"""
+            UPDATE gsod_data
+            SET HANDLED = 1, CLAIMED_BY = NULL, CLAIMED_UNTIL = NULL
+            WHERE id IN ({_placeholders(ids)})
+        """, ids)
+        
+        _update_latest(cursor, results)
+        rollups.update_rollups(cursor, results)
+        
+        if update_features:
+            # 计算特征时读取的状态可能已被并发的批次更新，在事务中加锁重新读取后合并
+            locked_state = feature_store.lock_state(cursor, results['STATION'].tolist())
+            feature_store.save_state(cursor, feature_store.next_state(results, locked_state))
+    
+    # 清除本批涉及站点的缓存响应
+    response_cache.invalidate_sites(set(results['SITE'].dropna()))
+    
+    # 出现新站点时使城市列表失效
+    new_sites = registry.invalidate_if_new(set(results['SITE'].dropna()), known_sites)
+    if new_sites:
+        logger.info(f"发现新站点 {sorted(new_sites)}，刷新城市列表")
+    
+    elapsed = time.perf_counter() - start
+    logger.info(f"批次写入完成: {len(ids)} 条, 耗时 {elapsed:.2f}s, {len(ids) / max(elapsed, 1e-6):.0f} 条/秒")
+    return len(ids)
+
+# aqi_latest中只有日期不早于现有记录时才覆盖
+_NEWER = "(DATE IS NULL OR VALUES(DATE) >= DATE)"
+
+def _update_latest(cursor, results):
+    """用本批结果更新aqi_latest表（每个站点最多一行，只保留日期最新的结果）
+
+    行按站点排序后写入，多个进程并发更新同一批站点时以相同的顺序加锁。
+    """
+    latest = (
+        results[results['SITE'].notna()]
+        .sort_values('DATE', kind='stable')
+        .groupby('SITE', sort=False)
+        .tail(1)
+        .sort_values('SITE', kind='stable')
+    )
+    if latest.empty:
+        return
+    cursor.executemany(f"""
+        INSERT INTO aqi_latest (SITE, NAME, DATE, AQI, AQILEVEL, HINTIMAGE_HASH, RESULT_ID)
+        VALUES (%s, %s, %s, %s, %s, %s, NULL)
+        ON DUPLICATE KEY UPDATE
+            NAME = IF({_NEWER}, VALUES(NAME), NAME),
+            AQI = IF({_NEWER}, VALUES(AQI), AQI),
+            AQILEVEL = IF({_NEWER}, VALUES(AQILEVEL), AQILEVEL),
+            HINTIMAGE_HASH = IF({_NEWER}, VALUES(HINTIMAGE_HASH), HINTIMAGE_HASH),
+            RESULT_ID = IF({_NEWER}, VALUES(RESULT_ID), RESULT_ID),
+            DATE = IF({_NEWER}, VALUES(DATE), DATE)
+    """, _to_db_rows(latest[['SITE', 'NAME', 'DATE', 'AQI', 'AQILEVEL', 'HINTIMAGE_HASH']]))
+
+def rebuild_latest_aqi():
+    """从aqi_result一次性重建aqi_latest表，返回站点数"""
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute("DELETE FROM aqi_latest")
+        cursor.execute("""
+            INSERT INTO aqi_latest (SITE, NAME, DATE, AQI, AQILEVEL, HINTIMAGE_HASH, RESULT_ID)
+            SELECT SITE, NAME, DATE, AQI, AQILEVEL, HINTIMAGE_HASH, id
+            FROM (
+                SELECT id, SITE, NAME, DATE, AQI, AQILEVEL, HINTIMAGE_HASH,
+                       ROW_NUMBER() OVER (PARTITION BY SITE ORDER BY DATE DESC, id DESC) AS rn
+                FROM aqi_result
+                WHERE SITE IS NOT NULL
+            ) ranked
+            WHERE rn = 1
+        """)
+        sites = cursor.rowcount
+    
+    registry = get_city_registry()
+    registry.invalidate()
+    response_cache.invalidate_sites(registry.known_sites())
+    return sites
+
+def rebuild_aqi_rollups():
+    """从aqi_result一次性重建每日和每月汇总表，返回 (每日行数, 每月行数)"""
+    with transaction.atomic(), connection.cursor() as cursor:
+        return rollups.rebuild_rollups(cursor)
+
+def predict_aqi(drain=False, chunk_size=DEFAULT_CHUNK_SIZE, time_budget=None, after_id=0, max_id=None):
+    """从GSOD数据预测AQI
+    
+    按id升序以keyset分页的方式逐批领取未处理数据，每批作为一个DataFrame整体预测。
+    领取的数据带有租约（AQI_CLAIM_LEASE_SECONDS），多个进程可以同时运行；进程崩溃后租约到期的数据会被重新领取。
+    
+    Args:
+        drain: 为True时持续处理直到没有未处理数据，否则只处理一批
+        chunk_size: 每批处理的数据条数
+        time_budget: drain模式下的时间预算（秒），超时后在当前批次结束时停止
+        after_id: 只处理id大于after_id的数据
+        max_id: 只处理id不大于max_id的数据，为None时不限制
+        
+    Returns:
+        dict: 本次运行的批次数、处理条数和耗时
+    """
+    start_time = time.monotonic()
+    summary = {'chunks': 0, 'processed': 0, 'seconds': 0.0}
     try:
-        # 从数据库获取所有未处理的GSOD数据
         with connection.cursor() as cursor:
-            # 首先检查未处理数据总量
-            cursor.execute("""
-                SELECT COUNT(*) FROM gsod_data 
-                WHERE (HANDLED = 0 OR HANDLED IS NULL)
-            """)
-            total_unhandled = cursor.fetchone()[0]
-            logger.info(f"总共有 {total_unhandled} 条未处理的数据")
-            
-            if total_unhandled == 0:
-                logger.warning("没有未处理的GSOD数据可用于预测")
-                return
-            
-            # 获取所有未处理的数据，每次处理最多1000条
-            cursor.execute("""
-                SELECT * FROM gsod_data 
-                WHERE (HANDLED = 0 OR HANDLED IS NULL)
-                LIMIT 1000
-            """)
-            columns = [col[0] for col in cursor.description]
-            data = cursor.fetchall()
+            # 获取进程内常驻的AutoGluon模型，仅在模型目录变化时重新加载
+            holder = get_predictor_holder()
+            predictor = None
             
-            if not data:
-                logger.warning("No unhandled GSOD data available for prediction")
-                return
-            
-            logger.info(f"本次将处理 {len(data)} 条数据")
-            
-            # 转换为DataFrame
-            df = pd.DataFrame(data, columns=columns)
-            
-            # 输出数据日期分布情况
-            date_counts = df['DATE'].value_counts().to_dict()
-            logger.info(f"数据日期分布: {date_counts}")
-            
-            # 加载AutoGluon模型
-            predictor = TabularPredictor.load('autogluon_aqi_predictor')
-            
-            # 准备预测数据 - 只排除id列和HANDLED列
-            feature_cols = [col for col in df.columns if col != 'id' and col != 'HANDLED']
-            X = df[feature_cols]
-            
-            # 进行预测
-            predictions = predictor.predict(X)
-            
-            # 将预测结果存入数据库
-            processed_count = 0
-            for idx, row in df.iterrows():
+            last_id = after_id
+            while True:
+                df = _claim_unhandled_chunk(cursor, last_id, chunk_size, max_id)
+                if df.empty:
+                    if summary['chunks'] == 0:
+                        logger.warning("没有未处理的GSOD数据可用于预测")
+                    break
+                
+                last_id = int(df['id'].iloc[-1])
+                logger.info(f"本批将处理 {len(df)} 条数据 (id {int(df['id'].iloc[0])} - {last_id})")
+                
+                # 输出数据日期分布情况
+                date_counts = df['DATE'].value_counts().to_dict()
+                logger.debug(f"数据日期分布: {date_counts}")
+                
+                if predictor is None:
+                    try:
+                        predictor = holder.get()
+                    except Exception:
+                        _release_claim(cursor, df)
+                        raise
+                    logger.info(f"模型缓存状态: {holder.stats()}")
+                
                 try:
-                    aqi = predictions.iloc[idx]
-                    aqi_level = get_aqi_level(aqi)
-                    
-                    # 生成健康提示图片
-                    hint_image = generate_hint_image(aqi_level)
-                    
-                    # 插入预测结果到aqi_result表
-                    cursor.execute("""
-                        INSERT INTO aqi_result 
-                        (SITE, STATION, DATE, NAME, TEMP, DEWP, STP, VISIB, WDSP, 
-                         MXSPD, MAX, MIN, PRCP, MONTH, AQI, AQILEVEL, HINTIMAGE)
-                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                    """, (
-                        row['SITE'], row['STATION'], row['DATE'], row['NAME'],
-                        row['TEMP'], row['DEWP'], row['STP'], row['VISIB'],
-                        row['WDSP'], row['MXSPD'], row['MAX'], row['MIN'],
-                        row['PRCP'], row['MONTH'], aqi, aqi_level, hint_image
-                    ))
-                    
-                    # 将处理过的数据标记为已处理
-                    cursor.execute("""
-                        UPDATE gsod_data
-                        SET HANDLED = 1
-                        WHERE id = %s
-                    """, (row['id'],))
-                    
-                    processed_count += 1
-                    logger.info(f"成功插入预测结果: SITE={row['SITE']}, DATE={row['DATE']}, AQI={aqi}, AQILEVEL={aqi_level}")
-                    
-                    # 每50条数据提交一次事务，避免事务过大
-                    if processed_count % 50 == 0:
-                        connection.commit()
-                        logger.info(f"已提交 {processed_count} 条数据")
-                        
+                    # 由站点特征状态增量计算滞后和滚动特征，整批按模型需要的特征预测
+                    feature_state = feature_store.load_state(cursor, df['STATION'].tolist())
+                    features = feature_store.add_history_features(df, feature_state)
+                    predictions = feature_store.predict(predictor, features)
+                    summary['processed'] += _persist_chunk(cursor, df, predictions, update_features=True)
+                    summary['chunks'] += 1
                 except Exception as e:
-                    logger.error(f"处理数据时出错 (ID={row['id']}): {str(e)}")
-                    # 单条数据处理失败不影响整体流程，继续处理下一条
-            
-            # 最后提交剩余事务
-            connection.commit()
-            logger.info(f"AQI预测和结果存储完成，共处理 {processed_count} 条数据")
+                    # 整批回滚并释放租约，数据保持未处理状态，下次运行时重试
+                    logger.error(f"批次处理失败 (id {int(df['id'].iloc[0])} - {last_id}): {str(e)}")
+                    _release_claim(cursor, df)
+                
+                if not drain or len(df) < chunk_size:
+                    break
+                if time_budget is not None and time.monotonic() - start_time >= time_budget:
+                    logger.info(f"已达到时间预算 {time_budget}s，停止本次处理")
+                    break
             
     except Exception as e:
         logger.error(f"AQI预测或结果存储过程中发生错误: {str(e)}")
@@ -161,48 +308,27 @@ def predict_aqi():
             connection.rollback()
         except:
             pass  # 即使rollback失败也继续执行
+    
+    summary['seconds'] = time.monotonic() - start_time
+    logger.info(f"健康提示图片生成状态: {get_hint_image_pipeline().stats()}")
+    logger.info(f"AQI预测和结果存储完成，共 {summary['chunks']} 批，处理 {summary['processed']} 条数据，耗时 {summary['seconds']:.1f}s")
+    return summary
 
-def generate_hint_image(aqi_level, city_name="Beijing", city_features="modern skyscrapers, traditional hutongs, Forbidden City, Great Wall"):
+def generate_hint_image(aqi_level, city_name=DEFAULT_CITY_NAME, city_features=DEFAULT_CITY_FEATURES):
     """使用Replicate的Stable Diffusion API生成健康提示图片
     
     Args:
         aqi_level: AQI等级
         city_name: 城市名称
         city_features: 城市特征描述
+        
+    Returns:
+        str: base64编码的图片，生成失败时返回默认图片
     """
     try:
-        # 设置Replicate API key TODO
-        #r8_FbDI0q1SKimFK1KnYkxnMtt
-        os.environ["REPLICATE_API_TOKEN"] = "your api key"
-        
-        # 构建提示词，包含城市特征、AQI信息和健康建议
-        prompt = f"A {city_name} cityscape with {city_features}, {AQI_PROMPTS[aqi_level]}, {AQI_ADVICE[aqi_level]}, include AQI level indicator and health tips in the image, showing the unique characteristics of {city_name}"
-        
-        # 调用Stable Diffusion模型
-        output = replicate.run(
-            # 实际运行使用自己的API key TODO 
-            "stability-ai/stable-diffusion:your-api-key",
-            input={
-                "prompt": prompt,
-                "width": 1024,
-                "height": 1024,
-                "num_outputs": 1,
-                "num_inference_steps": 75,
-                "guidance_scale": 8.5
-            }
-        )
-        
-        # 下载生成的图片
-        image_url = output[0]
-        response = requests.get(image_url)
-        
-        # 转换为base64
-        return base64.b64encode(response.content).decode('utf-8')
-        
+        image = render_hint_image(aqi_level, city_name, city_features)
     except Exception as e:
         logger.error(f"Error generating hint image: {str(e)}")
         # 发生错误时返回一个默认图片
-        image = Image.new('RGB', (1024, 1024), color='white')
-        buffered = BytesIO()
-        image.save(buffered, format="JPEG")
-        return base64.b64encode(buffered.getvalue()).decode('utf-8') 
\ No newline at end of file
+        image = default_hint_image()
+    return base64.b64encode(image).decode('utf-8')
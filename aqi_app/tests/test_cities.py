@@ -0,0 +1,81 @@
+import unittest
+from unittest import mock
+
+from aqi_app.cities import CityRegistry, VERSION_CACHE_KEY
+
+class StubCache:
+    """本地桩，替代Django缓存"""
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, timeout=None):
+        self.data[key] = value
+
+class FailingCache:
+    """本地桩，模拟共享缓存服务不可用"""
+    def get(self, key):
+        raise ConnectionError("cache down")
+
+    def set(self, key, value, timeout=None):
+        raise ConnectionError("cache down")
+
+class StubRegistry(CityRegistry):
+    """从内存中的aqi_latest读取城市列表"""
+    def __init__(self, latest, **kwargs):
+        super().__init__(**kwargs)
+        self.latest = latest
+
+        self.loads = 0
+
+    def _load(self):
+        self.loads += 1
+        return [{'site': site, 'name': site} for site in sorted(self.latest)], False
+
+class TestCityRegistry(unittest.TestCase):
+    def setUp(self):
+        self.cache = StubCache()
+        patcher = mock.patch('aqi_app.cities.cache', self.cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_new_site_detected_when_registry_expires_during_write(self):
+        """写入前取得的已知站点仍能发现新站点，即使写入后城市列表过期并重新加载"""
+        latest = {'a'}
+        registry = StubRegistry(latest, ttl=0)
+        known_sites = registry.known_sites()
+
+        latest.add('b')  # 本批写入aqi_latest
+        # 写入后重新加载的列表已包含新站点，不能用来判断
+        self.assertIn('b', registry.known_sites())
+
+        self.assertEqual(registry.invalidate_if_new({'a', 'b'}, known_sites), {'b'})
+        self.assertIn(VERSION_CACHE_KEY, self.cache.data)
+
+    def test_invalidate_publishes_new_version(self):
+        """发现新站点时更新共享的失效版本，其他进程的列表随之过期"""
+        latest = {'a'}
+        writer = StubRegistry(latest, ttl=300)
+        reader = StubRegistry(latest, ttl=300)
+        known_sites = writer.known_sites()
+        reader.get()
+
+        latest.add('b')
+        self.assertEqual(reader.get(), [{'site': 'a', 'name': 'a'}])
+        writer.invalidate_if_new({'b'}, known_sites)
+        self.assertEqual(reader.get(), [{'site': 'a', 'name': 'a'}, {'site': 'b', 'name': 'b'}])
+        self.assertEqual(writer.invalidate_if_new({'a'}, {'a', 'b'}), set())
+
+    def test_cache_outage_reloads_from_database(self):
+        """共享缓存不可用时不报错，每次都从数据库重新加载"""
+        registry = StubRegistry({'a'}, ttl=300)
+        with mock.patch('aqi_app.cities.cache', FailingCache()), self.assertLogs('aqi_app.cities', 'WARNING'):
+            self.assertEqual(registry.get(), [{'site': 'a', 'name': 'a'}])
+            self.assertEqual(registry.get(), [{'site': 'a', 'name': 'a'}])
+            self.assertEqual(registry.invalidate_if_new({'b'}, {'a'}), {'b'})
+        self.assertEqual(registry.loads, 2)
+
+if __name__ == '__main__':
+    unittest.main()
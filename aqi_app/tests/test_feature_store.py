@@ -0,0 +1,95 @@
+import unittest
+import json
+import numpy as np
+import pandas as pd
+
+from aqi_app import feature_store
+
+def make_rows(station, days, start_id=1):
+    return pd.DataFrame({
+        'id': range(start_id, start_id + len(days)),
+        'STATION': station,
+        'DATE': pd.to_datetime([f"2024-01-{day:02d}" for day in days]),
+        'TEMP': [float(day) for day in days],
+        'WDSP': [1.0] * len(days),
+        'PRCP': [0.5] * len(days),
+    })
+
+def to_state(rows):
+    """next_state返回的行转换为load_state的格式"""
+    return {
+        station: {'last_date': date, 'last_aqi': aqi, 'history': json.loads(history)}
+        for station, date, aqi, history in rows
+    }
+
+class StubPredictor:
+    """本地桩，预测值为PREV_AQI（缺失时为0）加1"""
+    def features(self):
+        return ['TEMP', feature_store.PREV_AQI]
+
+    def predict(self, X):
+        return np.nan_to_num(np.asarray(X[feature_store.PREV_AQI], dtype=float)) + 1
+
+class TestFeatureStore(unittest.TestCase):
+    def assert_features_equal(self, features, expected):
+        for column in feature_store.HISTORY_FEATURE_COLUMNS[:-1]:
+            np.testing.assert_allclose(features[column].to_numpy(), expected[column].to_numpy())
+
+    def test_incremental_state_matches_full_history(self):
+        """分两批用状态增量计算的滚动特征与一次性计算全部历史的结果一致"""
+        full = make_rows('A', range(1, 11))
+        expected = feature_store.add_history_features(full, {})
+
+        first, second = full.iloc[:6], full.iloc[6:]
+        state = to_state(feature_store.next_state(first.assign(AQI=50.0), {}))
+        self.assertEqual(len(state['A']['history']['DATE']), feature_store.HISTORY_DAYS)
+
+        features = feature_store.add_history_features(second, state)
+        self.assert_features_equal(features, expected.loc[second.index])
+        self.assertEqual(features[feature_store.PREV_AQI].tolist()[0], 50.0)
+
+    def test_windows_span_calendar_days(self):
+        """缺测的日期不占用窗口：相隔超过窗口天数的观测不计入"""
+        chunk = make_rows('A', [1, 2, 8, 9])
+        features = feature_store.add_history_features(chunk, {})
+        # 8日的7天窗口为2日至8日，9日的为3日至9日；3天窗口不含1、2日
+        np.testing.assert_allclose(features['TEMP_MEAN_7'], [1.0, 1.5, 5.0, 8.5])
+        np.testing.assert_allclose(features['TEMP_MEAN_3'], [1.0, 1.5, 8.0, 8.5])
+        np.testing.assert_allclose(features['PRCP_SUM_7'], [0.5, 1.0, 1.0, 1.0])
+        # 7日缺测，8日没有前一天的AQI
+        state = to_state(feature_store.next_state(chunk.assign(AQI=[10.0, 20.0, 80.0, 90.0]), {}))
+        self.assertEqual(state['A']['history']['DATE'], ['2024-01-08', '2024-01-09'])
+        self.assertEqual(state['A']['last_aqi'], 90.0)
+
+    def test_out_of_order_chunk_uses_state_by_date(self):
+        """早于状态最新日期的行（补录）只使用在它之前的历史，合并后状态的最新日期不回退"""
+        full = make_rows('A', range(1, 9))
+        late = full[full['DATE'].dt.day != 5]
+        backfill = full[full['DATE'].dt.day == 5]
+
+        state = to_state(feature_store.next_state(late.assign(AQI=late['TEMP'] * 10), {}))
+        self.assertEqual(state['A']['history']['DATE'][0], '2024-01-03')
+        features = feature_store.add_history_features(backfill, state)
+        # 5日的窗口含状态中的3、4日，不含之后的6至8日
+        self.assertEqual(features['TEMP_MEAN_7'].tolist(), [4.0])
+        self.assertEqual(features['TEMP_MEAN_3'].tolist(), [4.0])
+        self.assertEqual(features['PRCP_SUM_3'].tolist(), [1.5])
+        self.assertEqual(features[feature_store.PREV_AQI].tolist(), [40.0])
+
+        merged = to_state(feature_store.next_state(backfill.assign(AQI=50.0), state))
+        self.assertEqual(merged['A']['last_date'], pd.Timestamp('2024-01-08').date())
+        self.assertEqual(merged['A']['last_aqi'], 80.0)
+        self.assertEqual(merged['A']['history']['DATE'][2], '2024-01-05')
+        self.assertEqual(merged['A']['history']['AQI'][2], 50.0)
+
+    def test_prev_aqi_is_chained_within_chunk(self):
+        """模型使用PREV_AQI时，本批后一天使用前一天的预测值，中间缺测时不串联"""
+        chunk = pd.concat([make_rows('A', [3, 1, 2]), make_rows('B', [1, 3], start_id=10)], ignore_index=True)
+        state = {'A': {'last_date': pd.Timestamp('2023-12-31').date(), 'last_aqi': 10.0, 'history': {}}}
+        features = feature_store.add_history_features(chunk, state)
+        predictions = feature_store.predict(StubPredictor(), features)
+        # A按日期顺序: 1日 -> 11, 2日 -> 12, 3日 -> 13；B没有状态且2日缺测: 1, 1
+        self.assertEqual(predictions.tolist(), [13.0, 11.0, 12.0, 1.0, 1.0])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+import unittest
+import tarfile
+import io
+import math
+
+from import_gsod_data import DB_COLUMNS, iter_archive_chunks
+
+RAW_HEADER = (
+    '"STATION","DATE","LATITUDE","LONGITUDE","ELEVATION","NAME","TEMP","TEMP_ATTRIBUTES","DEWP","DEWP_ATTRIBUTES",'
+    '"SLP","SLP_ATTRIBUTES","STP","STP_ATTRIBUTES","VISIB","VISIB_ATTRIBUTES","WDSP","WDSP_ATTRIBUTES","MXSPD","GUST",'
+    '"MAX","MAX_ATTRIBUTES","MIN","MIN_ATTRIBUTES","PRCP","PRCP_ATTRIBUTES","SNDP","FRSHTT"\n'
+)
+
+def raw_row(station, date, temp='54.3', stp='978.0', visib='8.7', prcp=' 0.00'):
+    return (
+        f'"{station}","{date}","33.4277","-112.0038","337.4","PHOENIX AIRPORT, AZ US","{temp}","24","38.3","24",'
+        f'"1016.2","24","{stp}","24","{visib}","24","2.5","24","12.0","999.9",'
+        f'"64.0","*","46.0","*","{prcp}","G","999.9","000000"\n'
+    )
+
+def make_archive(members):
+    """在内存中构造tar.gz归档，members为 {文件名: 内容}"""
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode='w:gz') as tar:
+        for name, content in members.items():
+            data = content.encode()
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+    buffer.seek(0)
+    return buffer
+
+class TestGsodArchive(unittest.TestCase):
+    def test_sentinels_month_and_station_map(self):
+        """缺失值标记转为NULL，补充SITE和MONTH，未映射的站点被跳过"""
+        archive = make_archive({
+            '72278023183.csv': RAW_HEADER
+                + raw_row('72278023183', '2024-01-01')
+                + raw_row('72278023183', '2024-02-02', temp='9999.9', stp='9999.9', visib='999.9', prcp='99.99'),
+            '01001099999.csv': RAW_HEADER + raw_row('01001099999', '2024-01-01'),
+        })
+        stats = {}
+        chunks = list(iter_archive_chunks(archive, {'72278023183': 'bakersfield'}, chunk_size=10, stats=stats))
+
+        self.assertEqual(len(chunks), 1)
+        df = chunks[0]
+        self.assertEqual(list(df.columns), DB_COLUMNS)
+        self.assertEqual(df['SITE'].tolist(), ['bakersfield', 'bakersfield'])
+        self.assertEqual(df['MONTH'].tolist(), [1, 2])
+        self.assertEqual(df.iloc[0]['TEMP'], 54.3)
+        self.assertEqual(df.iloc[0]['PRCP'], 0.0)
+        for col in ('TEMP', 'STP', 'VISIB', 'PRCP'):
+            self.assertTrue(math.isnan(df.iloc[1][col]), col)
+        self.assertEqual(stats['members'], 1)
+        self.assertEqual(stats['skipped_members'], 1)
+
+    def test_chunks_are_bounded(self):
+        """多个站点文件合并为不超过chunk_size附近的块"""
+        members = {
+            f'7227802318{i}.csv': RAW_HEADER + ''.join(raw_row(f'7227802318{i}', f'2024-01-{day:02d}') for day in range(1, 6))
+            for i in range(4)
+        }
+        station_map = {f'7227802318{i}': 'bakersfield' for i in range(4)}
+        chunks = list(iter_archive_chunks(make_archive(members), station_map, chunk_size=8))
+
+        self.assertEqual(sum(len(df) for df in chunks), 20)
+        self.assertTrue(all(len(df) < 16 for df in chunks))
+
+if __name__ == '__main__':
+    unittest.main()
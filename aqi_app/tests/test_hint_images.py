@@ -0,0 +1,101 @@
+import unittest
+import threading
+import time
+
+from aqi_app.hint_images import HintImagePipeline, hint_image_key
+
+class StubReplicateClient:
+    """本地桩，替代Replicate客户端"""
+    def __init__(self, failures=0, delay=0.0):
+        self.failures = failures
+        self.delay = delay
+        self.calls = 0
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    def run(self, model, input):
+        with self._lock:
+            self.calls += 1
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+            should_fail = self.calls <= self.failures
+        try:
+            time.sleep(self.delay)
+            if should_fail:
+                raise TimeoutError("stub timeout")
+            return [f"stub://{input['prompt'][:16]}"]
+        finally:
+            with self._lock:
+                self.active -= 1
+
+class TestHintImagePipeline(unittest.TestCase):
+    def setUp(self):
+        """测试前的准备工作：使用内存存储替代hint_image表"""
+        self.stored = {}
+
+    def make_pipeline(self, client, **kwargs):
+        kwargs.setdefault('backoff', 0)
+        return HintImagePipeline(
+            client=client,
+            fetch=lambda url, timeout=None: b'jpeg:' + url.encode('utf-8'),
+            store=lambda key, level, city_name, city_features, image: self.stored.__setitem__(key, image),
+            exists=lambda key: key in self.stored,
+            **kwargs
+        )
+
+    def test_each_key_generated_once(self):
+        """同一(等级, 城市)多次提交只生成一次"""
+        client = StubReplicateClient(delay=0.05)
+        pipeline = self.make_pipeline(client)
+        keys = [pipeline.submit(2) for _ in range(10)]
+        self.assertTrue(pipeline.wait(timeout=5))
+        pipeline.submit(2)
+        self.assertTrue(pipeline.wait(timeout=5))
+        pipeline.shutdown()
+
+        self.assertEqual(set(keys), {hint_image_key(2)})
+        self.assertEqual(client.calls, 1)
+        self.assertIn(hint_image_key(2), self.stored)
+
+    def test_bounded_concurrency(self):
+        """并发生成数不超过max_workers"""
+        client = StubReplicateClient(delay=0.05)
+        pipeline = self.make_pipeline(client, max_workers=2)
+        for level in range(1, 7):
+            pipeline.submit(level)
+        self.assertTrue(pipeline.wait(timeout=5))
+        pipeline.shutdown()
+
+        self.assertEqual(client.calls, 6)
+        self.assertLessEqual(client.max_active, 2)
+        self.assertEqual(len(self.stored), 6)
+
+    def test_retry_then_success(self):
+        """远程调用失败后重试"""
+        client = StubReplicateClient(failures=2)
+        pipeline = self.make_pipeline(client, retries=2)
+        key = pipeline.submit(3)
+        self.assertTrue(pipeline.wait(timeout=5))
+        pipeline.shutdown()
+
+        self.assertEqual(client.calls, 3)
+        self.assertIn(key, self.stored)
+        self.assertEqual(pipeline.stats()['retries'], 2)
+
+    def test_failure_not_stored_and_resubmittable(self):
+        """重试耗尽后不写入，之后可以重新提交"""
+        client = StubReplicateClient(failures=2)
+        pipeline = self.make_pipeline(client, retries=1)
+        key = pipeline.submit(4)
+        self.assertTrue(pipeline.wait(timeout=5))
+        self.assertNotIn(key, self.stored)
+        self.assertEqual(pipeline.stats()['failed'], 1)
+
+        pipeline.submit(4)
+        self.assertTrue(pipeline.wait(timeout=5))
+        pipeline.shutdown()
+        self.assertIn(key, self.stored)
+
+if __name__ == '__main__':
+    unittest.main()
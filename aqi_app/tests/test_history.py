@@ -0,0 +1,79 @@
+import unittest
+import datetime
+
+from aqi_app.history import encode_cursor, decode_cursor, fetch_page, _format_csv
+
+class StubCursor:
+    """本地桩，按HISTORY_PAGE_SQL的条件在内存中过滤排序"""
+    def __init__(self, rows):
+        self.rows = rows
+        self.calls = 0
+
+    def execute(self, sql, params):
+        site, start, end, after_date, _, after_id, limit = params
+        self.calls += 1
+        matched = sorted(
+            (row for row in self.rows
+             if row[1] == site and start <= row[4] <= end and (row[4], row[0]) > (after_date, after_id)),
+            key=lambda row: (row[4], row[0]),
+        )
+        self.result = matched[:limit]
+
+    def fetchall(self):
+        return self.result
+
+def make_rows():
+    rows = []
+    row_id = 0
+    for day in range(1, 11):
+        for station in ('S1', 'S2'):
+            row_id += 1
+            # id与日期顺序不一致，验证按 (DATE, id) 翻页
+            rows.append((100 - row_id, 'bakersfield', station, 'Bakersfield',
+                         datetime.date(2024, 1, day), float(day), 1))
+    rows.append((1, 'fresno', 'S3', 'Fresno', datetime.date(2024, 1, 5), 50.0, 1))
+    return rows
+
+class TestHistory(unittest.TestCase):
+    def test_cursor_round_trip(self):
+        """游标编码后可还原，格式错误时抛出ValueError"""
+        cursor = encode_cursor(datetime.date(2024, 3, 1), 42)
+        self.assertEqual(decode_cursor(cursor), (datetime.date(2024, 3, 1), 42))
+        with self.assertRaises(ValueError):
+            decode_cursor('not-a-cursor')
+
+    def test_pages_cover_range_without_gaps(self):
+        """逐页读取的结果与一次读取整个范围相同，不重复也不遗漏"""
+        cursor = StubCursor(make_rows())
+        start, end = datetime.date(2024, 1, 2), datetime.date(2024, 1, 9)
+        pages, after = [], None
+        while True:
+            results, after = fetch_page(cursor, 'bakersfield', start, end, after, limit=3)
+            pages.extend(results)
+            if after is None:
+                break
+        everything, after = fetch_page(cursor, 'bakersfield', start, end, None, limit=1000)
+        self.assertIsNone(after)
+        self.assertEqual(pages, everything)
+        self.assertEqual(len(pages), 16)
+        self.assertEqual(cursor.calls, 7)
+
+    def test_exactly_full_page_and_empty_range(self):
+        """最后一页恰好取满时不返回游标；范围内没有数据（日期空档）时返回空页"""
+        cursor = StubCursor(make_rows())
+        day = datetime.date(2024, 1, 3)
+        results, after = fetch_page(cursor, 'bakersfield', day, day, None, limit=2)
+        self.assertEqual(len(results), 2)
+        self.assertIsNone(after)
+
+        results, after = fetch_page(cursor, 'bakersfield', datetime.date(2024, 2, 1), datetime.date(2024, 2, 28))
+        self.assertEqual((results, after), ([], None))
+
+    def test_csv_export_has_header(self):
+        """CSV导出带表头，每行一条数据"""
+        rows = [{'site': 'a', 'station': 's', 'name': 'A', 'date': '2024-01-01', 'aqi': 10.0, 'aqi_level': 1}]
+        content = ''.join(_format_csv(iter(rows))).splitlines()
+        self.assertEqual(content, ['site,station,name,date,aqi,aqi_level', 'a,s,A,2024-01-01,10.0,1'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import unittest
+import threading
+import time
+import numpy as np
+import pandas as pd
+
+from aqi_app.micro_batcher import MicroBatcher
+
+class StubPredictor:
+    """本地桩，记录每次predict的行数，预测值为TEMP的两倍"""
+    def __init__(self, delay=0.0, fail=False):
+        self.delay = delay
+        self.fail = fail
+        self.batches = []
+
+    def __call__(self, frame):
+        self.batches.append(len(frame))
+        time.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError("stub failure")
+        return np.asarray(frame['TEMP']) * 2
+
+class TestMicroBatcher(unittest.TestCase):
+    def test_concurrent_requests_are_combined(self):
+        """并发请求合并为少量predict调用，结果按请求拆分"""
+        predictor = StubPredictor(delay=0.01)
+        batcher = MicroBatcher(predictor, max_batch=64, max_wait=0.02)
+        results = {}
+
+        def request(i):
+            frame = pd.DataFrame({'TEMP': [float(i), float(i) + 0.5]})
+            results[i] = batcher.predict_frame(frame, timeout=5).tolist()
+
+        threads = [threading.Thread(target=request, args=(i,)) for i in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, {i: [2.0 * i, 2.0 * i + 1] for i in range(20)})
+        self.assertEqual(sum(predictor.batches), 40)
+        self.assertLess(len(predictor.batches), 20)
+        self.assertEqual(batcher.stats()['requests'], 20)
+
+    def test_batch_size_is_bounded(self):
+        """每次合并的行数不超过max_batch（单个请求本身超过时除外）"""
+        predictor = StubPredictor(delay=0.02)
+        batcher = MicroBatcher(predictor, max_batch=4, max_wait=0.05)
+        futures = [batcher.submit(pd.DataFrame({'TEMP': [1.0, 2.0]})) for _ in range(6)]
+        for future in futures:
+            future.result(timeout=5)
+        self.assertTrue(all(rows <= 4 for rows in predictor.batches))
+
+    def test_oversized_request_is_not_split(self):
+        """单个请求超过max_batch时整体预测一次，不与其他请求合并"""
+        predictor = StubPredictor()
+        batcher = MicroBatcher(predictor, max_batch=2, max_wait=0.02)
+        result = batcher.predict_frame(pd.DataFrame({'TEMP': [1.0, 2.0, 3.0, 4.0, 5.0]}), timeout=5)
+        self.assertEqual(result.tolist(), [2.0, 4.0, 6.0, 8.0, 10.0])
+        self.assertEqual(predictor.batches, [5])
+
+    def test_failure_propagates_to_each_request(self):
+        """predict失败时同批的每个请求都收到异常"""
+        batcher = MicroBatcher(StubPredictor(fail=True), max_wait=0.02)
+        futures = [batcher.submit(pd.DataFrame({'TEMP': [1.0]})) for _ in range(3)]
+        for future in futures:
+            with self.assertRaises(RuntimeError):
+                future.result(timeout=5)
+        self.assertGreaterEqual(batcher.stats()['errors'], 1)
+
+if __name__ == '__main__':
+    unittest.main()
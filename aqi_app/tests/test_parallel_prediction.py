@@ -0,0 +1,69 @@
+import sys
+import types
+import unittest
+from concurrent.futures import Future
+from unittest import mock
+
+class StubPredictor:
+    """本地桩，替代autogluon的TabularPredictor，测试中不会加载模型"""
+
+# 未安装autogluon时也能导入预测模块
+_autogluon = types.ModuleType('autogluon.tabular')
+_autogluon.TabularPredictor = StubPredictor
+with mock.patch.dict(sys.modules, {'autogluon': types.ModuleType('autogluon'), 'autogluon.tabular': _autogluon}):
+    from aqi_app import parallel_prediction
+
+class InlineExecutor:
+    """本地桩，在当前线程中执行提交的区间"""
+    def __init__(self):
+        self.submitted = []
+
+    def submit(self, fn, *args):
+        self.submitted.append(args)
+        future = Future()
+        future.set_result(fn(*args))
+        return future
+
+def stub_shard(after_id, max_id, chunk_size):
+    return {'processed': max_id - after_id, 'chunks': 1, 'seconds': 0.1, 'pid': 1, 'range': (after_id + 1, max_id)}
+
+class TestParallelPrediction(unittest.TestCase):
+    def assert_disjoint_cover(self, shards, after_id, max_id):
+        """区间 (lo, hi] 依次相接，互不重叠，合起来覆盖 (after_id, max_id]"""
+        self.assertEqual(shards[0][0], after_id)
+        self.assertEqual(shards[-1][1], max_id)
+        for (_, hi), (lo, _) in zip(shards, shards[1:]):
+            self.assertEqual(hi, lo)
+        self.assertTrue(all(hi > lo for lo, hi in shards))
+
+    def test_split_id_range_is_disjoint_and_complete(self):
+        """各种范围和分片数下，区间不重叠且覆盖全部id"""
+        for min_id, max_id, shards in [(1, 10, 3), (1, 1, 8), (100, 103, 8), (5, 1000, 7), (1, 1000000, 16)]:
+            with self.subTest(min_id=min_id, max_id=max_id, shards=shards):
+                result = parallel_prediction.split_id_range(min_id, max_id, shards)
+                self.assertLessEqual(len(result), shards)
+                self.assert_disjoint_cover(result, min_id - 1, max_id)
+
+    def test_backlog_is_sharded_across_workers(self):
+        """并行预测提交的区间覆盖未处理数据的整个id范围，结果按进程汇总"""
+        executor = InlineExecutor()
+        with mock.patch.object(parallel_prediction, '_backlog_range', return_value=(11, 110, 100)), \
+                mock.patch.object(parallel_prediction, 'get_worker_pool', return_value=executor), \
+                mock.patch.object(parallel_prediction, '_predict_shard', stub_shard):
+            summary = parallel_prediction.predict_aqi_parallel(workers=2, chunk_size=10)
+
+        shards = sorted((lo, hi) for lo, hi, _ in executor.submitted)
+        self.assertEqual(len(shards), 2 * parallel_prediction.SHARDS_PER_WORKER)
+        self.assert_disjoint_cover(shards, 10, 110)
+        self.assertEqual(summary['processed'], 100)
+        self.assertEqual(summary['workers'][1]['shards'], len(shards))
+
+    def test_worker_pool_is_reused(self):
+        """同一进程内各轮预测复用同一个进程池，进程数改变时重新创建"""
+        self.addCleanup(parallel_prediction.shutdown_worker_pool)
+        pool = parallel_prediction.get_worker_pool(2)
+        self.assertIs(parallel_prediction.get_worker_pool(2), pool)
+        self.assertIsNot(parallel_prediction.get_worker_pool(3), pool)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+import unittest
+import datetime
+import logging
+import pymysql
+
+from aqi_service.db import DB_CONFIG
+from aqi_app.queries import (
+    AQI_COLUMNS, BACKLOG_CLAIM_SQL, OWNED_ROWS_SQL, BACKLOG_PROBE_SQL, BACKLOG_RANGE_SQL, LATEST_AQI_BY_SITE_SQL, LATEST_AQI_SQL,
+    RESULT_AQI_BY_SITE_SQL, RESULT_AQI_SQL, SUPPORTED_CITIES_LATEST_SQL, SUPPORTED_CITIES_SQL,
+    HINT_IMAGE_SQL, HISTORY_PAGE_SQL, HISTORY_EXPORT_SQL,
+    DAILY_ROLLUP_SQL, MONTHLY_ROLLUP_SQL,
+)
+
+logger = logging.getLogger(__name__)
+
+IMAGE_COLUMNS = AQI_COLUMNS + ", HINTIMAGE_HASH"
+
+# (名称, SQL, 参数)
+HOT_QUERIES = [
+    ('backlog_claim', BACKLOG_CLAIM_SQL, [0, 100000, 1000]),
+    ('owned_rows', OWNED_ROWS_SQL.format(ids='%s, %s'), [1, 2, 'host:1']),
+    ('backlog_probe', BACKLOG_PROBE_SQL, []),
+    ('backlog_range', BACKLOG_RANGE_SQL, []),
+    ('latest_by_site', LATEST_AQI_BY_SITE_SQL.format(columns=IMAGE_COLUMNS), ['bakersfield']),
+    ('latest', LATEST_AQI_SQL.format(columns=AQI_COLUMNS), []),
+    ('result_by_site', RESULT_AQI_BY_SITE_SQL.format(columns=IMAGE_COLUMNS), ['bakersfield']),
+    ('result_latest', RESULT_AQI_SQL.format(columns=AQI_COLUMNS), []),
+    ('supported_cities_latest', SUPPORTED_CITIES_LATEST_SQL, []),
+    ('supported_cities', SUPPORTED_CITIES_SQL, []),
+    ('hint_image', HINT_IMAGE_SQL, ['0' * 64]),
+    ('history_page', HISTORY_PAGE_SQL, ['bakersfield', '2020-01-01', '2024-12-31', '2022-06-01', '2022-06-01', 100, 500]),
+    ('history_export', HISTORY_EXPORT_SQL, ['bakersfield', '2020-01-01', '2024-12-31']),
+    ('daily_rollup', DAILY_ROLLUP_SQL, ['bakersfield', '2024-01-01', '2024-12-31', 1000]),
+    ('monthly_rollup', MONTHLY_ROLLUP_SQL, ['bakersfield', 2020, 2020, 1, 2024, 2024, 12, 1000]),
+]
+
+# 没有过滤条件、按索引顺序读取第一行或整个小表的查询，执行计划为索引扫描（type=index）属于预期；
+# 其余查询都是选择性的，只允许按索引定位或范围扫描
+FULL_INDEX_SCAN_ALLOWED = {'latest', 'result_latest', 'supported_cities_latest', 'supported_cities'}
+
+SEED_SITES = [f"plan_site_{i}" for i in range(10)] + ['bakersfield']
+SEED_DAYS = [datetime.date(2022, 1, 1) + datetime.timedelta(days=i) for i in range(40)]
+
+def seed(cursor):
+    """写入若干站点的数据；空表上的执行计划不能说明查询是否走索引"""
+    rows = [(site, f"PLAN_{site}", day, site, i % 2)
+            for site in SEED_SITES for i, day in enumerate(SEED_DAYS)]
+    cursor.executemany(
+        "INSERT IGNORE INTO gsod_data (SITE, STATION, DATE, NAME, HANDLED) VALUES (%s, %s, %s, %s, %s)", rows)
+    cursor.executemany(
+        "INSERT INTO aqi_result (SITE, STATION, DATE, NAME, AQI, AQILEVEL) VALUES (%s, %s, %s, %s, 50, 1)",
+        [row[:4] for row in rows])
+    cursor.executemany(
+        "INSERT IGNORE INTO aqi_latest (SITE, NAME, DATE, AQI, AQILEVEL) VALUES (%s, %s, %s, 50, 1)",
+        [(site, site, SEED_DAYS[-1]) for site in SEED_SITES])
+    cursor.executemany(
+        "INSERT IGNORE INTO hint_image (HASH, AQILEVEL, CITY_NAME, CITY_FEATURES, IMAGE) VALUES (%s, 1, %s, '', '')",
+        [(f"{i:064d}", site) for i, site in enumerate(SEED_SITES)])
+    cursor.executemany(
+        "INSERT IGNORE INTO aqi_daily_rollup (SITE, DATE, SAMPLES, AQI_SUM) VALUES (%s, %s, 1, 50)",
+        [(site, day) for site in SEED_SITES for day in SEED_DAYS])
+    cursor.executemany(
+        "INSERT IGNORE INTO aqi_monthly_rollup (SITE, YEAR, MONTH, SAMPLES, AQI_SUM) VALUES (%s, %s, %s, 1, 50)",
+        [(site, year, month) for site in SEED_SITES for year in (2020, 2021, 2022) for month in range(1, 13)])
+
+class TestQueryPlans(unittest.TestCase):
+    """对热点查询执行EXPLAIN，确保都能走索引而不是全表扫描"""
+
+    @classmethod
+    def setUpClass(cls):
+        try:
+            cls.connection = pymysql.connect(cursorclass=pymysql.cursors.DictCursor, autocommit=False, **DB_CONFIG)
+        except pymysql.err.OperationalError as e:
+            raise unittest.SkipTest(f"无法连接数据库: {e}")
+        # 种子数据只在本事务内可见，结束时回滚
+        with cls.connection.cursor() as cursor:
+            seed(cursor)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.connection.rollback()
+        cls.connection.close()
+
+    def explain(self, sql, params):
+        with self.connection.cursor() as cursor:
+            cursor.execute("EXPLAIN " + sql, params)
+            return cursor.fetchall()
+
+    def test_hot_queries_use_indexes(self):
+        for name, sql, params in HOT_QUERIES:
+            with self.subTest(query=name):
+                plan = self.explain(sql, params)
+                logger.info(f"{name}: {plan}")
+                for row in plan:
+                    if row.get('table') is None:
+                        # 例如 "Impossible WHERE" / "no matching row in const table"，不涉及扫描
+                        continue
+                    self.assertNotEqual(row['type'], 'ALL', f"{name} 对 {row['table']} 做了全表扫描: {row}")
+                    self.assertIsNotNone(row['key'], f"{name} 对 {row['table']} 没有使用索引: {row}")
+                    if name not in FULL_INDEX_SCAN_ALLOWED:
+                        self.assertNotEqual(row['type'], 'index', f"{name} 对 {row['table']} 做了全索引扫描: {row}")
+
+if __name__ == '__main__':
+    # 设置日志级别
+    logging.basicConfig(level=logging.INFO)
+    # 运行测试
+    unittest.main()
@@ -0,0 +1,69 @@
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from aqi_app import response_cache
+
+class StubCache:
+    """本地桩，替代Django缓存"""
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, timeout=None):
+        self.data[key] = value
+
+    def delete_many(self, keys):
+        for key in keys:
+            self.data.pop(key, None)
+
+def make_settings(backend, enabled=None):
+    return SimpleNamespace(
+        CACHES={'default': {'BACKEND': backend}},
+        AQI_RESPONSE_CACHE_ALIAS='default',
+        AQI_RESPONSE_CACHE_ENABLED=enabled,
+        AQI_RESPONSE_CACHE_TTL=600,
+    )
+
+class TestResponseCache(unittest.TestCase):
+    def use(self, settings):
+        self.cache = StubCache()
+        for patcher in (
+            mock.patch.object(response_cache, 'settings', settings),
+            mock.patch.object(response_cache, 'caches', {'default': self.cache}),
+            mock.patch.object(response_cache, '_enabled', None),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def build(self):
+        self.builds += 1
+        return {'aqi': self.builds}
+
+    def setUp(self):
+        self.builds = 0
+        self.user = SimpleNamespace(user_type='enterprise')
+
+    def test_process_local_backend_is_not_used(self):
+        """LocMemCache不能被预测任务清除，默认不缓存响应"""
+        self.use(make_settings('django.core.cache.backends.locmem.LocMemCache'))
+        response_cache.get_or_build('a', self.user, self.build)
+        self.assertEqual(response_cache.get_or_build('a', self.user, self.build), {'aqi': 2})
+        self.assertEqual(self.cache.data, {})
+
+    def test_shared_backend_caches_known_sites_only(self):
+        """共享缓存后端下缓存响应并可被失效；cacheable为False（未知站点）时不缓存"""
+        self.use(make_settings('django.core.cache.backends.redis.RedisCache'))
+        response_cache.get_or_build('a', self.user, self.build)
+        self.assertEqual(response_cache.get_or_build('a', self.user, self.build), {'aqi': 1})
+
+        response_cache.get_or_build('unknown', self.user, self.build, cacheable=False)
+        self.assertEqual(len(self.cache.data), 1)
+
+        response_cache.invalidate_sites(['a'])
+        self.assertEqual(response_cache.get_or_build('a', self.user, self.build), {'aqi': 3})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+import unittest
+import datetime
+import pandas as pd
+
+from aqi_app.rollups import DAILY_KEYS, MONTHLY_KEYS, DAILY_UPSERT_SQL, update_rollups, rollup_row
+
+class RecordingCursor:
+    """本地桩，记录executemany的SQL和参数"""
+    def __init__(self):
+        self.calls = []
+
+    def executemany(self, sql, rows):
+        self.calls.append((sql, rows))
+
+def make_results():
+    return pd.DataFrame({
+        'SITE': ['b', 'a', 'a', 'a', None],
+        'DATE': pd.to_datetime(['2024-02-03', '2024-01-01', '2024-01-01', '2024-01-20', '2024-01-01']),
+        'AQI': [220.0, 10.0, 60.0, 120.0, 5.0],
+        'AQILEVEL': [5, 1, 2, 3, 1],
+    })
+
+class TestRollups(unittest.TestCase):
+    def test_chunk_is_aggregated_per_day_and_month(self):
+        """一批结果按(站点, 日期)和(站点, 年, 月)汇总，按键排序写入，缺少站点的行被忽略"""
+        cursor = RecordingCursor()
+        update_rollups(cursor, make_results())
+        (daily_sql, daily), (_, monthly) = cursor.calls
+        self.assertEqual(daily_sql, DAILY_UPSERT_SQL)
+        self.assertEqual(daily, [
+            ('a', datetime.date(2024, 1, 1), 2, 70.0, 60.0, 10.0, 1, 1, 0, 0, 0, 0),
+            ('a', datetime.date(2024, 1, 20), 1, 120.0, 120.0, 120.0, 0, 0, 1, 0, 0, 0),
+            ('b', datetime.date(2024, 2, 3), 1, 220.0, 220.0, 220.0, 0, 0, 0, 0, 1, 0),
+        ])
+        self.assertEqual(monthly, [
+            ('a', 2024, 1, 3, 190.0, 120.0, 10.0, 1, 1, 1, 0, 0, 0),
+            ('b', 2024, 2, 1, 220.0, 220.0, 220.0, 0, 0, 0, 0, 1, 0),
+        ])
+
+    def test_chunk_without_usable_rows_writes_nothing(self):
+        """缺少站点、日期或AQI的行不计入汇总，整批都不可用时不执行写入"""
+        cursor = RecordingCursor()
+        update_rollups(cursor, pd.DataFrame({
+            'SITE': [None, 'a', 'a'],
+            'DATE': pd.to_datetime(['2024-01-01', None, '2024-01-02']),
+            'AQI': [10.0, 20.0, float('nan')],
+            'AQILEVEL': [1, 1, None],
+        }))
+        self.assertEqual(cursor.calls, [])
+
+    def test_rollup_row_reports_average_and_levels(self):
+        """接口行包含平均值和等级分布"""
+        daily = rollup_row(('a', datetime.date(2024, 1, 1), 2, 70.0, 60.0, 10.0, 1, 1, 0, 0, 0, 0), DAILY_KEYS)
+        self.assertEqual(daily['date'], '2024-01-01')
+        self.assertEqual(daily['aqi_avg'], 35.0)
+        self.assertEqual(daily['levels'], {'1': 1, '2': 1, '3': 0, '4': 0, '5': 0, '6': 0})
+        monthly = rollup_row(('a', 2024, 1, 3, 190.0, 120.0, 10.0, 1, 1, 1, 0, 0, 0), MONTHLY_KEYS)
+        self.assertEqual((monthly['year'], monthly['month'], monthly['samples']), (2024, 1, 3))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+import unittest
+import threading
+from types import SimpleNamespace
+from unittest import mock
+
+from aqi_app.scheduler import PredictionScheduler
+
+class Clock:
+    """本地桩，替代time.monotonic，由测试推进时间"""
+    def __init__(self):
+        self.now = 0.0
+
+    def monotonic(self):
+        return self.now
+
+class TestPredictionScheduler(unittest.TestCase):
+    def setUp(self):
+        self.clock = Clock()
+        for target, value in [('aqi_app.scheduler.time', SimpleNamespace(monotonic=self.clock.monotonic)),
+                              ('aqi_app.scheduler.close_old_connections', lambda: None)]:
+            patcher = mock.patch(target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.mtime = None
+        self.backlog = False
+        self.runs = []
+
+    def make_scheduler(self, run=None, **kwargs):
+        def default_run():
+            self.runs.append(self.clock.now)
+            return {'processed': 0}
+        options = dict(min_idle=5, max_idle=20, error_backoff=30, max_error_backoff=100)
+        options.update(kwargs)
+        return PredictionScheduler(run or default_run, probe=lambda: self.backlog,
+                                   signal_mtime=lambda: self.mtime, **options)
+
+    def step_at(self, scheduler, now):
+        self.clock.now = now
+        return scheduler.step()
+
+    def test_signal_mtime_triggers_run(self):
+        """信号文件修改时间变化时立即运行，未变化时不运行"""
+        scheduler = self.make_scheduler()
+        self.step_at(scheduler, 0)  # 首次探测，没有数据
+        self.assertEqual(self.runs, [])
+
+        self.mtime = 100.0
+        self.assertEqual(self.step_at(scheduler, 1), {'processed': 0})
+        self.step_at(scheduler, 2)
+        self.assertEqual(self.runs, [1])
+        self.assertEqual(scheduler.stats()['signals'], 1)
+
+    def test_idle_probe_backs_off(self):
+        """没有数据时探测间隔加倍直到max_idle，发现数据后运行"""
+        scheduler = self.make_scheduler()
+        probes = []
+        for now in range(0, 70):
+            self.step_at(scheduler, now)
+            if scheduler.stats()['probes'] > len(probes):
+                probes.append(now)
+        # 间隔 5, 10, 20, 20, ...
+        self.assertEqual(probes[:5], [0, 5, 15, 35, 55])
+
+        self.backlog = True
+        self.step_at(scheduler, 75)
+        self.assertEqual(self.runs, [75])
+
+    def test_error_backs_off_and_ignores_signals(self):
+        """运行出错后按指数退避，退避期间忽略信号，成功后恢复"""
+        failures = [True, True, False]
+
+        def run():
+            self.runs.append(self.clock.now)
+            if failures.pop(0):
+                raise RuntimeError("stub failure")
+            return {'processed': 1}
+
+        scheduler = self.make_scheduler(run)
+        self.backlog = True
+        self.assertIsNone(self.step_at(scheduler, 0))
+        self.mtime = 1.0
+        self.assertIsNone(self.step_at(scheduler, 29))  # 退避30秒内不运行
+        self.assertIsNone(self.step_at(scheduler, 30))  # 第二次失败，退避60秒
+        self.assertIsNone(self.step_at(scheduler, 89))
+        self.assertEqual(self.step_at(scheduler, 90), {'processed': 1})
+        self.assertEqual(self.runs, [0, 30, 90])
+        self.assertEqual(scheduler.stats()['errors'], 2)
+
+    def test_overlapping_run_is_skipped(self):
+        """上一轮仍在运行时跳过本轮"""
+        started, release = threading.Event(), threading.Event()
+
+        def run():
+            started.set()
+            release.wait(5)
+            return {'processed': 1}
+
+        scheduler = self.make_scheduler(run)
+        thread = threading.Thread(target=scheduler.run_once)
+        thread.start()
+        self.assertTrue(started.wait(5))
+        self.assertIsNone(scheduler.run_once())
+        release.set()
+        thread.join()
+        self.assertEqual(scheduler.stats()['skipped'], 1)
+        self.assertEqual(scheduler.stats()['cycles'], 1)
+
+if __name__ == '__main__':
+    unittest.main()
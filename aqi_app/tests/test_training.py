@@ -8,6 +8,7 @@ import os
 import base64
 from io import BytesIO
 from PIL import Image
+from aqi_service.db import DB_CONFIG
 
 # 加载环境变量
 load_dotenv()
@@ -21,14 +22,8 @@ class TestTrainingLogic(unittest.TestCase):
         self.problem_type = 'regression'
         self.output_dir = 'autogluon_aqi_predictor'
         
-        # 数据库连接配置
-        self.db_config = {
-            'host': os.getenv('DB_HOST', '127.0.0.1'),
-            'user': os.getenv('DB_USER', 'root'),
-            'password': os.getenv('DB_PASSWORD', ''),
-            'database': os.getenv('DB_NAME', 'aqi_service'),
-            'port': int(os.getenv('DB_PORT', 3306))
-        }
+        # 数据库连接配置（与Django和导入脚本共用）
+        self.db_config = dict(DB_CONFIG)
         
     def test_full_prediction_flow(self):
         """测试完整的AQI预测和保存流程"""
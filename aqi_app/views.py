@@ -3,8 +3,28 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from django.db import connection
-from .serializers import UserSerializer, UserRegistrationSerializer, UserLoginSerializer
+from django.http import HttpResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from django.utils.dateparse import parse_date
+from django.conf import settings
+from .serializers import UserSerializer, UserRegistrationSerializer, UserLoginSerializer, ObservationSerializer
 from .models import User
+from .queries import (
+    AQI_COLUMNS, LATEST_AQI_BY_SITE_SQL, LATEST_AQI_SQL, RESULT_AQI_BY_SITE_SQL,
+    RESULT_AQI_SQL, HINT_IMAGE_SQL, DAILY_ROLLUP_SQL, MONTHLY_ROLLUP_SQL,
+)
+from .cities import get_city_registry
+from . import response_cache
+from .rollups import DAILY_KEYS, MONTHLY_KEYS, rollup_row
+from .history import (
+    MIN_DATE, MAX_DATE, FORMATTERS, EXPORT_CONTENT_TYPES, encode_cursor, decode_cursor, fetch_page, export_history,
+)
+from .authentication import invalidate_user
+from .tasks import FEATURE_COLUMNS, get_aqi_level
+from .micro_batcher import get_micro_batcher
+from concurrent.futures import TimeoutError as FutureTimeoutError
 import pandas as pd
 from autogluon.tabular import TabularPredictor
 import base64
@@ -22,6 +42,16 @@ class UserViewSet(viewsets.ModelViewSet):
     serializer_class = UserSerializer
     permission_classes = [AllowAny]
 
+    def perform_update(self, serializer):
+        # 认证时按user_id缓存用户，修改后清除缓存使新数据立即生效
+        super().perform_update(serializer)
+        invalidate_user(serializer.instance.id)
+
+    def perform_destroy(self, instance):
+        user_id = instance.id
+        super().perform_destroy(instance)
+        invalidate_user(user_id)
+
     @action(detail=False, methods=['post'])
     def register(self, request):
         serializer = UserRegistrationSerializer(data=request.data)
@@ -78,8 +108,9 @@ class UserViewSet(viewsets.ModelViewSet):
         try:
             serializer = UserLoginSerializer(data=request.data)
             if serializer.is_valid():
-                # 添加支持的城市列表
-                supported_cities = AQIViewSet()._get_supported_cities()
+                # 用户信息在验证密码的同一次查询中取得；城市列表和默认城市AQI优先使用缓存
+                aqi_view = AQIViewSet()
+                supported_cities = aqi_view._get_supported_cities()
                 # 获取默认城市的AQI数据
                 default_city = supported_cities[0] if supported_cities else None
                 
@@ -88,24 +119,9 @@ class UserViewSet(viewsets.ModelViewSet):
                 
                 # 如果有默认城市，添加默认城市的AQI数据
                 if default_city:
-                    # 使用原生SQL查询
-                    with connection.cursor() as cursor:
-                        cursor.execute(
-                            "SELECT id, username, user_type, email FROM users WHERE username = %s",
-                            [request.data['username']]
-                        )
-                        user_data = cursor.fetchone()
-                        
-                        if user_data:
-                            from .authentication import SimpleUser
-                            user = SimpleUser(
-                                id=user_data[0],
-                                username=user_data[1],
-                                user_type=user_data[2],
-                                email=user_data[3]
-                            )
-                            aqi_data = AQIViewSet()._get_aqi_data_response(user, default_city)
-                            response_data['default_city_aqi'] = aqi_data
+                    response_data['default_city_aqi'] = aqi_view._get_aqi_data_response(
+                        serializer.user, default_city, request
+                    )
                     
                 return Response(response_data)
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -117,55 +133,26 @@ class AQIViewSet(viewsets.ViewSet):
     permission_classes = [IsAuthenticated]
 
     def _get_supported_cities(self):
-        """获取支持的城市列表"""
-        try:
-            # 先检查表是否存在
-            with connection.cursor() as cursor:
-                cursor.execute("""
-                    SHOW TABLES LIKE 'aqi_result'
-                """)
-                if not cursor.fetchone():
-                    # 表不存在，返回示例数据
-                    return [
-                        {'site': 'BEIJING', 'name': '北京'},
-                        {'site': 'SHANGHAI', 'name': '上海'},
-                        {'site': 'GUANGZHOU', 'name': '广州'},
-                        {'site': 'SHENZHEN', 'name': '深圳'},
-                        {'site': 'HANGZHOU', 'name': '杭州'},
-                        {'site': 'NANJING', 'name': '南京'},
-                        {'site': 'WUHAN', 'name': '武汉'},
-                        {'site': 'CHENGDU', 'name': '成都'}
-                    ]
-                
-                # 表存在，查询数据
-                cursor.execute("""
-                    SELECT DISTINCT SITE, NAME 
-                    FROM aqi_result 
-                    ORDER BY SITE
-                """)
-                cities = cursor.fetchall()
-                if cities:
-                    return [{'site': city[0], 'name': city[1]} for city in cities]
-        except Exception as e:
-            logger.error(f"获取城市列表出错: {e}")
-        
-        # 发生错误或没有数据时返回示例数据
-        return [
-            {'site': 'BEIJING', 'name': '北京'},
-            {'site': 'SHANGHAI', 'name': '上海'},
-            {'site': 'GUANGZHOU', 'name': '广州'},
-            {'site': 'SHENZHEN', 'name': '深圳'},
-            {'site': 'HANGZHOU', 'name': '杭州'},
-            {'site': 'NANJING', 'name': '南京'},
-            {'site': 'WUHAN', 'name': '武汉'},
-            {'site': 'CHENGDU', 'name': '成都'}
-        ]
+        """获取支持的城市列表（进程内缓存，predict_aqi写入新站点时失效）"""
+        return get_city_registry().get()
 
-    def _get_aqi_data(self, site=None):
-        """从数据库获取AQI数据"""
+    def _get_aqi_data(self, site=None, with_image=False):
+        """从数据库获取AQI数据
+        
+        只查询响应需要的列；with_image为True时额外查询图片key，
+        以及尚未迁移到hint_image表的旧数据内联图片。
+        """
+        columns = AQI_COLUMNS
+        if with_image:
+            columns += ", HINTIMAGE_HASH, CASE WHEN HINTIMAGE_HASH IS NULL THEN HINTIMAGE END AS HINTIMAGE"
         try:
-            # 先检查表是否存在
             with connection.cursor() as cursor:
+                # 优先从aqi_latest按主键读取站点最新数据
+                aqi_data = self._get_latest_aqi_data(cursor, site, with_image)
+                if aqi_data:
+                    return aqi_data
+                
+                # aqi_latest尚未重建时回退到aqi_result，先检查表是否存在
                 cursor.execute("""
                     SHOW TABLES LIKE 'aqi_result'
                 """)
@@ -176,29 +163,47 @@ class AQIViewSet(viewsets.ViewSet):
                 
                 # 表存在，查询数据
                 if site:
-                    cursor.execute("""
-                        SELECT * FROM aqi_result 
-                        WHERE SITE = %s 
-                        ORDER BY DATE DESC 
-                        LIMIT 1
-                    """, [site])
+                    cursor.execute(RESULT_AQI_BY_SITE_SQL.format(columns=columns), [site])
                 else:
-                    cursor.execute("""
-                        SELECT * FROM aqi_result 
-                        ORDER BY DATE DESC 
-                        LIMIT 1
-                    """)
-                columns = [col[0] for col in cursor.description]
+                    cursor.execute(RESULT_AQI_SQL.format(columns=columns))
+                names = [col[0] for col in cursor.description]
                 data = cursor.fetchone()
                 
                 if data:
-                    return dict(zip(columns, data))
+                    return dict(zip(names, data))
         except Exception as e:
             logger.error(f"获取AQI数据出错: {e}")
         
         # 发生错误或没有数据时使用模拟数据
         return self._generate_mock_aqi_data(site)
 
+    def _get_latest_aqi_data(self, cursor, site=None, with_image=False):
+        """从aqi_latest表读取站点最新AQI数据，没有数据时返回None"""
+        columns = AQI_COLUMNS
+        if with_image:
+            columns += ", HINTIMAGE_HASH, RESULT_ID"
+        try:
+            if site:
+                cursor.execute(LATEST_AQI_BY_SITE_SQL.format(columns=columns), [site])
+            else:
+                cursor.execute(LATEST_AQI_SQL.format(columns=columns))
+            names = [col[0] for col in cursor.description]
+            data = cursor.fetchone()
+        except Exception as e:
+            logger.warning(f"读取aqi_latest出错: {e}")
+            return None
+        if not data:
+            return None
+        
+        aqi_data = dict(zip(names, data))
+        result_id = aqi_data.pop('RESULT_ID', None)
+        if with_image and not aqi_data['HINTIMAGE_HASH'] and result_id:
+            # 旧数据没有图片key，按主键读取内联图片
+            cursor.execute("SELECT HINTIMAGE FROM aqi_result WHERE id = %s", [result_id])
+            row = cursor.fetchone()
+            aqi_data['HINTIMAGE'] = row[0] if row else None
+        return aqi_data
+
     def _generate_mock_aqi_data(self, site=None):
         """生成模拟AQI数据"""
         import datetime
@@ -259,18 +264,32 @@ class AQIViewSet(viewsets.ViewSet):
             'HINTIMAGE': hint_image
         }
 
-    def _get_aqi_data_response(self, user, site=None):
-        """根据用户类型返回不同的AQI数据"""
+    def _get_aqi_data_response(self, user, site=None, request=None):
+        """根据用户类型返回不同的AQI数据（按站点和用户类型缓存，predict_aqi写入时失效）"""
         if isinstance(site, dict) and 'site' in site:
             site = site['site']
-            
-        aqi_data = self._get_aqi_data(site)
+        
+        # 只缓存已在数据库中的站点；未知站点返回随机生成的模拟数据，不能缓存
+        known_sites = get_city_registry().known_sites()
+        cacheable = site in known_sites if site else bool(known_sites)
+        data = response_cache.get_or_build(
+            site, user, lambda: self._build_aqi_data_response(user, site), cacheable=cacheable
+        )
+        # 缓存中保存与主机无关的路径，返回时按本次请求转换为绝对URL
+        if request is not None and data.get('hint_image_url'):
+            data = dict(data, hint_image_url=request.build_absolute_uri(data['hint_image_url']))
+        return data
+
+    def _build_aqi_data_response(self, user, site=None):
+        """查询数据库，根据用户类型生成不同的AQI数据"""
+        is_enterprise = hasattr(user, 'user_type') and user.user_type == 'enterprise'
+        aqi_data = self._get_aqi_data(site, with_image=not is_enterprise)
         
         if not aqi_data:
             return {'error': 'No AQI data available'}
             
         # 检查user.user_type
-        if hasattr(user, 'user_type') and user.user_type == 'enterprise':
+        if is_enterprise:
             return {
                 'site': aqi_data['SITE'],
                 'name': aqi_data['NAME'],
@@ -279,14 +298,22 @@ class AQIViewSet(viewsets.ViewSet):
                 'aqi_level': aqi_data['AQILEVEL']
             }
         else:
-            return {
+            response_data = {
                 'site': aqi_data['SITE'],
                 'date': aqi_data['DATE'],
                 'name': aqi_data['NAME'],
                 'aqi': aqi_data['AQI'],
                 'aqi_level': aqi_data['AQILEVEL'],
-                'hint_image': aqi_data['HINTIMAGE']
+                'hint_image_url': None
             }
+            # 图片通过hint_image接口单独获取；旧数据没有图片key时仍内联返回
+            if aqi_data.get('HINTIMAGE_HASH'):
+                response_data['hint_image_url'] = reverse(
+                    'aqi-hint-image', kwargs={'image_hash': aqi_data['HINTIMAGE_HASH']}
+                )
+            elif aqi_data.get('HINTIMAGE'):
+                response_data['hint_image'] = aqi_data['HINTIMAGE']
+            return response_data
 
     def list(self, request):
         """获取所有支持的城市和默认城市的AQI数据"""
@@ -298,7 +325,7 @@ class AQIViewSet(viewsets.ViewSet):
         }
         
         if default_city:
-            aqi_data = self._get_aqi_data_response(request.user, default_city['site'])
+            aqi_data = self._get_aqi_data_response(request.user, default_city['site'], request)
             response_data['default_city_aqi'] = aqi_data
             
         return Response(response_data)
@@ -311,11 +338,197 @@ class AQIViewSet(viewsets.ViewSet):
             return Response({'error': 'Site parameter is required'}, 
                           status=status.HTTP_400_BAD_REQUEST)
 
-        aqi_data = self._get_aqi_data_response(request.user, site)
+        aqi_data = self._get_aqi_data_response(request.user, site, request)
         return Response(aqi_data)
         
     @action(detail=False, methods=['get'])
     def cities(self, request):
         """获取支持的城市列表"""
         supported_cities = self._get_supported_cities()
-        return Response(supported_cities) 
\ No newline at end of file
+        return Response(supported_cities)
+
+    def _history_range(self, params):
+        """解析history和rollup接口的站点和日期范围，返回 (site, start, end) 或错误Response"""
+        site = params.get('site')
+        if not site:
+            return Response({'error': 'Site parameter is required'}, status=status.HTTP_400_BAD_REQUEST)
+        dates = {}
+        for name, default in (('start', MIN_DATE), ('end', MAX_DATE)):
+            value = params.get(name)
+            try:
+                dates[name] = parse_date(value) if value else default
+            except ValueError:
+                dates[name] = None
+            if dates[name] is None:
+                return Response({'error': f'Invalid {name} date, expected YYYY-MM-DD'},
+                                status=status.HTTP_400_BAD_REQUEST)
+        if dates['start'] > dates['end']:
+            return Response({'error': 'start must not be later than end'}, status=status.HTTP_400_BAD_REQUEST)
+        return site, dates['start'], dates['end']
+
+    @action(detail=False, methods=['get'])
+    def history(self, request):
+        """站点在日期范围内的每日AQI历史（仅企业用户）
+        
+        默认按 (DATE, id) keyset分页，响应中的next_cursor作为下一次请求的cursor参数；
+        export=jsonl或export=csv时通过服务端游标流式返回整个范围。
+        """
+        if getattr(request.user, 'user_type', None) != 'enterprise':
+            return Response({'error': 'AQI history is available to enterprise users only'},
+                            status=status.HTTP_403_FORBIDDEN)
+        
+        params = request.query_params
+        parsed = self._history_range(params)
+        if isinstance(parsed, Response):
+            return parsed
+        site, start, end = parsed
+        
+        export = params.get('export')
+        if export:
+            if export not in FORMATTERS:
+                return Response({'error': f'export must be one of: {", ".join(FORMATTERS)}'},
+                                status=status.HTTP_400_BAD_REQUEST)
+            try:
+                content = export_history(site, start, end, export)
+            except Exception as e:
+                logger.error(f"导出AQI历史出错: {e}")
+                return Response({'error': 'History export is temporarily unavailable'},
+                                status=status.HTTP_503_SERVICE_UNAVAILABLE)
+            response = StreamingHttpResponse(content, content_type=EXPORT_CONTENT_TYPES[export])
+            response['Content-Disposition'] = f'attachment; filename="aqi_history_{site}.{export}"'
+            return response
+        
+        max_page_size = getattr(settings, 'AQI_HISTORY_MAX_PAGE_SIZE', 5000)
+        try:
+            page_size = int(params.get('page_size', getattr(settings, 'AQI_HISTORY_PAGE_SIZE', 500)))
+            after = decode_cursor(params['cursor']) if params.get('cursor') else None
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        if not 0 < page_size <= max_page_size:
+            return Response({'error': f'page_size must be between 1 and {max_page_size}'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        
+        with connection.cursor() as cursor:
+            results, next_after = fetch_page(cursor, site, start, end, after, page_size)
+        
+        next_cursor = encode_cursor(*next_after) if next_after else None
+        next_url = None
+        if next_cursor:
+            query = params.copy()
+            query['cursor'] = next_cursor
+            next_url = request.build_absolute_uri(f"{request.path}?{query.urlencode()}")
+        return Response({
+            'site': site,
+            'results': results,
+            'next_cursor': next_cursor,
+            'next': next_url,
+        })
+
+    @action(detail=False, methods=['get'])
+    def rollup(self, request):
+        """站点的每日或每月AQI汇总：样本数、平均值、最大/最小值和等级分布
+        
+        只读取predict_aqi增量维护的汇总表（按唯一键范围扫描），不对aqi_result做聚合。
+        """
+        parsed = self._history_range(request.query_params)
+        if isinstance(parsed, Response):
+            return parsed
+        site, start, end = parsed
+        period = request.query_params.get('period', 'monthly')
+        max_rows = getattr(settings, 'AQI_ROLLUP_MAX_ROWS', 1000)
+        
+        if period == 'daily':
+            sql, params, keys = DAILY_ROLLUP_SQL, [site, start, end], DAILY_KEYS
+        elif period == 'monthly':
+            sql, keys = MONTHLY_ROLLUP_SQL, MONTHLY_KEYS
+            params = [site, start.year, start.year, start.month, end.year, end.year, end.month]
+        else:
+            return Response({'error': 'period must be daily or monthly'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params + [max_rows + 1])
+            rows = cursor.fetchall()
+        
+        return Response({
+            'site': site,
+            'period': period,
+            'results': [rollup_row(row, keys) for row in rows[:max_rows]],
+            # 超过AQI_ROLLUP_MAX_ROWS时截断，缩小日期范围后再次请求
+            'truncated': len(rows) > max_rows,
+        })
+
+    @action(detail=False, methods=['post'])
+    def predict(self, request):
+        """根据提交的气象观测实时预测AQI（仅企业用户）
+        
+        请求体为单条观测或观测列表；并发请求在几毫秒内被合并为一次模型预测。
+        """
+        if getattr(request.user, 'user_type', None) != 'enterprise':
+            return Response({'error': 'Online prediction is available to enterprise users only'},
+                            status=status.HTTP_403_FORBIDDEN)
+        
+        many = isinstance(request.data, list)
+        max_observations = getattr(settings, 'AQI_ONLINE_MAX_OBSERVATIONS', 1000)
+        if many and not 0 < len(request.data) <= max_observations:
+            return Response({'error': f'Between 1 and {max_observations} observations are allowed per request'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        serializer = ObservationSerializer(data=request.data, many=many)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        observations = serializer.validated_data if many else [serializer.validated_data]
+        
+        frame = pd.DataFrame(observations, columns=FEATURE_COLUMNS)
+        try:
+            predictions = get_micro_batcher().predict_frame(
+                frame, timeout=getattr(settings, 'AQI_ONLINE_PREDICT_TIMEOUT', 5)
+            )
+        except FutureTimeoutError:
+            return Response({'error': 'Prediction timed out'}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        except Exception as e:
+            logger.error(f"在线预测出错: {str(e)}")
+            return Response({'error': 'Prediction is temporarily unavailable'},
+                            status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        
+        results = [
+            {
+                'site': observation['SITE'],
+                'date': observation['DATE'],
+                'aqi': float(aqi),
+                'aqi_level': get_aqi_level(aqi),
+            }
+            for observation, aqi in zip(observations, predictions.tolist())
+        ]
+        return Response(results if many else results[0])
+
+    @action(detail=False, methods=['get'], url_path=r'hint_image/(?P<image_hash>[0-9a-f]{64})',
+            permission_classes=[AllowAny], authentication_classes=[])
+    def hint_image(self, request, image_hash=None):
+        """返回健康提示图片的JPEG原始字节
+        
+        图片按提示词输入的哈希寻址且写入后不再变化，因此直接以哈希作为强ETag，
+        支持If-None-Match/If-Modified-Since条件请求，允许客户端和代理长期缓存。
+        """
+        etag = quote_etag(image_hash)
+        
+        # ETag即图片key，无需查询数据库即可响应If-None-Match
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is not None:
+            not_modified['ETag'] = etag
+            not_modified['Cache-Control'] = 'public, max-age=31536000, immutable'
+            return not_modified
+        
+        with connection.cursor() as cursor:
+            cursor.execute(HINT_IMAGE_SQL, [image_hash])
+            row = cursor.fetchone()
+        if not row:
+            # 图片可能仍在生成中
+            return Response({'error': 'Hint image not found'}, status=status.HTTP_404_NOT_FOUND)
+        
+        # CREATED_AT以UNIX时间戳（UTC）读取，不受数据库会话和服务器本地时区影响
+        image, last_modified = row
+        last_modified = int(last_modified)
+        response = HttpResponse(bytes(image), content_type='image/jpeg')
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        response['Cache-Control'] = 'public, max-age=31536000, immutable'
+        return get_conditional_response(request, etag=etag, last_modified=last_modified, response=response)
@@ -0,0 +1,161 @@
+from contextlib import contextmanager
+from dotenv import load_dotenv
+import threading
+import logging
+import time
+import os
+import pymysql
+
+# 加载环境变量
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# 数据库连接配置，Django（settings.DATABASES）、独立脚本和测试共用
+DB_CONFIG = {
+    'host': os.getenv('DB_HOST', '127.0.0.1'),
+    'port': int(os.getenv('DB_PORT', 3306)),
+    'user': os.getenv('DB_USER', 'root'),
+    'password': os.getenv('DB_PASSWORD', ''),
+    'database': os.getenv('DB_NAME', 'aqi_service'),
+    'charset': 'utf8mb4',
+}
+
+# Django持久连接的最长保持时间（秒），0表示每个请求结束后关闭
+CONN_MAX_AGE = int(os.getenv('DB_CONN_MAX_AGE', 60))
+
+# 独立脚本连接池的最大连接数
+POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 8))
+
+
+class ConnectionPool:
+    """容量有限的pymysql连接池，供导入脚本等独立程序使用
+
+    取出连接时检查连接是否可用，超过recycle秒的连接会被重建；
+    所有连接都被占用时，acquire最多等待timeout秒。
+    """
+
+    def __init__(self, config=None, max_size=POOL_SIZE, timeout=30, recycle=3600):
+        self.config = dict(config or DB_CONFIG)
+        self.max_size = max_size
+        self.timeout = timeout
+        self.recycle = recycle
+        self._idle = []  # [connection]
+        self._created_at = {}  # {id(connection): 创建时间}
+        self._in_use = 0
+        self._cond = threading.Condition()
+        self._stats = {'created': 0, 'acquired': 0, 'waits': 0, 'health_check_failures': 0, 'recycled': 0}
+
+    def _connect(self):
+        # 建立连接时不持有锁，只在记录创建时间和统计时加锁
+        conn = pymysql.connect(**self.config)
+        with self._cond:
+            self._created_at[id(conn)] = time.monotonic()
+            self._stats['created'] += 1
+        return conn
+
+    def _discard(self, conn):
+        # _cond为可重入锁，release/close_all持有锁时也可调用
+        with self._cond:
+            self._created_at.pop(id(conn), None)
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _is_healthy(self, conn):
+        with self._cond:
+            expired = time.monotonic() - self._created_at.get(id(conn), 0) > self.recycle
+            if expired:
+                self._stats['recycled'] += 1
+        if expired:
+            return False
+        try:
+            conn.ping(reconnect=False)
+            return True
+        except Exception:
+            with self._cond:
+                self._stats['health_check_failures'] += 1
+            return False
+
+    def acquire(self):
+        """取出一个可用连接"""
+        deadline = time.monotonic() + self.timeout
+        with self._cond:
+            while not self._idle and self._in_use >= self.max_size:
+                self._stats['waits'] += 1
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self._cond.wait(remaining):
+                    raise TimeoutError(f"等待数据库连接超时（{self.timeout}s，连接池上限 {self.max_size}）")
+            self._in_use += 1
+            conn = self._idle.pop() if self._idle else None
+
+        try:
+            if conn is not None and not self._is_healthy(conn):
+                self._discard(conn)
+                conn = None
+            if conn is None:
+                conn = self._connect()
+        except Exception:
+            with self._cond:
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+
+        with self._cond:
+            self._stats['acquired'] += 1
+        return conn
+
+    def release(self, conn, discard=False):
+        """归还连接；discard为True时关闭该连接"""
+        with self._cond:
+            self._in_use -= 1
+            if discard or not conn.open:
+                self._discard(conn)
+            else:
+                self._idle.append(conn)
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        """取出连接，退出时归还；发生异常时回滚"""
+        conn = self.acquire()
+        try:
+            yield conn
+        except Exception:
+            try:
+                conn.rollback()
+            except Exception:
+                self.release(conn, discard=True)
+                raise
+            self.release(conn)
+            raise
+        else:
+            self.release(conn)
+
+    def close_all(self):
+        """关闭所有空闲连接"""
+        with self._cond:
+            while self._idle:
+                self._discard(self._idle.pop())
+
+    def stats(self):
+        """连接池状态"""
+        with self._cond:
+            stats = dict(self._stats)
+            stats.update({'max_size': self.max_size, 'in_use': self._in_use, 'idle': len(self._idle)})
+        return stats
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """获取进程级共享的连接池"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool()
+    return _pool
@@ -0,0 +1,31 @@
+from dotenv import load_dotenv
+import logging
+import os
+
+# 加载环境变量
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# 导入脚本提交新数据后更新此文件的修改时间，run_aqi_prediction据此立即开始预测，无需等待轮询
+IMPORT_SIGNAL_FILE = os.getenv(
+    'AQI_IMPORT_SIGNAL_FILE',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '.gsod_import_signal'),
+)
+
+
+def notify_import(path=IMPORT_SIGNAL_FILE):
+    """通知预测进程有新数据已提交"""
+    try:
+        with open(path, 'a'):
+            os.utime(path, None)
+    except OSError as e:
+        logger.warning(f"更新导入信号文件 {path} 失败: {e}")
+
+
+def import_signal_mtime(path=IMPORT_SIGNAL_FILE):
+    """信号文件的修改时间，文件不存在时返回None"""
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
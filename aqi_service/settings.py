@@ -1,6 +1,7 @@
 import os
 from pathlib import Path
 import pymysql
+from .db import DB_CONFIG, CONN_MAX_AGE
 
 pymysql.install_as_MySQLdb()
 
@@ -86,18 +87,21 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'aqi_service.wsgi.application'
 
-# 本地mysql配置
+# 本地mysql配置，连接参数统一在 aqi_service/db.py 中配置（可用DB_*环境变量覆盖）
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.mysql',
-        'NAME': 'aqi_service', 
-        'USER': 'root',  
-        'PASSWORD': '',   
-        'HOST': '127.0.0.1',
-        'PORT': '3306',
+        'NAME': DB_CONFIG['database'],
+        'USER': DB_CONFIG['user'],
+        'PASSWORD': DB_CONFIG['password'],
+        'HOST': DB_CONFIG['host'],
+        'PORT': str(DB_CONFIG['port']),
         'OPTIONS': {
-            'charset': 'utf8mb4',
-        }
+            'charset': DB_CONFIG['charset'],
+        },
+        # 持久连接，复用前检查连接是否可用
+        'CONN_MAX_AGE': CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
@@ -133,6 +137,63 @@ REST_FRAMEWORK = {
     ],
 }
 
+# AQI预测模型配置
+AQI_PREDICTOR_PATH = os.getenv('AQI_PREDICTOR_PATH', 'autogluon_aqi_predictor')
+AQI_PREDICTOR_PERSIST = os.getenv('AQI_PREDICTOR_PERSIST', '1') == '1'  # 加载后将模型常驻内存
+AQI_PREDICTOR_CHECK_INTERVAL = 30  # 检查模型目录变化的间隔（秒）
+AQI_CLAIM_LEASE_SECONDS = 600  # 预测进程领取数据的租约时长（秒），需大于处理一批数据的时间
+
+# 预测调度配置（run_aqi_prediction）
+# 导入脚本提交数据后更新信号文件（环境变量AQI_IMPORT_SIGNAL_FILE，见 aqi_service/import_signal.py），调度器立即开始预测
+AQI_SCHEDULER_MIN_IDLE = 5  # 没有数据时的最短探测间隔（秒），之后逐次加倍
+AQI_SCHEDULER_MAX_IDLE = 300  # 没有数据时的最长探测间隔（秒）
+AQI_SCHEDULER_ERROR_BACKOFF = 30  # 出错后的最短等待时间（秒），之后逐次加倍
+AQI_SCHEDULER_MAX_ERROR_BACKOFF = 600  # 出错后的最长等待时间（秒）
+
+# 在线预测接口配置（POST /api/aqi/predict/）
+AQI_ONLINE_BATCH_WAIT_MS = 5  # 合并并发请求时等待后续请求的最长时间（毫秒）
+AQI_ONLINE_MAX_BATCH = 256  # 每次合并预测的最大行数
+AQI_ONLINE_MAX_OBSERVATIONS = 1000  # 单个请求最多提交的观测条数
+AQI_ONLINE_PREDICT_TIMEOUT = 5  # 等待预测结果的超时时间（秒）
+
+# AQI历史接口配置（GET /api/aqi/history/）
+AQI_HISTORY_PAGE_SIZE = 500  # 默认每页条数
+AQI_HISTORY_MAX_PAGE_SIZE = 5000  # 每页最大条数；更大的范围使用export=jsonl/csv流式导出
+
+# AQI汇总接口配置（GET /api/aqi/rollup/）
+AQI_ROLLUP_MAX_ROWS = 1000  # 单次返回的最大行数，超过时截断并返回truncated
+
+# 健康提示图片生成配置
+AQI_HINT_IMAGE_WORKERS = 4  # 最大并发生成数
+AQI_HINT_IMAGE_TIMEOUT = 120  # 每次远程调用的超时时间（秒）
+AQI_HINT_IMAGE_RETRIES = 2  # 失败后的重试次数
+
+# 支持城市列表的进程内缓存时间（秒）
+AQI_CITY_REGISTRY_TTL = 300
+
+# 缓存配置：默认使用进程内存缓存，此时不启用AQI响应缓存（见AQI_RESPONSE_CACHE_ENABLED）；
+# 多个web进程或预测任务单独运行时，切换为共享缓存使失效在进程间生效，例如
+#   AQI_CACHE_BACKEND=django.core.cache.backends.redis.RedisCache AQI_CACHE_LOCATION=redis://127.0.0.1:6379/1
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('AQI_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('AQI_CACHE_LOCATION', 'aqi-service'),
+    }
+}
+
+# AQI接口响应缓存（按站点和用户类型）
+AQI_RESPONSE_CACHE_ALIAS = 'default'
+# None: 只在缓存后端可被多个进程共享时启用（LocMemCache下预测任务无法使web进程中的缓存失效）；
+# 只有一个进程同时负责web请求和预测时可设置环境变量AQI_RESPONSE_CACHE_ENABLED=1
+AQI_RESPONSE_CACHE_ENABLED = {'1': True, '0': False}.get(os.getenv('AQI_RESPONSE_CACHE_ENABLED'))
+AQI_RESPONSE_CACHE_TTL = 600  # 秒，predict_aqi写入新结果时会主动失效
+
+# 认证缓存：按user_id缓存用户，token载荷缓存到exp为止
+AQI_AUTH_USER_CACHE_SIZE = 10000
+AQI_AUTH_USER_CACHE_TTL = 300  # 秒
+AQI_AUTH_TOKEN_CACHE = True
+AQI_AUTH_TOKEN_CACHE_SIZE = 10000
+
 # 日志配置
 LOGGING = {
     'version': 1,
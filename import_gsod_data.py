@@ -1,38 +1,44 @@
 import pandas as pd
-import mysql.connector
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from datetime import datetime
+import argparse
+import io
+import hashlib
+import tarfile
+import tempfile
+import time
 import os
+from aqi_service.db import DB_CONFIG, ConnectionPool, get_pool
+from aqi_service.import_signal import notify_import
 
-# 数据库配置
-db_config = {
-    'host': '127.0.0.1',
-    'user': 'root',
-    'password': '',
-    'database': 'aqi_service'
-}
-
-def import_gsod_data():
+def import_gsod_data(resources_dir='resources', force=False):
+    # 从共享连接池获取连接（数据库配置见 aqi_service/db.py）
+    pool = get_pool()
+    conn = None
     try:
-        # 连接数据库
-        conn = mysql.connector.connect(**db_config)
+        conn = pool.acquire()
         cursor = conn.cursor()
         
         # 读取resources目录下的所有CSV文件
-        resources_dir = 'resources'
         for filename in os.listdir(resources_dir):
             if filename.endswith('.csv'):
                 print(f"Processing file: {filename}")
                 file_path = os.path.join(resources_dir, filename)
+                size, checksum = file_fingerprint(file_path)
+                if not force and is_imported(cursor, file_path, size, checksum):
+                    print(f"Skipping unchanged file: {filename}")
+                    continue
                 
                 # 读取CSV文件
                 df = pd.read_csv(file_path)
                 
-                # 准备插入语句
-                insert_query = """
+                # 准备插入语句，(STATION, DATE)已存在时更新
+                insert_query = f"""
                     INSERT INTO gsod_data 
                     (SITE, STATION, DATE, NAME, TEMP, DEWP, STP, VISIB, WDSP, 
                      MXSPD, MAX, MIN, PRCP, MONTH)
                     VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                    {UPSERT_CLAUSE}
                 """
                 
                 # 遍历DataFrame并插入数据
@@ -59,22 +65,335 @@ def import_gsod_data():
                     
                     cursor.execute(insert_query, data)
                 
-                # 提交每个文件的更改
+                # 提交每个文件的更改（连同导入清单）
+                record_import(cursor, file_path, size, checksum, len(df))
                 conn.commit()
+                notify_import()
                 print(f"Successfully imported data from {filename}")
         
         print("All data imported successfully!")
         
     except Exception as e:
         print(f"Error importing data: {str(e)}")
-        if conn.is_connected():
+        if conn is not None and conn.open:
             conn.rollback()
     
     finally:
-        if conn.is_connected():
-            cursor.close()
-            conn.close()
-            print("Database connection closed.")
+        if conn is not None:
+            pool.release(conn)
+        pool.close_all()
+        print(f"Database connection closed. Pool stats: {pool.stats()}")
+
+# 批量导入使用的列
+CSV_COLUMNS = ['SITE', 'STATION', 'DATE', 'NAME', 'TEMP', 'DEWP', 'STP', 'VISIB', 'WDSP',
+               'MXSPD', 'MAX', 'MIN', 'PRCP']
+NUMERIC_COLUMNS = ['TEMP', 'DEWP', 'STP', 'VISIB', 'WDSP', 'MXSPD', 'MAX', 'MIN', 'PRCP']
+DB_COLUMNS = CSV_COLUMNS + ['MONTH']
+
+# (STATION, DATE)唯一，重复导入时更新观测值；HANDLED保持不变，已预测的数据不会被重复预测
+UNIQUE_COLUMNS = ['STATION', 'DATE']
+UPSERT_CLAUSE = "ON DUPLICATE KEY UPDATE " + ", ".join(
+    f"{col} = VALUES({col})" for col in DB_COLUMNS if col not in UNIQUE_COLUMNS
+)
+
+BULK_INSERT_QUERY = f"""
+    INSERT INTO gsod_data ({', '.join(DB_COLUMNS)})
+    VALUES ({', '.join(['%s'] * len(DB_COLUMNS))})
+    {UPSERT_CLAUSE}
+"""
+
+# LOAD DATA不支持ON DUPLICATE KEY UPDATE，先载入本连接的临时表再合并
+STAGING_TABLE = 'gsod_data_staging'
+
+def file_fingerprint(file_path, block_size=1 << 20):
+    """返回文件大小和内容的SHA-256（分块读取）"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return os.path.getsize(file_path), digest.hexdigest()
+
+def _manifest_path(file_path):
+    return os.path.abspath(file_path)
+
+def is_imported(cursor, file_path, size, checksum):
+    """文件是否已按相同内容导入过"""
+    cursor.execute(
+        "SELECT SIZE, CHECKSUM FROM gsod_import_manifest WHERE PATH = %s",
+        [_manifest_path(file_path)],
+    )
+    row = cursor.fetchone()
+    return row is not None and int(row[0]) == size and row[1] == checksum
+
+def record_import(cursor, file_path, size, checksum, rows):
+    """记录文件已导入，需与该文件的数据在同一事务中提交"""
+    cursor.execute("""
+        INSERT INTO gsod_import_manifest (PATH, SIZE, CHECKSUM, IMPORTED_ROWS)
+        VALUES (%s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE SIZE = VALUES(SIZE), CHECKSUM = VALUES(CHECKSUM),
+                                IMPORTED_ROWS = VALUES(IMPORTED_ROWS), IMPORTED_AT = CURRENT_TIMESTAMP
+    """, [_manifest_path(file_path), size, checksum, rows])
+
+# 每次从CSV读取的行数，超过内存的大文件按块处理
+DEFAULT_CHUNK_SIZE = 50000
+
+def prepare_chunk(df):
+    """向量化完成类型和日期转换，返回与DB_COLUMNS对应的DataFrame"""
+    df = df[CSV_COLUMNS].copy()
+    dates = pd.to_datetime(df['DATE'], format='%Y-%m-%d')
+    df['DATE'] = dates.dt.date
+    df['MONTH'] = dates.dt.month
+    df[NUMERIC_COLUMNS] = df[NUMERIC_COLUMNS].apply(pd.to_numeric, errors='coerce')
+    return df[DB_COLUMNS]
+
+def to_db_rows(df):
+    """转换为executemany可用的行（Python原生类型，NaN转为None）"""
+    columns = [
+        [None if isinstance(value, float) and value != value else value for value in df[col].tolist()]
+        for col in df.columns
+    ]
+    return list(zip(*columns))
+
+def read_csv_chunks(file_path, chunk_size=DEFAULT_CHUNK_SIZE):
+    """分块读取CSV，只读取需要的列"""
+    return pd.read_csv(
+        file_path,
+        usecols=CSV_COLUMNS,
+        dtype={'SITE': str, 'STATION': str, 'NAME': str, 'DATE': str},
+        chunksize=chunk_size,
+    )
+
+def write_chunk(conn, df, method='insert'):
+    """写入一块已转换的数据，(STATION, DATE)已存在的行被更新，返回处理行数
+
+    Args:
+        method: insert使用多行INSERT（executemany），load-data使用LOAD DATA LOCAL INFILE
+    """
+    with conn.cursor() as cursor:
+        if method == 'load-data':
+            with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False, newline='') as tmp:
+                df.to_csv(tmp, index=False, header=False, na_rep='\\N')
+            columns = ', '.join(DB_COLUMNS)
+            try:
+                cursor.execute(f"CREATE TEMPORARY TABLE IF NOT EXISTS {STAGING_TABLE} LIKE gsod_data")
+                cursor.execute(f"DELETE FROM {STAGING_TABLE}")
+                cursor.execute(f"""
+                    LOAD DATA LOCAL INFILE %s INTO TABLE {STAGING_TABLE}
+                    FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '"'
+                    LINES TERMINATED BY '\\n'
+                    ({columns})
+                """, [tmp.name])
+                cursor.execute(f"""
+                    INSERT INTO gsod_data ({columns})
+                    SELECT {columns} FROM {STAGING_TABLE}
+                    {UPSERT_CLAUSE}
+                """)
+            finally:
+                os.remove(tmp.name)
+        else:
+            cursor.executemany(BULK_INSERT_QUERY, to_db_rows(df))
+    conn.commit()
+    return len(df)
+
+def bulk_import_file(file_path, chunk_size=DEFAULT_CHUNK_SIZE, method='insert', force=False):
+    """批量导入单个CSV文件，每块一个事务，全部写入后记录导入清单
+
+    文件大小和SHA-256与清单记录一致时跳过（force为True时仍然导入）。
+    中途失败时已提交的块不会回滚，但清单未更新，下次运行会重新导入该文件（按唯一键更新，不会重复）。
+
+    Returns:
+        (文件路径, 导入行数, 耗时秒数)，跳过的文件导入行数为None
+    """
+    start = time.perf_counter()
+    size, checksum = file_fingerprint(file_path)
+    pool = get_pool() if method == 'insert' else ConnectionPool(config={**DB_CONFIG, 'local_infile': True}, max_size=1)
+    rows = 0
+    with pool.connection() as conn:
+        with conn.cursor() as cursor:
+            if not force and is_imported(cursor, file_path, size, checksum):
+                rows = None
+            else:
+                for chunk in read_csv_chunks(file_path, chunk_size):
+                    rows += write_chunk(conn, prepare_chunk(chunk), method)
+                record_import(cursor, file_path, size, checksum, rows)
+                conn.commit()
+    pool.close_all()
+    return file_path, rows, time.perf_counter() - start
+
+def bulk_import_gsod_data(resources_dir='resources', workers=1, chunk_size=DEFAULT_CHUNK_SIZE, method='insert',
+                          force=False):
+    """批量导入resources目录下的所有CSV文件，多个文件并行处理，跳过清单中未变化的文件"""
+    files = sorted(
+        os.path.join(resources_dir, filename)
+        for filename in os.listdir(resources_dir)
+        if filename.endswith('.csv')
+    )
+    if not files:
+        print("No CSV files found.")
+        return
+
+    start = time.perf_counter()
+    total_rows = 0
+    skipped = 0
+    with ProcessPoolExecutor(max_workers=max(1, min(workers, len(files)))) as executor:
+        futures = [executor.submit(bulk_import_file, path, chunk_size, method, force) for path in files]
+        for future in as_completed(futures):
+            try:
+                file_path, rows, elapsed = future.result()
+            except Exception as e:
+                print(f"Error importing data: {str(e)}")
+                continue
+            if rows is None:
+                skipped += 1
+                print(f"Skipping unchanged file: {file_path}")
+                continue
+            total_rows += rows
+            notify_import()
+            print(f"Successfully imported {rows} rows from {file_path} in {elapsed:.1f}s ({rows / max(elapsed, 1e-6):.0f} rows/s)")
+
+    elapsed = time.perf_counter() - start
+    print(f"All data imported: {total_rows} rows from {len(files) - skipped} files ({skipped} unchanged) in {elapsed:.1f}s ({total_rows / max(elapsed, 1e-6):.0f} rows/s)")
+
+# NOAA GSOD原始年度归档（tar中每个站点一个CSV）的缺失值标记
+GSOD_SENTINELS = {
+    'TEMP': 9999.9, 'DEWP': 9999.9, 'SLP': 9999.9, 'STP': 9999.9, 'MAX': 9999.9, 'MIN': 9999.9,
+    'VISIB': 999.9, 'WDSP': 999.9, 'MXSPD': 999.9, 'GUST': 999.9,
+    'PRCP': 99.99,
+}
+# 原始文件中需要的列，*_ATTRIBUTES等标记列不读取
+RAW_COLUMNS = ['STATION', 'DATE', 'NAME'] + NUMERIC_COLUMNS
+
+def load_station_map(path):
+    """读取站点映射CSV（STATION, SITE两列），返回 {STATION: SITE}"""
+    df = pd.read_csv(path, usecols=['STATION', 'SITE'], dtype=str)
+    return dict(zip(df['STATION'].str.strip(), df['SITE'].str.strip()))
+
+def normalize_raw_chunk(df, station_map):
+    """将原始GSOD数据转换为CSV_COLUMNS格式：缺失值标记转为NaN，按站点映射补充SITE，丢弃未映射的站点"""
+    df = df.copy()
+    df['STATION'] = df['STATION'].str.strip()
+    df['SITE'] = df['STATION'].map(station_map)
+    df = df[df['SITE'].notna()]
+    for col in NUMERIC_COLUMNS:
+        values = pd.to_numeric(df[col], errors='coerce')
+        df[col] = values.mask(values == GSOD_SENTINELS[col])
+    return df[CSV_COLUMNS]
+
+def iter_archive_chunks(archive, station_map, chunk_size=DEFAULT_CHUNK_SIZE, stats=None):
+    """流式读取GSOD tar归档（支持gz等压缩），不解压到磁盘，按chunk_size行产出prepare_chunk后的数据
+
+    Args:
+        archive: 归档文件路径或二进制文件对象
+        station_map: {STATION: SITE}，未映射的站点被跳过
+        stats: 可选的dict，累计写入 members（读取的站点文件数）、skipped_members（未映射而未读取的站点文件数）
+               和 unmapped（文件内未映射而跳过的行数）
+    """
+    stats = stats if stats is not None else {}
+    for key in ('members', 'skipped_members', 'unmapped'):
+        stats.setdefault(key, 0)
+    open_args = {'fileobj': archive} if hasattr(archive, 'read') else {'name': archive}
+    pending = []
+    pending_rows = 0
+    # r|* 为顺序读取模式，每个成员读完后再读下一个，内存占用与归档大小无关
+    with tarfile.open(mode='r|*', **open_args) as tar:
+        for member in tar:
+            if not member.isfile() or not member.name.endswith('.csv'):
+                continue
+            # 原始归档中的文件名即站点编号，未映射的站点无需解析
+            if os.path.splitext(os.path.basename(member.name))[0] not in station_map:
+                stats['skipped_members'] += 1
+                continue
+            stats['members'] += 1
+            # 流式模式下成员文件不支持seek，单个站点文件最多一年的数据，整体读入内存
+            raw = pd.read_csv(io.BytesIO(tar.extractfile(member).read()), usecols=RAW_COLUMNS, dtype=str)
+            df = normalize_raw_chunk(raw, station_map)
+            stats['unmapped'] += len(raw) - len(df)
+            if df.empty:
+                continue
+            pending.append(df)
+            pending_rows += len(df)
+            if pending_rows >= chunk_size:
+                yield prepare_chunk(pd.concat(pending, ignore_index=True))
+                pending, pending_rows = [], 0
+    if pending:
+        yield prepare_chunk(pd.concat(pending, ignore_index=True))
+
+def archive_import_file(archive_path, station_map, chunk_size=DEFAULT_CHUNK_SIZE, method='insert', force=False):
+    """流式导入一个GSOD原始归档，每块一个事务，全部写入后将归档记录到导入清单
+
+    Returns:
+        (归档路径, 导入行数, 耗时秒数)，跳过的归档导入行数为None
+    """
+    start = time.perf_counter()
+    size, checksum = file_fingerprint(archive_path)
+    pool = get_pool() if method == 'insert' else ConnectionPool(config={**DB_CONFIG, 'local_infile': True}, max_size=1)
+    rows = 0
+    stats = {}
+    with pool.connection() as conn:
+        with conn.cursor() as cursor:
+            if not force and is_imported(cursor, archive_path, size, checksum):
+                rows = None
+            else:
+                for df in iter_archive_chunks(archive_path, station_map, chunk_size, stats):
+                    rows += write_chunk(conn, df, method)
+                record_import(cursor, archive_path, size, checksum, rows)
+                conn.commit()
+    pool.close_all()
+    if stats.get('skipped_members') or stats.get('unmapped'):
+        print(f"{archive_path}: skipped {stats['skipped_members']} station files and {stats['unmapped']} rows "
+              f"missing in the station map")
+    return archive_path, rows, time.perf_counter() - start
+
+def archive_import_gsod_data(archives, station_map_path, workers=1, chunk_size=DEFAULT_CHUNK_SIZE, method='insert',
+                             force=False):
+    """流式导入多个GSOD原始归档（例如每年一个），多个归档并行处理"""
+    station_map = load_station_map(station_map_path)
+    start = time.perf_counter()
+    total_rows = 0
+    skipped = 0
+    with ProcessPoolExecutor(max_workers=max(1, min(workers, len(archives)))) as executor:
+        futures = [
+            executor.submit(archive_import_file, path, station_map, chunk_size, method, force)
+            for path in archives
+        ]
+        for future in as_completed(futures):
+            try:
+                archive_path, rows, elapsed = future.result()
+            except Exception as e:
+                print(f"Error importing data: {str(e)}")
+                continue
+            if rows is None:
+                skipped += 1
+                print(f"Skipping unchanged archive: {archive_path}")
+                continue
+            total_rows += rows
+            notify_import()
+            print(f"Successfully imported {rows} rows from {archive_path} in {elapsed:.1f}s ({rows / max(elapsed, 1e-6):.0f} rows/s)")
+
+    elapsed = time.perf_counter() - start
+    print(f"All archives imported: {total_rows} rows from {len(archives) - skipped} archives ({skipped} unchanged) in {elapsed:.1f}s ({total_rows / max(elapsed, 1e-6):.0f} rows/s)")
 
 if __name__ == "__main__":
-    import_gsod_data() 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Import GSOD CSV files into gsod_data')
+    parser.add_argument('--dir', default='resources', help='CSV文件目录（默认resources）')
+    parser.add_argument('--bulk', action='store_true', help='批量导入：分块读取、向量化转换、多行写入、多文件并行')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='批量导入时并行处理的文件数')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help='批量导入时每块读取的行数')
+    parser.add_argument('--method', choices=['insert', 'load-data'], default='insert',
+                        help='批量写入方式：多行INSERT或LOAD DATA LOCAL INFILE（需服务器开启local_infile）')
+    parser.add_argument('--archive', nargs='+', metavar='TAR',
+                        help='流式导入NOAA GSOD原始年度归档（.tar/.tar.gz），不解压到磁盘')
+    parser.add_argument('--station-map', help='站点映射CSV（STATION, SITE两列），--archive时必需')
+    parser.add_argument('--force', action='store_true', help='忽略导入清单，重新导入所有文件')
+    args = parser.parse_args()
+
+    if args.archive:
+        if not args.station_map:
+            parser.error('--archive requires --station-map')
+        archive_import_gsod_data(args.archive, args.station_map, workers=args.workers, chunk_size=args.chunk_size,
+                                 method=args.method, force=args.force)
+    elif args.bulk:
+        bulk_import_gsod_data(args.dir, workers=args.workers, chunk_size=args.chunk_size, method=args.method,
+                              force=args.force)
+    else:
+        import_gsod_data(args.dir, force=args.force)
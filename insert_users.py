@@ -1,20 +1,14 @@
-import mysql.connector
 from datetime import datetime, timedelta
 from jose import jwt
 import os
-
-# 数据库配置
-db_config = {
-    'host': '127.0.0.1',
-    'user': 'root',
-    'password': '',
-    'database': 'aqi_service'
-}
+from aqi_service.db import get_pool
 
 def insert_users():
+    # 从共享连接池获取连接（数据库配置见 aqi_service/db.py）
+    pool = get_pool()
+    conn = None
     try:
-        # 连接数据库
-        conn = mysql.connector.connect(**db_config)
+        conn = pool.acquire()
         cursor = conn.cursor()
         
         # 插入个人用户
@@ -76,14 +70,14 @@ def insert_users():
         
     except Exception as e:
         print(f"Error inserting users: {str(e)}")
-        if conn.is_connected():
+        if conn is not None and conn.open:
             conn.rollback()
     
     finally:
-        if conn.is_connected():
-            cursor.close()
-            conn.close()
-            print("\nDatabase connection closed.")
+        if conn is not None:
+            pool.release(conn)
+        pool.close_all()
+        print(f"\nDatabase connection closed. Pool stats: {pool.stats()}")
 
 if __name__ == "__main__":
     insert_users() 
\ No newline at end of file
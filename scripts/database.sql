@@ -42,7 +42,11 @@ CREATE TABLE gsod_data (
     MIN FLOAT,
     PRCP FLOAT,
     MONTH INT,
-    HANDLED BOOLEAN DEFAULT FALSE
+    HANDLED BOOLEAN NOT NULL DEFAULT FALSE,
+    CLAIMED_BY VARCHAR(64),  -- 预测进程领取数据的租约，到期后可被其他进程重新领取
+    CLAIMED_UNTIL DATETIME,
+    INDEX gsod_handled_id_idx (HANDLED, id),
+    UNIQUE KEY gsod_station_date_uniq (STATION, DATE)  -- 重复导入时按(STATION, DATE)更新而不是新增
 );
 
 -- AQI结果表
@@ -64,6 +68,92 @@ CREATE TABLE aqi_result (
     MONTH INT,
     AQI FLOAT,
     AQILEVEL INT,
-    HINTIMAGE MEDIUMBLOB
+    HINTIMAGE MEDIUMBLOB,  -- 旧数据内联的base64图片，新数据只写HINTIMAGE_HASH
+    HINTIMAGE_HASH CHAR(64),
+    INDEX aqi_result_site_date_idx (SITE, DATE, id),
+    INDEX aqi_result_date_idx (DATE),
+    INDEX aqi_result_site_name_idx (SITE, NAME)
 );
+-- 已有数据库升级请执行 python manage.py migrate aqi_app，会补齐缺失的表、列和索引
 
+-- 健康提示图片表，以提示词输入(AQI等级、城市名称、城市特征)的SHA-256为主键，每张图片只存储一次
+-- 已有数据库由迁移 0002_pipeline_tables 创建本表并为aqi_result添加HINTIMAGE_HASH列
+CREATE TABLE hint_image (
+    HASH CHAR(64) PRIMARY KEY,
+    AQILEVEL INT NOT NULL,
+    CITY_NAME VARCHAR(128) NOT NULL,
+    CITY_FEATURES VARCHAR(512) NOT NULL,
+    IMAGE MEDIUMBLOB NOT NULL,
+    CREATED_AT TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+
+-- 每个站点最新一条AQI结果，由predict_aqi随写入维护，可用 python manage.py rebuild_aqi_latest 重建
+CREATE TABLE aqi_latest (
+    SITE VARCHAR(32) PRIMARY KEY,
+    NAME VARCHAR(128),
+    DATE DATE,
+    AQI FLOAT,
+    AQILEVEL INT,
+    HINTIMAGE_HASH CHAR(64),
+    RESULT_ID INT,  -- 对应的aqi_result.id，仅重建时填充，用于读取旧数据的内联图片
+    UPDATED_AT TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    INDEX aqi_latest_date_idx (DATE)
+);
+
+
+-- 已导入的GSOD文件清单，import_gsod_data.py据此跳过未变化的文件
+CREATE TABLE gsod_import_manifest (
+    PATH VARCHAR(255) PRIMARY KEY,
+    SIZE BIGINT NOT NULL,
+    CHECKSUM CHAR(64) NOT NULL,  -- 文件内容的SHA-256
+    IMPORTED_ROWS INT NOT NULL,
+    IMPORTED_AT TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+);
+
+
+-- 每个站点的滚动特征状态（最近几天的观测值和最新AQI），predict_aqi据此增量计算滞后和滚动特征
+CREATE TABLE station_feature_state (
+    STATION VARCHAR(32) PRIMARY KEY,
+    LAST_DATE DATE,
+    LAST_AQI FLOAT,
+    HISTORY TEXT NOT NULL,  -- JSON，最新日期之前几天的逐日观测，例如 {"DATE": [...], "TEMP": [...], "WDSP": [...], "PRCP": [...], "AQI": [...]}，按日期升序
+    UPDATED_AT TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+);
+
+
+-- 站点每日/每月AQI汇总，由predict_aqi随写入增量维护，可用 python manage.py rebuild_aqi_rollups 重建
+CREATE TABLE aqi_daily_rollup (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    SITE VARCHAR(32) NOT NULL,
+    DATE DATE NOT NULL,
+    SAMPLES INT NOT NULL,
+    AQI_SUM DOUBLE NOT NULL,
+    AQI_MAX FLOAT,
+    AQI_MIN FLOAT,
+    LEVEL_1 INT NOT NULL DEFAULT 0,  -- 各AQI等级的条数
+    LEVEL_2 INT NOT NULL DEFAULT 0,
+    LEVEL_3 INT NOT NULL DEFAULT 0,
+    LEVEL_4 INT NOT NULL DEFAULT 0,
+    LEVEL_5 INT NOT NULL DEFAULT 0,
+    LEVEL_6 INT NOT NULL DEFAULT 0,
+    UNIQUE KEY aqi_daily_rollup_site_date_uniq (SITE, DATE)
+);
+
+CREATE TABLE aqi_monthly_rollup (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    SITE VARCHAR(32) NOT NULL,
+    YEAR INT NOT NULL,
+    MONTH INT NOT NULL,
+    SAMPLES INT NOT NULL,
+    AQI_SUM DOUBLE NOT NULL,
+    AQI_MAX FLOAT,
+    AQI_MIN FLOAT,
+    LEVEL_1 INT NOT NULL DEFAULT 0,
+    LEVEL_2 INT NOT NULL DEFAULT 0,
+    LEVEL_3 INT NOT NULL DEFAULT 0,
+    LEVEL_4 INT NOT NULL DEFAULT 0,
+    LEVEL_5 INT NOT NULL DEFAULT 0,
+    LEVEL_6 INT NOT NULL DEFAULT 0,
+    UNIQUE KEY aqi_monthly_rollup_site_month_uniq (SITE, YEAR, MONTH)
+);